@@ -0,0 +1,261 @@
+"""Aggregations behind the admin dashboard and analytics views.
+
+Counting is done by Mongo in one pipeline per question instead of one
+``count()`` per bucket or per row read back into Python.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .models import CollectionRequest, MarketplacePost, PickupSchedule, User
+from .spatial import ACTIVE_SCHEDULE_STATUSES
+
+BUCKETS = ('day', 'week', 'month')
+
+# Runs the independent per-collection pipelines of one request side by side
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='analytics')
+
+
+class AnalyticsError(ValueError):
+    """Invalid window or bucket parameter."""
+
+
+def bucket_start(moment, bucket):
+    """Start of the UTC ``bucket`` containing ``moment``; weeks start on Monday."""
+    day = datetime(moment.year, moment.month, moment.day)
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, bucket):
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def _bucket_expression(field, bucket):
+    truncate = {'date': f'${field}', 'unit': bucket}
+    if bucket == 'week':
+        truncate['startOfWeek'] = 'monday'
+    return {'$dateTrunc': truncate}
+
+
+def _trend_window(days, bucket, now):
+    if bucket not in BUCKETS:
+        raise AnalyticsError(f'bucket must be one of {", ".join(BUCKETS)}.')
+    if days < 1:
+        raise AnalyticsError('days must be at least 1.')
+    now = now or datetime.utcnow()
+    return bucket_start(now - timedelta(days=days - 1), bucket), next_bucket(bucket_start(now, bucket), bucket)
+
+
+def _trend_pipeline(start, end, bucket):
+    return [
+        {'$match': {'created_at': {'$gte': start, '$lt': end}}},
+        {'$group': {
+            '_id': {'bucket': _bucket_expression('created_at', bucket), 'waste_type': '$waste_type'},
+            'count': {'$sum': 1},
+        }},
+    ]
+
+
+def _trends(rows, start, end, bucket):
+    counts = {}
+    for row in rows:
+        counts.setdefault(row['_id']['bucket'], {})[row['_id']['waste_type']] = row['count']
+
+    trends = []
+    moment = start
+    while moment < end:
+        by_type = counts.get(moment, {})
+        trends.append({
+            'date': moment.strftime('%Y-%m-%d'),
+            'count': sum(by_type.values()),
+            'waste_type': max(sorted(by_type), key=by_type.get) if by_type else None,
+            'waste_types': by_type,
+        })
+        moment = next_bucket(moment, bucket)
+    trends.reverse()
+    return trends
+
+
+def waste_trends(days=30, bucket='day', now=None):
+    """Collection requests created per ``bucket`` over the last ``days`` days.
+
+    One entry per bucket, newest first, with the total ``count``, the count of
+    each waste type and the most common ``waste_type``. Buckets without
+    requests are included with zero counts. The first bucket is the one
+    holding the day ``days - 1`` days ago, so week and month buckets are
+    always whole.
+    """
+    start, end = _trend_window(days, bucket, now)
+    rows = CollectionRequest._get_collection().aggregate(_trend_pipeline(start, end, bucket))
+    return _trends(rows, start, end, bucket)
+
+
+def _counts(**conditions):
+    """One ``$group`` counting every document as ``total`` and, under each
+    keyword, the documents matching its expression."""
+    return [{'$group': {
+        '_id': None,
+        'total': {'$sum': 1},
+        **{name: {'$sum': {'$cond': [condition, 1, 0]}} for name, condition in conditions.items()},
+    }}]
+
+
+def _status_in(*statuses):
+    return {'$in': ['$status', list(statuses)]}
+
+
+def _recent(limit, fields, user_field):
+    """The newest ``limit`` documents projected to ``fields``, with the name of
+    the user in ``user_field`` joined in as ``user_name``."""
+    return [
+        {'$sort': {'created_at': -1, '_id': -1}},
+        {'$limit': limit},
+        {'$lookup': {
+            'from': User._get_collection_name(), 'localField': user_field,
+            'foreignField': '_id', 'as': 'user_name',
+        }},
+        {'$project': {**{field: 1 for field in fields}, 'user_name': {'$arrayElemAt': ['$user_name.full_name', 0]}}},
+    ]
+
+
+def _counter_names(pipeline):
+    """Fields the counting stage of ``pipeline`` outputs."""
+    stage = pipeline[-1]
+    if '$count' in stage:
+        return [stage['$count']]
+    return [name for name in stage['$group'] if name != '_id']
+
+
+def _aggregate(model, branches):
+    """Run ``branches`` over ``model`` in one round trip.
+
+    Several branches share a single ``$facet`` pass over the collection; a
+    lone branch runs on its own so its first stage can use an index.
+    """
+    collection = model._get_collection()
+    if len(branches) == 1:
+        result = {name: list(collection.aggregate(pipeline)) for name, pipeline in branches.items()}
+    else:
+        result = next(collection.aggregate([{'$facet': branches}]))
+    counts = result.pop('counts', None)
+    if counts is not None:
+        # An empty collection groups into no document at all; every counter is 0
+        result.update(dict.fromkeys(_counter_names(branches['counts']), 0))
+        result.update(counts[0] if counts else {})
+        result.pop('_id', None)
+    return result
+
+
+def overview(counts=True, recent_requests=0, recent_posts=0, recent_schedules=0,
+             trend_days=None, trend_bucket='day', now=None):
+    """Dashboard counters and recent items with at most one aggregation per
+    collection, all running at the same time.
+
+    With ``counts``, returns ``users`` (verified non-admin users) and the
+    ``total`` of each collection plus ``pending``/``completed`` collection
+    requests and ``active`` pickup schedules. ``recent_*`` ask for that many
+    newest rows (raw, with ``user_name`` joined in) under ``recent``, and
+    ``trend_days`` adds ``collection_requests['trends']`` as ``waste_trends``
+    would return them. Collections with nothing to compute are left out.
+    """
+    jobs = {}
+    if counts:
+        jobs['users'] = (User, {'counts': [{'$match': {'is_verified': True, 'is_admin': False}}, {'$count': 'total'}]})
+
+    requests = {'counts': _counts(pending=_status_in('pending'), completed=_status_in('completed'))} if counts else {}
+    if recent_requests:
+        requests['recent'] = _recent(
+            recent_requests, ('waste_type', 'status', 'location', 'created_at'), 'user'
+        )
+    if trend_days is not None:
+        start, end = _trend_window(trend_days, trend_bucket, now)
+        requests['trends'] = _trend_pipeline(start, end, trend_bucket)
+    posts = {'counts': _counts()} if counts else {}
+    if recent_posts:
+        posts['recent'] = _recent(recent_posts, ('title', 'price', 'waste_type', 'created_at'), 'user')
+    schedules = {'counts': _counts(active=_status_in(*ACTIVE_SCHEDULE_STATUSES))} if counts else {}
+    if recent_schedules:
+        schedules['recent'] = _recent(
+            recent_schedules, ('location', 'garbage_type', 'date_time', 'status', 'created_at'), 'admin'
+        )
+    for name, model, branches in (
+        ('collection_requests', CollectionRequest, requests),
+        ('marketplace_posts', MarketplacePost, posts),
+        ('pickup_schedules', PickupSchedule, schedules),
+    ):
+        if branches:
+            jobs[name] = (model, branches)
+
+    futures = {name: _pool.submit(_aggregate, model, branches) for name, (model, branches) in jobs.items()}
+    result = {name: future.result() for name, future in futures.items()}
+    if 'users' in result:
+        result['users'] = result['users']['total']
+    if trend_days is not None:
+        result['collection_requests']['trends'] = _trends(
+            result['collection_requests']['trends'], start, end, trend_bucket
+        )
+    return result
+
+
+def analytics_filter(start=None, end=None, waste_type=None, location=None):
+    """Raw filter for AdminAnalyticsView: ``created_at`` within ``start`` and
+    ``end`` (both inclusive), an exact ``waste_type`` and a case-insensitive
+    ``location`` substring, each only when given."""
+    match = {}
+    if start or end:
+        match['created_at'] = {}
+        if start:
+            match['created_at']['$gte'] = start
+        if end:
+            match['created_at']['$lte'] = end
+    if waste_type:
+        match['waste_type'] = waste_type
+    if location:
+        match['location'] = {'$regex': re.escape(location), '$options': 'i'}
+    return match
+
+
+def request_breakdown(match):
+    """Collection requests matching ``match`` broken down by waste type and by
+    area (the part of ``location`` before the first comma), alongside the
+    number of marketplace posts matching the same filter.
+
+    Returns ``total_requests``, ``completed_requests``,
+    ``total_marketplace_posts``, ``waste_type_breakdown`` (``{type: {'count',
+    'completed'}}``) and ``location_breakdown`` (``{area: count}``), largest
+    first. Both collections are read concurrently, the requests in a single
+    ``$facet`` pass.
+    """
+    requests = _pool.submit(lambda: next(CollectionRequest._get_collection().aggregate([
+        {'$match': match},
+        {'$facet': {
+            'waste_types': [{'$group': {
+                '_id': '$waste_type',
+                'count': {'$sum': 1},
+                'completed': {'$sum': {'$cond': [_status_in('completed'), 1, 0]}},
+            }}, {'$sort': {'count': -1, '_id': 1}}],
+            'locations': [{'$group': {
+                '_id': {'$arrayElemAt': [{'$split': [{'$ifNull': ['$location', '']}, ',']}, 0]},
+                'count': {'$sum': 1},
+            }}, {'$sort': {'count': -1, '_id': 1}}],
+        }},
+    ])))
+    posts = _pool.submit(MarketplacePost._get_collection().count_documents, match)
+
+    facets = requests.result()
+    waste_types = {row['_id']: {'count': row['count'], 'completed': row['completed']} for row in facets['waste_types']}
+    return {
+        'total_requests': sum(row['count'] for row in waste_types.values()),
+        'completed_requests': sum(row['completed'] for row in waste_types.values()),
+        'total_marketplace_posts': posts.result(),
+        'waste_type_breakdown': waste_types,
+        'location_breakdown': {row['_id']: row['count'] for row in facets['locations']},
+    }
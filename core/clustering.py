@@ -0,0 +1,177 @@
+"""Grid-bucketed clustering for the admin collection heatmap.
+
+Points are dicts with ``id``, ``latitude``, ``longitude``, ``location``,
+``status`` and ``waste_type``. Cells are at least ``radius_km`` wide, so every
+neighbour of a point lies in its own cell or one of the eight around it and
+each neighbour search touches a handful of cells instead of every request.
+"""
+from collections import deque
+from math import floor
+
+import numpy as np
+
+from .distance import coordinate_arrays, distances_km
+from .geo import bounding_deltas, haversine
+
+
+class _Grid:
+    def __init__(self, points, radius_km):
+        max_lat = max(abs(point['latitude']) for point in points)
+        self.lat_size, self.lon_size = bounding_deltas(max_lat, radius_km)
+        self.lat_size = max(self.lat_size, 1e-9)
+        self.lon_size = max(self.lon_size, 1e-9)
+        self.cells = {}
+        for index, point in enumerate(points):
+            self.cells.setdefault(self.cell(point), {})[index] = None
+
+    def cell(self, point):
+        return (
+            floor(point['latitude'] / self.lat_size),
+            floor(point['longitude'] / self.lon_size),
+        )
+
+    def nearby(self, point):
+        """Indices in the 3x3 block of cells around ``point``."""
+        row, col = self.cell(point)
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                members = self.cells.get((row + d_row, col + d_col))
+                if members:
+                    yield from list(members)
+
+    def discard(self, index, point):
+        members = self.cells[self.cell(point)]
+        del members[index]
+
+
+def _new_cluster(center):
+    return {
+        'center': {
+            'latitude': center['latitude'],
+            'longitude': center['longitude'],
+            'location': center['location'],
+        },
+        'count': 0,
+        'request_ids': [],
+        'statuses': {},
+        'waste_types': {},
+    }
+
+
+def _add(cluster, point):
+    cluster['count'] += 1
+    cluster['request_ids'].append(point['id'])
+    cluster['statuses'][point['status']] = cluster['statuses'].get(point['status'], 0) + 1
+    cluster['waste_types'][point['waste_type']] = cluster['waste_types'].get(point['waste_type'], 0) + 1
+
+
+def _usable(points):
+    return [
+        point for point in points
+        if point.get('latitude') is not None and point.get('longitude') is not None
+    ]
+
+
+def cluster_points(points, radius_km):
+    """Greedy radius clustering, largest cluster first.
+
+    Each unassigned point in input order seeds a cluster that absorbs every
+    unassigned point within ``radius_km`` of it.
+    """
+    points = _usable(points)
+    if not points:
+        return []
+
+    grid = _Grid(points, radius_km)
+    assigned = [False] * len(points)
+    clusters = []
+
+    for i, seed in enumerate(points):
+        if assigned[i]:
+            continue
+        cluster = _new_cluster(seed)
+        members = [i] + [
+            j for j in grid.nearby(seed)
+            if j != i and haversine(
+                seed['latitude'], seed['longitude'],
+                points[j]['latitude'], points[j]['longitude'],
+            ) <= radius_km
+        ]
+        for j in sorted(members):
+            assigned[j] = True
+            grid.discard(j, points[j])
+            _add(cluster, points[j])
+        clusters.append(cluster)
+
+    return sorted(clusters, key=lambda x: x['count'], reverse=True)
+
+
+def dbscan_points(points, radius_km, min_points):
+    """DBSCAN with ``eps = radius_km``.
+
+    Returns ``(clusters, noise_ids)``; a cluster's center is the mean position
+    of its members and its location label comes from its first core point.
+    """
+    points = _usable(points)
+    if not points:
+        return [], []
+
+    grid = _Grid(points, radius_km)
+    lats, lons = coordinate_arrays(points)
+    cells = {cell: np.fromiter(members, dtype=np.intp) for cell, members in grid.cells.items()}
+    empty = np.empty(0, dtype=np.intp)
+
+    def neighbours(i):
+        # Dense areas put thousands of points in the 3x3 block; filter them in one vectorized pass
+        row, col = grid.cell(points[i])
+        candidates = np.concatenate([
+            cells.get((row + d_row, col + d_col), empty)
+            for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)
+        ])
+        distances = distances_km(lats[i], lons[i], lats[candidates], lons[candidates])
+        return candidates[distances <= radius_km].tolist()
+
+    labels = [None] * len(points)  # None = unvisited, -1 = noise, else cluster number
+    clusters = []
+
+    for i in range(len(points)):
+        if labels[i] is not None:
+            continue
+        seed_neighbours = neighbours(i)
+        if len(seed_neighbours) < min_points:
+            labels[i] = -1
+            continue
+
+        label = len(clusters)
+        cluster = _new_cluster(points[i])
+        clusters.append(cluster)
+        labels[i] = label
+        # Points are labelled as they are queued, so each is queued at most once
+        queue = deque([i])
+        while queue:
+            j = queue.popleft()
+            j_neighbours = seed_neighbours if j == i else neighbours(j)
+            if len(j_neighbours) < min_points:
+                continue  # Border point: in the cluster but not expanded
+            for k in j_neighbours:
+                if labels[k] is None:
+                    labels[k] = label
+                    queue.append(k)
+                elif labels[k] == -1:
+                    labels[k] = label  # Border point previously taken for noise
+
+    sums = [[0.0, 0.0] for _ in clusters]
+    noise_ids = []
+    for point, label in zip(points, labels):
+        if label == -1:
+            noise_ids.append(point['id'])
+            continue
+        _add(clusters[label], point)
+        sums[label][0] += point['latitude']
+        sums[label][1] += point['longitude']
+
+    for cluster, (lat_sum, lon_sum) in zip(clusters, sums):
+        cluster['center']['latitude'] = lat_sum / cluster['count']
+        cluster['center']['longitude'] = lon_sum / cluster['count']
+
+    return sorted(clusters, key=lambda x: x['count'], reverse=True), noise_ids
@@ -0,0 +1,35 @@
+"""Repair of counters cached on documents, such as a user's unread badge."""
+
+
+def reconcile(model, field, counted, key, match=None):
+    """Reset ``field`` of every ``model`` document to the number of
+    ``counted`` documents whose ``key`` is its id, among those matching
+    ``match``.
+
+    One aggregation finds the counters that look wrong. Each of them is
+    then recounted after it was read and only overwritten if it still holds
+    the value read, so increments and decrements landing meanwhile are
+    never lost. Returns the number of counters corrected.
+    """
+    match = match or {}
+    collection = counted._get_collection()
+    actual = {
+        row['_id']: row['count'] for row in collection.aggregate([
+            {'$match': match},
+            {'$group': {'_id': f'${key}', 'count': {'$sum': 1}}},
+        ])
+    }
+    documents = model._get_collection()
+    corrected = 0
+    for document in documents.find(
+        {'$or': [{field: {'$nin': [0, None]}}, {'_id': {'$in': list(actual)}}]}, {field: 1}
+    ):
+        stored = document.get(field)
+        if (stored or 0) == actual.get(document['_id'], 0):
+            continue
+        count = collection.count_documents({**match, key: document['_id']})
+        if (stored or 0) == count:
+            continue  # Only looked wrong because of a write since the aggregation
+        result = documents.update_one({'_id': document['_id'], field: stored}, {'$set': {field: count}})
+        corrected += result.modified_count
+    return corrected
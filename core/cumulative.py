@@ -0,0 +1,264 @@
+"""Prefix sums of collection requests and marketplace posts over time.
+
+``CumulativeCounts`` keeps, per UTC day, the running totals of requests by
+waste type and status and of marketplace posts by waste type, created up to
+the end of that day. The counts of any whole-day range are the totals
+through its last day minus the totals through the day before it: two
+indexed lookups, however long the range.
+
+Writes add to the totals of their day and of every later day. A status
+change moves a request between statuses in every day from the one it was
+created on.
+"""
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from . import rollups
+from .models import CollectionRequest, CumulativeCounts, MarketplacePost
+from .rollups import day_of, fields_of
+
+
+def _key(value):
+    # Waste types and statuses become sub-document keys; the full-width
+    # characters keep them readable back with _name()
+    return str(value).replace('.', '\uff0e').replace('$', '\uff04') if value else 'unknown'
+
+
+def _name(key):
+    return key.replace('\uff0e', '.').replace('\uff04', '$')
+
+
+def _request_path(waste_type, status):
+    return f'requests.{_key(waste_type)}.{_key(status or "pending")}'
+
+
+def _post_path(waste_type):
+    return f'marketplace_posts.{_key(waste_type)}'
+
+
+def _apply(increments):
+    """Add ``{day: {path: n}}`` to the totals of ``day`` and every later day."""
+    collection = CumulativeCounts._get_collection()
+    for day in sorted(increments):
+        inc = {path: n for path, n in increments[day].items() if n}
+        if not inc:
+            continue
+        if not collection.find_one({'day': day}, {'_id': 1}):
+            # The day starts from the totals of the closest earlier one. A
+            # write to an earlier day landing between this read and the
+            # insert misses the new day; check_cumulative_counts reports
+            # such drift and rebuild_cumulative_counts repairs it.
+            seed = collection.find_one({'day': {'$lt': day}}, sort=[('day', -1)]) or {}
+            try:
+                collection.insert_one({
+                    'day': day,
+                    'requests': seed.get('requests', {}),
+                    'marketplace_posts': seed.get('marketplace_posts', {}),
+                })
+            except DuplicateKeyError:
+                pass
+        collection.update_many({'day': {'$gte': day}}, {'$inc': inc})
+
+
+def _count_requests(requests, increments):
+    for req in requests:
+        created_at, waste_type, status = fields_of(req, 'created_at', 'waste_type', 'status')
+        increments[day_of(created_at)][_request_path(waste_type, status)] += 1
+
+
+def _count_posts(posts, increments):
+    for post in posts:
+        created_at, waste_type = fields_of(post, 'created_at', 'waste_type')
+        increments[day_of(created_at)][_post_path(waste_type)] += 1
+
+
+def record_requests_created(requests):
+    """Count newly created collection requests."""
+    increments = defaultdict(lambda: defaultdict(int))
+    _count_requests(requests, increments)
+    _apply(increments)
+
+
+def record_status_change(requests, old_status, new_status):
+    """Move requests between status totals after a status update."""
+    if old_status == new_status:
+        return
+    increments = defaultdict(lambda: defaultdict(int))
+    for req in requests:
+        created_at, waste_type = fields_of(req, 'created_at', 'waste_type')
+        increments[day_of(created_at)][_request_path(waste_type, old_status)] -= 1
+        increments[day_of(created_at)][_request_path(waste_type, new_status)] += 1
+    _apply(increments)
+
+
+def record_posts_created(posts):
+    """Count newly created marketplace posts."""
+    increments = defaultdict(lambda: defaultdict(int))
+    _count_posts(posts, increments)
+    _apply(increments)
+
+
+def _totals_through(day):
+    """Totals up to the end of ``day``, or of all time for ``None``."""
+    query = {} if day is None else {'day': {'$lte': day}}
+    return CumulativeCounts._get_collection().find_one(query, sort=[('day', -1)]) or {}
+
+
+def _difference(after, before):
+    return {key: after[key] - before.get(key, 0) for key in after if after[key] - before.get(key, 0)}
+
+
+def range_counts(first_day=None, last_day=None):
+    """Requests ``{waste_type: {status: n}}`` and marketplace posts
+    ``{waste_type: n}`` created from ``first_day`` through ``last_day``
+    (either open when ``None``)."""
+    after = _totals_through(last_day)
+    before = _totals_through(first_day - timedelta(days=1)) if first_day else {}
+    requests = {}
+    for waste_type, statuses in after.get('requests', {}).items():
+        counts = _difference(statuses, before.get('requests', {}).get(waste_type, {}))
+        if counts:
+            requests[_name(waste_type)] = {_name(status): n for status, n in counts.items()}
+    posts = _difference(after.get('marketplace_posts', {}), before.get('marketplace_posts', {}))
+    return {
+        'requests': requests,
+        'marketplace_posts': {_name(waste_type): n for waste_type, n in posts.items()},
+    }
+
+
+def scan_counts(first_day=None, last_day=None):
+    """What ``range_counts`` should return, read from the raw collections."""
+    match = {}
+    if first_day or last_day:
+        match['created_at'] = {}
+        if first_day:
+            match['created_at']['$gte'] = first_day
+        if last_day:
+            match['created_at']['$lt'] = last_day + timedelta(days=1)
+    requests = defaultdict(lambda: defaultdict(int))
+    for row in CollectionRequest._get_collection().aggregate([
+        {'$match': match},
+        {'$group': {'_id': {'waste_type': '$waste_type', 'status': '$status'}, 'count': {'$sum': 1}}},
+    ]):
+        requests[_key(row['_id'].get('waste_type'))][_key(row['_id'].get('status') or 'pending')] += row['count']
+    posts = defaultdict(int)
+    for row in MarketplacePost._get_collection().aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$waste_type', 'count': {'$sum': 1}}},
+    ]):
+        posts[_key(row['_id'])] += row['count']
+    return {
+        'requests': {
+            _name(waste_type): {_name(status): n for status, n in statuses.items()}
+            for waste_type, statuses in requests.items()
+        },
+        'marketplace_posts': {_name(waste_type): n for waste_type, n in posts.items()},
+    }
+
+
+def request_breakdown(first_day=None, last_day=None, waste_type=None):
+    """``analytics.request_breakdown`` for requests created from ``first_day``
+    through ``last_day``, optionally of one ``waste_type``, without reading
+    the raw collections.
+
+    Totals come from the prefix sums and ``location_breakdown`` from the
+    daily rollups.
+    """
+    counts = range_counts(first_day, last_day)
+    requests = counts['requests']
+    posts = counts['marketplace_posts']
+    if waste_type:
+        requests = {key: statuses for key, statuses in requests.items() if key == waste_type}
+        posts = {key: n for key, n in posts.items() if key == waste_type}
+    waste_types = {
+        key: {'count': sum(statuses.values()), 'completed': statuses.get('completed', 0)}
+        for key, statuses in requests.items()
+    }
+    return {
+        'total_requests': sum(row['count'] for row in waste_types.values()),
+        'completed_requests': sum(row['completed'] for row in waste_types.values()),
+        'total_marketplace_posts': sum(posts.values()),
+        'waste_type_breakdown': dict(sorted(waste_types.items(), key=lambda item: (-item[1]['count'], item[0]))),
+        'location_breakdown': rollups.area_counts(first_day, last_day, waste_type),
+    }
+
+
+def whole_days(start, end, end_is_date):
+    """``(first_day, last_day)`` when a ``start``/``end`` filter covers whole
+    UTC days, else ``None``. ``end`` only does when it was given as a date."""
+    if start and start != day_of(start):
+        return None
+    if end and not end_is_date:
+        return None
+    return start, end
+
+
+def rebuild():
+    """Recompute every day's totals from the raw collections.
+
+    Returns the number of days stored and of requests and posts counted.
+    """
+    increments = defaultdict(lambda: defaultdict(int))
+    requests = CollectionRequest.objects().only('created_at', 'waste_type', 'status').as_pymongo()
+    posts = MarketplacePost.objects().only('created_at', 'waste_type').as_pymongo()
+    totals = {'collection_requests': 0, 'marketplace_posts': 0}
+    for batch in rollups.batched(requests):
+        _count_requests(batch, increments)
+        totals['collection_requests'] += len(batch)
+    for batch in rollups.batched(posts):
+        _count_posts(batch, increments)
+        totals['marketplace_posts'] += len(batch)
+
+    running = {'requests': defaultdict(lambda: defaultdict(int)), 'marketplace_posts': defaultdict(int)}
+    documents = []
+    for day in sorted(increments):
+        for path, n in increments[day].items():
+            kind, *keys = path.split('.')
+            if kind == 'requests':
+                running['requests'][keys[0]][keys[1]] += n
+            else:
+                running['marketplace_posts'][keys[0]] += n
+        documents.append({
+            'day': day,
+            'requests': {waste_type: dict(statuses) for waste_type, statuses in running['requests'].items()},
+            'marketplace_posts': dict(running['marketplace_posts']),
+        })
+
+    def fill(collection):
+        for batch in rollups.batched(documents):
+            collection.insert_many(batch)
+
+    rollups.replace_collection(CumulativeCounts, fill)
+    totals['days'] = len(documents)
+    return totals
+
+
+def check(samples=50, seed=None, today=None):
+    """Compare ``range_counts`` with ``scan_counts`` on all time, the first
+    and last day and ``samples`` random ranges in between.
+
+    Returns the number of ranges checked and ``[(first_day, last_day,
+    expected, got)]`` for those that differ.
+    """
+    first = CumulativeCounts._get_collection().find_one({}, sort=[('day', 1)])
+    ranges = [(None, None)]
+    if first:
+        start = first['day']
+        end = day_of(today or datetime.utcnow())
+        span = max((end - start).days, 0)
+        ranges += [(start, start), (end, end)]
+        rng = random.Random(seed)
+        for _ in range(samples):
+            offset = rng.randint(0, span)
+            length = rng.randint(0, span - offset)
+            ranges.append((start + timedelta(days=offset), start + timedelta(days=offset + length)))
+    mismatches = []
+    for first_day, last_day in ranges:
+        expected = scan_counts(first_day, last_day)
+        got = range_counts(first_day, last_day)
+        if got != expected:
+            mismatches.append((first_day, last_day, expected, got))
+    return len(ranges), mismatches
@@ -0,0 +1,44 @@
+"""Vectorized great-circle distances for filtering many rows at once.
+
+``core.geo.haversine`` remains the scalar reference implementation; the
+functions here compute the same formula over NumPy arrays.
+"""
+import numpy as np
+
+from .geo import EARTH_RADIUS_KM
+
+
+def coordinate_arrays(rows, lat_key='latitude', lon_key='longitude'):
+    """Split an iterable of dicts into latitude and longitude float arrays.
+
+    Missing coordinates become NaN, which never falls within a radius.
+    """
+    rows = list(rows)
+    lats = np.array([row.get(lat_key) for row in rows], dtype=float)
+    lons = np.array([row.get(lon_key) for row in rows], dtype=float)
+    return lats, lons
+
+
+def distances_km(lat, lon, lats, lons):
+    """Distance in km from (lat, lon) to every point in ``lats``/``lons``."""
+    lat1 = np.radians(lat)
+    lats = np.radians(np.asarray(lats, dtype=float))
+    dlat = lats - lat1
+    dlon = np.radians(np.asarray(lons, dtype=float) - lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lats) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def within_radius(lat, lon, lats, lons, radius_km, sort=False):
+    """Distances plus the within-radius mask in one call.
+
+    Returns ``(distances, mask, order)`` where ``order`` holds the indices of
+    the matching points, nearest first when ``sort`` is true and in input
+    order otherwise.
+    """
+    distances = distances_km(lat, lon, lats, lons)
+    mask = distances <= radius_km
+    order = np.flatnonzero(mask)
+    if sort:
+        order = order[np.argsort(distances[order], kind='stable')]
+    return distances, mask, order
@@ -0,0 +1,304 @@
+"""Pickup schedule notifications.
+
+Creating a schedule only queues a ``FanoutJob``; ``run_fanout_worker`` claims
+jobs and notifies the covered users in chunks of ``FANOUT_CHUNK_SIZE``,
+saving the cursor after every chunk. Every step of a chunk can be replayed
+after a crash without duplicates: emails are queued first under a key per
+schedule and user, then users that already have a pickup notification for
+the schedule are skipped.
+
+Who was notified is recorded in ``schedule_recipients`` rather than on the
+schedule, see ``record_recipients``.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import ReturnDocument, UpdateOne
+
+from .counters import reconcile
+from .distance import coordinate_arrays, distances_km
+from .geo import km_to_radians
+from .mailqueue import enqueue_many
+from .models import FanoutJob, Notification, PickupSchedule, ScheduleRecipient, User
+from .notifications import literal, shared_template, write_notifications
+from .spatial import ACTIVE_SCHEDULE_STATUSES, schedule_index
+
+
+def pickup_text(schedule):
+    """Title and message template of a schedule's pickup notifications"""
+    return (
+        "Pickup Scheduled in Your Area",
+        f"A waste pickup for {literal(schedule.garbage_type)} is scheduled on {schedule.date_time.strftime('%Y-%m-%d at %H:%M')} near {literal(schedule.location)}. Distance: {{distance:.2f}}km",
+    )
+
+
+def pickup_template(schedule):
+    """Shared text of a schedule's pickup notifications; the distance is filled in per user"""
+    return shared_template(f"pickup_schedule:{schedule.id}", *pickup_text(schedule))
+
+
+def pickup_notification(user, schedule, distance, template):
+    """Unsaved in-app notification for one user covered by a schedule"""
+    return Notification(
+        user=user,
+        pickup_schedule=schedule,
+        template=template,
+        params={'distance': round(distance, 2)},
+        notification_type="pickup_schedule"
+    )
+
+
+def pickup_email_key(user, schedule):
+    """Queue key of a user's pickup email, so it is queued once per schedule"""
+    return f"pickup_schedule:{schedule.id}:{user.id}"
+
+
+def pickup_email(user, schedule, distance):
+    """Queued email for one user covered by a schedule"""
+    return (
+        'Waste Pickup Scheduled in Your Area - FohorMalai',
+        f"""
+Dear {user.full_name},
+
+A waste pickup has been scheduled in your area:
+
+📅 Date & Time: {schedule.date_time.strftime('%Y-%m-%d at %H:%M')}
+📍 Location: {schedule.location}
+🗂️ Waste Type: {schedule.garbage_type}
+📏 Distance from you: {distance:.2f}km
+
+{schedule.description if schedule.description else ''}
+
+Please prepare your {schedule.garbage_type} waste for collection.
+
+Best regards,
+FohorMalai Team
+        """,
+        'fohormalaideu@gmail.com',
+        [user.email],
+    )
+
+
+def record_recipients(recipients):
+    """Record ``(schedule_id, user_id, distance_km)`` recipients and add the new
+    ones to each schedule's ``notified_count``. Recording a recipient twice is a
+    no-op. Returns how many were new.
+    """
+    if not recipients:
+        return 0
+    now = datetime.utcnow()
+    result = ScheduleRecipient._get_collection().bulk_write([
+        UpdateOne(
+            {'pickup_schedule': schedule_id, 'user': user_id},
+            {'$setOnInsert': {'distance_km': round(distance, 2), 'notified_at': now}},
+            upsert=True,
+        ) for schedule_id, user_id, distance in recipients
+    ], ordered=False)
+    added = Counter(recipients[i][0] for i in result.upserted_ids)
+    if added:
+        PickupSchedule._get_collection().bulk_write([
+            UpdateOne({'_id': schedule_id}, {'$inc': {'notified_count': count}})
+            for schedule_id, count in added.items()
+        ], ordered=False)
+    return sum(added.values())
+
+
+def reconcile_notified_counts():
+    """Reset every schedule's ``notified_count`` to its number of recipients.
+
+    Returns the number of schedules whose count was corrected.
+    """
+    return reconcile(PickupSchedule, 'notified_count', ScheduleRecipient, 'pickup_schedule')
+
+
+def notify_user_of_active_schedules(user):
+    """Attach a newly registered or relocated user to active schedules covering them"""
+    if user.is_admin or user.latitude is None or user.longitude is None:
+        return []
+
+    matches = schedule_index().covering(user.latitude, user.longitude, now=datetime.utcnow())
+    if not matches:
+        return []
+
+    # Skip schedules that already notified this user
+    matched_ids = [schedule_id for schedule_id, _ in matches]
+    notified = ScheduleRecipient._get_collection().distinct(
+        'pickup_schedule', {'user': user.id, 'pickup_schedule': {'$in': matched_ids}}
+    )
+    schedules = {
+        schedule.id: schedule for schedule in PickupSchedule.objects(
+            id__in=[schedule_id for schedule_id in matched_ids if schedule_id not in notified],
+            status__in=ACTIVE_SCHEDULE_STATUSES,
+        )
+    }
+
+    covering = [
+        (schedules[schedule_id], distance) for schedule_id, distance in matches
+        if schedule_id in schedules
+    ]
+    if not covering:
+        return []
+
+    enqueue_many(
+        [pickup_email(user, schedule, distance) for schedule, distance in covering],
+        keys=[pickup_email_key(user, schedule) for schedule, _ in covering],
+    )
+    write_notifications([
+        pickup_notification(user, schedule, distance, pickup_template(schedule))
+        for schedule, distance in covering
+    ])
+    record_recipients([(schedule.id, user.id, distance) for schedule, distance in covering])
+
+    return [schedule for schedule, _ in covering]
+
+
+def enqueue_fanout(schedule):
+    """Queue the notification job of a newly created schedule."""
+    return FanoutJob(pickup_schedule=schedule).save()
+
+
+def job_progress(job):
+    """Progress of a job as returned to admins."""
+    return {
+        'id': str(job.id),
+        'schedule_id': str(job.pickup_schedule.id),
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed,
+        'notified': job.notified,
+        'percent': round(100 * job.processed / job.total, 1) if job.total else (100.0 if job.status == 'completed' else 0.0),
+        'attempts': job.attempts,
+        'last_error': job.last_error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None,
+        'completed_at': job.completed_at.isoformat() if job.completed_at else None,
+    }
+
+
+def claim_job(lease_seconds=None):
+    """Atomically take the oldest queued job, or one whose worker's lease ran out."""
+    lease_seconds = lease_seconds or getattr(settings, 'FANOUT_LEASE_SECONDS', 120)
+    now = datetime.utcnow()
+    return FanoutJob._get_collection().find_one_and_update(
+        {'$or': [
+            {'status': 'queued'},
+            {'status': 'running', 'locked_until': {'$lt': now}},
+        ]},
+        {
+            '$set': {
+                'status': 'running',
+                'lease': ObjectId(),
+                'locked_until': now + timedelta(seconds=lease_seconds),
+                'updated_at': now,
+            },
+            '$inc': {'attempts': 1},
+            '$min': {'started_at': now},
+        },
+        sort=[('created_at', 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+class LeaseLost(Exception):
+    """Another worker claimed the job after this worker's lease expired."""
+
+
+def _update_job(job, update, lease_seconds):
+    now = datetime.utcnow()
+    update.setdefault('$set', {}).update(
+        updated_at=now, locked_until=now + timedelta(seconds=lease_seconds)
+    )
+    result = FanoutJob._get_collection().update_one({'_id': job['_id'], 'lease': job['lease']}, update)
+    if not result.matched_count:
+        raise LeaseLost(job['_id'])
+
+
+def run_job(job, chunk_size=None, lease_seconds=None, max_attempts=None):
+    """Notify the remaining users of a claimed job (a raw ``fanout_jobs`` document).
+
+    Failures put the job back in the queue until ``FANOUT_MAX_ATTEMPTS``.
+    Returns the job's final status.
+    """
+    chunk_size = chunk_size or getattr(settings, 'FANOUT_CHUNK_SIZE', 500)
+    lease_seconds = lease_seconds or getattr(settings, 'FANOUT_LEASE_SECONDS', 120)
+    max_attempts = max_attempts or getattr(settings, 'FANOUT_MAX_ATTEMPTS', 5)
+    try:
+        return _run(job, chunk_size, lease_seconds)
+    except LeaseLost:
+        return 'lease lost'
+    except Exception as e:
+        status = 'failed' if job['attempts'] >= max_attempts else 'queued'
+        FanoutJob._get_collection().update_one(
+            {'_id': job['_id'], 'lease': job['lease']},
+            {'$set': {'status': status, 'last_error': str(e), 'locked_until': None,
+                      'updated_at': datetime.utcnow()}},
+        )
+        return status
+
+
+def _run(job, chunk_size, lease_seconds):
+    schedule = PickupSchedule.objects(id=job['pickup_schedule']).first()
+    if schedule is None or schedule.status not in ACTIVE_SCHEDULE_STATUSES:
+        _update_job(job, {'$set': {'status': 'cancelled', 'completed_at': datetime.utcnow()}}, lease_seconds)
+        return 'cancelled'
+
+    # Read from Mongo rather than this process's user grid, which misses
+    # users registered or moved by the web workers since it was built
+    covered = User.objects(
+        is_verified=True, is_admin=False,
+        location_point__geo_within_sphere=[
+            [schedule.longitude, schedule.latitude], km_to_radians(schedule.coverage_radius_km)
+        ],
+    )
+    if job.get('total') is None:
+        _update_job(job, {'$set': {'total': covered.count()}}, lease_seconds)
+    cursor = job.get('cursor')
+    template = None
+
+    while True:
+        # Users in _id order so the cursor marks a stable position
+        page = covered.filter(id__gt=cursor) if cursor else covered
+        users = list(
+            page.order_by('id').only('id', 'full_name', 'email', 'latitude', 'longitude').limit(chunk_size)
+        )
+        if not users:
+            break
+        lats, lons = coordinate_arrays({'latitude': user.latitude, 'longitude': user.longitude} for user in users)
+        chunk = list(zip(users, distances_km(schedule.latitude, schedule.longitude, lats, lons).tolist()))
+        template = template or pickup_template(schedule)
+        notified = _notify_chunk(schedule, template, chunk)
+        cursor = users[-1].id
+        _update_job(job, {
+            '$set': {'cursor': cursor},
+            '$inc': {'processed': len(chunk), 'notified': notified},
+        }, lease_seconds)
+
+    _update_job(job, {'$set': {'status': 'completed', 'completed_at': datetime.utcnow()}}, lease_seconds)
+    return 'completed'
+
+
+def _notify_chunk(schedule, template, chunk):
+    """Notify one chunk of ``(user, distance)``; returns how many of them now have a notification."""
+    # Emails first and keyed, so users whose notification an earlier attempt
+    # wrote still get theirs, and none get two
+    enqueue_many(
+        [pickup_email(user, schedule, distance) for user, distance in chunk],
+        keys=[pickup_email_key(user, schedule) for user, _ in chunk],
+    )
+    user_ids = [user.id for user, _ in chunk]
+    # Users notified by an earlier attempt at this chunk
+    done = set(Notification._get_collection().distinct('user', {
+        'pickup_schedule': schedule.id,
+        'notification_type': 'pickup_schedule',
+        'user': {'$in': user_ids},
+    }))
+    recipients = [(user, distance) for user, distance in chunk if user.id not in done]
+    write_notifications([
+        pickup_notification(user, schedule, distance, template) for user, distance in recipients
+    ])
+    # Users in ``done`` too, in case the last attempt stopped before recording them
+    record_recipients([(schedule.id, user.id, distance) for user, distance in chunk])
+    return len(chunk)
@@ -0,0 +1,34 @@
+from math import radians, degrees, cos, sin, asin, sqrt, pi
+
+EARTH_RADIUS_KM = 6371  # Earth radius in kilometers
+KM_PER_DEGREE = EARTH_RADIUS_KM * pi / 180  # Great-circle length of one degree
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Calculate the great circle distance between two points on the earth (in km)
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
+    c = 2 * asin(sqrt(a))
+    return EARTH_RADIUS_KM * c
+
+
+def to_point(latitude, longitude):
+    """GeoJSON point for a lat/lng pair (GeoJSON stores longitude first)."""
+    if latitude is None or longitude is None:
+        return None
+    return {'type': 'Point', 'coordinates': [longitude, latitude]}
+
+
+def km_to_radians(radius_km):
+    """Convert a distance to the angular radius used by $centerSphere."""
+    return radius_km / EARTH_RADIUS_KM
+
+
+def bounding_deltas(latitude, radius_km):
+    """Half-width in degrees (lat, lng) of the box enclosing a circle at ``latitude``."""
+    dlat = radius_km / KM_PER_DEGREE
+    ratio = sin(radius_km / EARTH_RADIUS_KM) / max(cos(radians(min(abs(latitude), 90.0))), 1e-12)
+    # The circle reaches a pole: every longitude is in range
+    dlon = 180.0 if ratio >= 1 or abs(latitude) + dlat >= 90 else degrees(asin(ratio))
+    return dlat, dlon
@@ -0,0 +1,157 @@
+"""Pre-aggregated heatmap tiles for collection requests.
+
+Every request is counted in one web-mercator tile per zoom level in
+``HEATMAP_ZOOM_LEVELS``. Writes update the affected tiles with ``$inc``
+upserts, and the heatmap reads only the tiles inside the visible box.
+"""
+from collections import defaultdict
+from math import cos, floor, log, pi, radians, tan
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+from .models import CollectionRequest, HeatmapTile
+
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def zoom_levels():
+    return sorted(getattr(settings, 'HEATMAP_ZOOM_LEVELS', [6, 9, 12, 15]))
+
+
+def stored_zoom(zoom):
+    """Closest maintained zoom level at or below ``zoom``."""
+    levels = zoom_levels()
+    below = [level for level in levels if level <= zoom]
+    return below[-1] if below else levels[0]
+
+
+def tile_for(lat, lon, zoom):
+    """Slippy-map tile (x, y) containing the point at ``zoom``."""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    n = 2 ** zoom
+    x = floor((lon + 180.0) / 360.0 * n)
+    y = floor((1.0 - log(tan(radians(lat)) + 1 / cos(radians(lat))) / pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _key(value):
+    # Status and waste type values become sub-document keys
+    return str(value).replace('.', '_').replace('$', '_') if value else 'unknown'
+
+
+def _write(increments):
+    if not increments:
+        return
+    HeatmapTile._get_collection().bulk_write([
+        UpdateOne(
+            {'zoom': zoom, 'tile_x': x, 'tile_y': y},
+            {'$inc': dict(inc)},
+            upsert=True,
+        )
+        for (zoom, x, y), inc in increments.items()
+    ], ordered=False)
+
+
+def _increments(points, change):
+    increments = defaultdict(lambda: defaultdict(int))
+    for point in points:
+        if point['latitude'] is None or point['longitude'] is None:
+            continue
+        for zoom in zoom_levels():
+            tile = (zoom,) + tile_for(point['latitude'], point['longitude'], zoom)
+            change(increments[tile], point)
+    return increments
+
+
+def _point(req):
+    # Accepts documents as well as raw rows read with as_pymongo()
+    if isinstance(req, dict):
+        return {
+            'latitude': req.get('latitude'),
+            'longitude': req.get('longitude'),
+            'status': req.get('status', 'pending'),
+            'waste_type': req.get('waste_type'),
+        }
+    return {
+        'latitude': req.latitude,
+        'longitude': req.longitude,
+        'status': req.status,
+        'waste_type': req.waste_type,
+    }
+
+
+def _count(inc, point):
+    inc['count'] += 1
+    inc['latitude_sum'] += point['latitude']
+    inc['longitude_sum'] += point['longitude']
+    inc[f"statuses.{_key(point['status'])}"] += 1
+    inc[f"waste_types.{_key(point['waste_type'])}"] += 1
+
+
+def record_created(requests):
+    """Count newly created collection requests."""
+    _write(_increments([_point(req) for req in requests], _count))
+
+
+def record_status_change(requests, old_status, new_status):
+    """Move requests between status counters after a status update."""
+    if old_status == new_status:
+        return
+
+    def change(inc, point):
+        inc[f'statuses.{_key(old_status)}'] -= 1
+        inc[f'statuses.{_key(new_status)}'] += 1
+
+    _write(_increments([_point(req) for req in requests], change))
+
+
+def tiles_in_bbox(min_lat, min_lng, max_lat, max_lng, zoom):
+    """Heatmap clusters for the tiles covering a bounding box."""
+    zoom = stored_zoom(zoom)
+    # Tile y grows southwards
+    min_x, max_y = tile_for(min_lat, min_lng, zoom)
+    max_x, min_y = tile_for(max_lat, max_lng, zoom)
+    tiles = HeatmapTile.objects(
+        zoom=zoom,
+        tile_x__gte=min_x, tile_x__lte=max_x,
+        tile_y__gte=min_y, tile_y__lte=max_y,
+        count__gt=0,
+    ).as_pymongo()
+
+    clusters = []
+    for tile in tiles:
+        clusters.append({
+            'center': {
+                'latitude': tile['latitude_sum'] / tile['count'],
+                'longitude': tile['longitude_sum'] / tile['count'],
+            },
+            'count': tile['count'],
+            'statuses': {k: v for k, v in tile.get('statuses', {}).items() if v},
+            'waste_types': {k: v for k, v in tile.get('waste_types', {}).items() if v},
+            'tile': {'zoom': zoom, 'x': tile['tile_x'], 'y': tile['tile_y']},
+        })
+    return zoom, sorted(clusters, key=lambda x: x['count'], reverse=True)
+
+
+def rebuild():
+    """Recompute every tile from ``collection_requests``."""
+    HeatmapTile.drop_collection()
+    HeatmapTile.ensure_indexes()
+    requests = CollectionRequest.objects().only(
+        'latitude', 'longitude', 'status', 'waste_type'
+    ).as_pymongo()
+    batch = []
+    total = 0
+    for req in requests:
+        batch.append(req)
+        if len(batch) == 5000:
+            total += _rebuild_batch(batch)
+            batch = []
+    total += _rebuild_batch(batch)
+    return total
+
+
+def _rebuild_batch(batch):
+    _write(_increments([_point(req) for req in batch], _count))
+    return len(batch)
@@ -0,0 +1,178 @@
+"""Declared indexes and the query shapes they are meant to serve.
+
+Every model declares its indexes in ``meta``; MongoEngine creates missing
+ones the first time a process touches the collection, and the TTL indexes
+come from ``core.retention``. ``sync_indexes`` (the management command)
+creates them up front, reports indexes nothing uses or that another index
+already covers, and explains every shape in ``query_shapes`` to confirm it
+is answered from an index.
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from .models import (
+    OTP, CollectionRequest, CumulativeCounts, DailyRollup, FanoutJob, HeatmapTile, MarketplacePost,
+    Notification, NotificationEvent, NotificationTemplate, OutboundEmail, PickupSchedule, ScheduleRecipient,
+    User,
+)
+from .retention import ensure_ttl_indexes, ttl_indexes
+from .spatial import ACTIVE_SCHEDULE_STATUSES
+
+MODELS = [
+    User, OTP, PickupSchedule, ScheduleRecipient, MarketplacePost, CollectionRequest,
+    NotificationTemplate, Notification, NotificationEvent, HeatmapTile, DailyRollup, CumulativeCounts,
+    OutboundEmail, FanoutJob,
+]
+
+
+def _raw_collection(model):
+    # Unlike _get_collection(), does not create the declared indexes as a side effect
+    return model._get_db()[model._get_collection_name()]
+
+
+def sync_indexes():
+    """Create every declared and TTL index that does not exist yet.
+
+    Returns ``[(collection, key)]`` for the indexes created.
+    """
+    created = []
+    for model in MODELS:
+        collection = _raw_collection(model)
+        before = [index['key'] for index in collection.index_information().values()]
+        model.ensure_indexes()
+        created.extend(
+            (collection.name, index['key']) for index in collection.index_information().values()
+            if index['key'] not in before
+        )
+    created.extend((name, [(field, 1)]) for name, field, action in ensure_ttl_indexes() if action == 'created')
+    return created
+
+
+def _covers(key, other):
+    """Whether ``other`` starts with ``key``, read in either direction."""
+    if len(key) >= len(other):
+        return False
+    prefix = other[:len(key)]
+    if prefix == key:
+        return True
+    reversed_key = [(field, -direction) if isinstance(direction, int) else (field, direction)
+                    for field, direction in key]
+    return prefix == reversed_key
+
+
+def index_report(model):
+    """Usage of each index on ``model``'s collection from ``$indexStats``.
+
+    Every entry has the index ``name``, ``key``, ``ops`` (uses since
+    ``since``, the last server restart) and ``problems``: ``unused``,
+    ``redundant with <name>`` for a plain index that is a prefix of another,
+    or ``undeclared`` when neither the model nor ``core.retention`` asks for it.
+    """
+    collection = model._get_collection()
+    declared = model.list_indexes() + [
+        [(field, 1)] for ttl_model, field, _ in ttl_indexes() if ttl_model is model
+    ]
+    stats = list(collection.aggregate([{'$indexStats': {}}]))
+    keys = {stat['name']: list(stat['key'].items()) for stat in stats}
+
+    report = []
+    for stat in stats:
+        name = stat['name']
+        key = keys[name]
+        spec = stat.get('spec', {})
+        # Uniqueness, expiry and _id are needed even when no query reads them
+        plain = name != '_id_' and not spec.get('unique') and 'expireAfterSeconds' not in spec
+        problems = []
+        if plain and not stat['accesses']['ops']:
+            problems.append('unused')
+        if plain and not spec.get('partialFilterExpression'):
+            problems.extend(
+                f'redundant with {other}' for other, other_key in keys.items() if _covers(key, other_key)
+            )
+        if name != '_id_' and key not in declared:
+            problems.append('undeclared')
+        report.append({
+            'name': name,
+            'key': key,
+            'ops': stat['accesses']['ops'],
+            'since': stat['accesses']['since'],
+            'problems': problems,
+        })
+    return report
+
+
+def query_shapes():
+    """``(label, model, filter, sort)`` for the queries the views and workers run.
+
+    Values are placeholders; only the shape matters to the planner.
+    """
+    now = datetime.utcnow()
+    some_id = ObjectId()
+
+    def newest(field):
+        return [(field, -1), ('_id', -1)]
+
+    def after(field):
+        # The filter paginate() adds for every page after the first
+        return {'$or': [{field: {'$lt': now}}, {field: now, '_id': {'$lt': some_id}}]}
+
+    return [
+        ('login / user by email', User, {'email': 'user@example.com'}, None),
+        ('admin users', User, {}, newest('registered_on')),
+        ('admin users, next page', User, after('registered_on'), newest('registered_on')),
+        ('regular user count', User, {'is_verified': True, 'is_admin': False}, None),
+        ('latest OTP', OTP, {'email': 'user@example.com'}, [('created_at', -1)]),
+        ('marketplace feed', MarketplacePost, {}, newest('created_at')),
+        ('collection requests', CollectionRequest, {}, newest('created_at')),
+        ('collection requests by status', CollectionRequest, {'status': 'pending'}, newest('created_at')),
+        ('collection requests in radius', CollectionRequest,
+         {'location_point': {'$geoWithin': {'$centerSphere': [[85.3, 27.7], 0.0003]}}}, newest('created_at')),
+        ("user's collection requests", CollectionRequest, {'user': some_id}, [('created_at', -1)]),
+        ('notifications', Notification, {'user': some_id}, newest('sent_at')),
+        ('notifications, next page', Notification, dict(after('sent_at'), user=some_id), newest('sent_at')),
+        ('unread notifications', Notification, {'user': some_id, 'is_read': False}, newest('sent_at')),
+        ('mark read up to', Notification,
+         {'user': some_id, 'is_read': False, 'sent_at': {'$lte': now}}, None),
+        ('fan-out replay check', Notification,
+         {'pickup_schedule': some_id, 'notification_type': 'pickup_schedule', 'user': {'$in': [some_id]}}, None),
+        ('notifications to archive', Notification, {'sent_at': {'$lt': now}}, [('_id', 1)]),
+        ('pickup schedules', PickupSchedule, {}, newest('created_at')),
+        ('pickup schedules by status', PickupSchedule, {'status': 'scheduled'}, newest('created_at')),
+        ('upcoming active schedules', PickupSchedule,
+         {'status': {'$in': ACTIVE_SCHEDULE_STATUSES}, 'date_time': {'$gte': now}}, None),
+        ("today's active pickups", PickupSchedule,
+         {'status': {'$in': ['scheduled', 'in_progress']},
+          'date_time': {'$gte': now, '$lt': now + timedelta(days=1)}}, [('date_time', 1)]),
+        ('schedule recipients', ScheduleRecipient, {'pickup_schedule': some_id}, newest('notified_at')),
+        ("user's schedules", ScheduleRecipient, {'user': some_id}, None),
+        ('claim fan-out job', FanoutJob,
+         {'$or': [{'status': 'queued'}, {'status': 'running', 'locked_until': {'$lt': now}}]},
+         [('created_at', 1)]),
+        ('claim email', OutboundEmail,
+         {'$or': [{'status': 'queued', 'next_attempt_at': {'$lte': now}},
+                  {'status': 'sending', 'locked_until': {'$lt': now}}]},
+         [('next_attempt_at', 1)]),
+        ('heatmap tiles in view', HeatmapTile,
+         {'zoom': 14, 'tile_x': {'$gte': 0, '$lte': 10}, 'tile_y': {'$gte': 0, '$lte': 10}, 'count': {'$gt': 0}},
+         None),
+        ('daily rollups in range', DailyRollup, {'day': {'$gte': now, '$lte': now}}, None),
+        ('cumulative counts through a day', CumulativeCounts, {'day': {'$lte': now}}, [('day', -1)]),
+    ]
+
+
+def _stages(plan):
+    yield plan['stage']
+    for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+        if child:
+            yield from _stages(child)
+
+
+def explain(model, filter, sort=None):
+    """Stages of the winning plan for ``find(filter).sort(sort)``, outermost first."""
+    cursor = model._get_collection().find(filter)
+    if sort:
+        cursor = cursor.sort(sort)
+    plan = cursor.explain()['queryPlanner']['winningPlan']
+    # Plans run by the slot-based engine (MongoDB 7+) nest the classic plan one level down
+    return list(_stages(plan.get('queryPlan', plan)))
@@ -0,0 +1,133 @@
+"""Mongo-backed outbound email queue.
+
+Views enqueue messages and return immediately; ``run_mail_worker`` claims
+batches, sends each batch over one SMTP connection, and retries failures
+with exponential backoff.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from pymongo import ReturnDocument, UpdateOne
+
+from .models import OutboundEmail
+
+
+def _queued(subject, body, from_email, recipients):
+    return OutboundEmail(
+        subject=subject, body=body, from_email=from_email, recipients=list(recipients)
+    ).to_mongo().to_dict()
+
+
+def enqueue_mail(subject, body, from_email, recipients):
+    """Queue one message; same arguments as ``send_mail``."""
+    OutboundEmail._get_collection().insert_one(_queued(subject, body, from_email, recipients))
+
+
+def enqueue_many(messages, keys=None):
+    """Queue ``(subject, body, from_email, recipients)`` tuples with one insert.
+
+    With ``keys`` (one per message) each message is upserted under its key
+    instead, so queueing the same messages again adds nothing. Returns the
+    number of messages newly queued.
+    """
+    documents = [_queued(*message) for message in messages]
+    if not documents:
+        return 0
+    if keys is None:
+        OutboundEmail._get_collection().insert_many(documents, ordered=False)
+        return len(documents)
+    result = OutboundEmail._get_collection().bulk_write([
+        UpdateOne({'key': key}, {'$setOnInsert': document}, upsert=True)
+        for key, document in zip(keys, documents)
+    ], ordered=False)
+    return result.upserted_count
+
+
+def claim_batch(batch_size, lease_seconds=None):
+    """Atomically take up to ``batch_size`` due messages for this worker.
+
+    Messages whose lease expired (a worker died mid-send) are claimed again.
+    """
+    lease_seconds = lease_seconds or getattr(settings, 'MAIL_QUEUE_LEASE_SECONDS', 300)
+    collection = OutboundEmail._get_collection()
+    now = datetime.utcnow()
+    claimed = []
+    for _ in range(batch_size):
+        message = collection.find_one_and_update(
+            {'$or': [
+                {'status': 'queued', 'next_attempt_at': {'$lte': now}},
+                {'status': 'sending', 'locked_until': {'$lt': now}},
+            ]},
+            {
+                '$set': {'status': 'sending', 'locked_until': now + timedelta(seconds=lease_seconds)},
+                '$inc': {'attempts': 1},
+            },
+            sort=[('next_attempt_at', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if message is None:
+            break
+        claimed.append(message)
+    return claimed
+
+
+def deliver_batch(batch, connection=None, max_attempts=None, backoff_seconds=None):
+    """Send claimed messages over a single SMTP connection and record the outcome.
+
+    Returns ``(sent, failed)`` counts; failures are rescheduled with
+    exponential backoff until ``max_attempts`` is reached.
+    """
+    if not batch:
+        return 0, 0
+    max_attempts = max_attempts or getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 5)
+    backoff_seconds = backoff_seconds or getattr(settings, 'MAIL_QUEUE_BACKOFF_SECONDS', 30)
+    collection = OutboundEmail._get_collection()
+    connection = connection or get_connection()
+
+    sent_ids = []
+    failed = 0
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing can be delivered; every message goes back to the queue
+        for message in batch:
+            _reschedule(collection, message, e, max_attempts, backoff_seconds)
+        return 0, len(batch)
+
+    try:
+        for message in batch:
+            email = EmailMessage(
+                message['subject'], message['body'], message['from_email'],
+                message['recipients'], connection=connection,
+            )
+            try:
+                email.send(fail_silently=False)
+                sent_ids.append(message['_id'])
+            except Exception as e:
+                failed += 1
+                _reschedule(collection, message, e, max_attempts, backoff_seconds)
+    finally:
+        connection.close()
+
+    if sent_ids:
+        collection.update_many(
+            {'_id': {'$in': sent_ids}},
+            {'$set': {'status': 'sent', 'sent_at': datetime.utcnow()}, '$unset': {'locked_until': ''}},
+        )
+    return len(sent_ids), failed
+
+
+def _reschedule(collection, message, error, max_attempts, backoff_seconds):
+    attempts = message.get('attempts', 1)
+    update = {'last_error': str(error)}
+    if attempts >= max_attempts:
+        update['status'] = 'failed'
+    else:
+        update['status'] = 'queued'
+        update['next_attempt_at'] = datetime.utcnow() + timedelta(
+            seconds=backoff_seconds * 2 ** (attempts - 1)
+        )
+    collection.update_one(
+        {'_id': message['_id']}, {'$set': update, '$unset': {'locked_until': ''}}
+    )
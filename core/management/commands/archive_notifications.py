@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.retention import archive_notifications, ensure_ttl_indexes
+
+
+class Command(BaseCommand):
+    help = 'Apply the OTP and read-notification TTL indexes and move old notifications to the archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            help='Archive notifications sent before this many days ago '
+                                 '(default NOTIFICATION_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float,
+                            help='Keep running, archiving every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        for collection, field, action in ensure_ttl_indexes():
+            self.stdout.write(f'{collection}: TTL index on {field} {action}')
+        while True:
+            moved = archive_notifications(options['older_than_days'], options['batch_size'])
+            self.stdout.write(f'Archived {moved} notifications')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.models import CollectionRequest, MarketplacePost, PickupSchedule, User
+
+
+class Command(BaseCommand):
+    help = 'Populate location_point from latitude/longitude and build the 2dsphere indexes.'
+
+    models = [User, PickupSchedule, CollectionRequest, MarketplacePost]
+
+    def handle(self, *args, **options):
+        for model in self.models:
+            collection = model._get_collection()
+            # Single server-side pass per collection; documents without
+            # numeric coordinates are left alone.
+            result = collection.update_many(
+                {
+                    'location_point': None,
+                    'latitude': {'$type': 'number'},
+                    'longitude': {'$type': 'number'},
+                },
+                [{'$set': {'location_point': {
+                    'type': 'Point',
+                    'coordinates': ['$longitude', '$latitude'],
+                }}}],
+            )
+            model.ensure_indexes()
+            self.stdout.write(
+                f'{collection.name}: backfilled {result.modified_count} documents'
+            )
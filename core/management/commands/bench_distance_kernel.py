@@ -0,0 +1,58 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.distance import distances_km, within_radius
+from core.geo import haversine
+
+
+class Command(BaseCommand):
+    help = 'Check the vectorized distance kernel against scalar haversine and time both.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000)
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument('--radius-km', type=float, default=2.0)
+        parser.add_argument('--tolerance-km', type=float, default=1e-6)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        tolerance = options['tolerance_km']
+
+        # Agreement on arbitrary points, including antipodes, poles and the antimeridian
+        worst = 0.0
+        for _ in range(options['samples']):
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            lats = [rng.uniform(-90, 90) for _ in range(50)] + [-lat, 90.0, -90.0, lat]
+            lons = [rng.uniform(-180, 180) for _ in range(50)] + [lon + 180, lon, lon, lon]
+            vectorized = distances_km(lat, lon, lats, lons)
+            for i, (other_lat, other_lon) in enumerate(zip(lats, lons)):
+                worst = max(worst, abs(vectorized[i] - haversine(lat, lon, other_lat, other_lon)))
+        if worst > tolerance:
+            raise CommandError(f'Kernels disagree by up to {worst:.3e} km')
+        self.stdout.write(f'Max difference from scalar haversine: {worst:.3e} km')
+
+        # Throughput on a dense city-sized cloud
+        size = options['size']
+        radius_km = options['radius_km']
+        lats = [rng.uniform(27.6, 27.8) for _ in range(size)]
+        lons = [rng.uniform(85.2, 85.45) for _ in range(size)]
+        lat, lon = 27.7, 85.32
+
+        started = time.perf_counter()
+        scalar = [i for i in range(size) if haversine(lat, lon, lats[i], lons[i]) <= radius_km]
+        scalar_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, _, order = within_radius(lat, lon, lats, lons, radius_km)
+        vector_s = time.perf_counter() - started
+
+        if scalar != order.tolist():
+            raise CommandError('Kernels selected different points')
+        self.stdout.write(
+            f'{size} points: scalar {scalar_s * 1000:.1f}ms  '
+            f'vectorized {vector_s * 1000:.1f}ms  '
+            f'speedup {scalar_s / max(vector_s, 1e-9):.1f}x'
+        )
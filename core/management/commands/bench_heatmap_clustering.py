@@ -0,0 +1,86 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.clustering import cluster_points, dbscan_points
+from core.geo import haversine
+
+STATUSES = ['pending', 'out_for_collection', 'completed', 'cancelled']
+WASTE_TYPES = ['Plastic', 'Organic', 'Metal', 'Paper', 'Glass']
+
+
+def quadratic_clusters(points, radius_km):
+    """The all-pairs clustering the heatmap used before the grid engine."""
+    clusters = []
+    processed = set()
+    for i, req in enumerate(points):
+        if req['id'] in processed:
+            continue
+        cluster = {
+            'center': {'latitude': req['latitude'], 'longitude': req['longitude'], 'location': req['location']},
+            'count': 1,
+            'request_ids': [req['id']],
+            'statuses': {req['status']: 1},
+            'waste_types': {req['waste_type']: 1},
+        }
+        processed.add(req['id'])
+        for j, other in enumerate(points):
+            if i == j or other['id'] in processed:
+                continue
+            if haversine(req['latitude'], req['longitude'], other['latitude'], other['longitude']) <= radius_km:
+                cluster['count'] += 1
+                cluster['request_ids'].append(other['id'])
+                cluster['statuses'][other['status']] = cluster['statuses'].get(other['status'], 0) + 1
+                cluster['waste_types'][other['waste_type']] = cluster['waste_types'].get(other['waste_type'], 0) + 1
+                processed.add(other['id'])
+        clusters.append(cluster)
+    return sorted(clusters, key=lambda x: x['count'], reverse=True)
+
+
+class Command(BaseCommand):
+    help = 'Time heatmap clustering at increasing request counts (Kathmandu valley sized area).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,5000,10000,50000,200000')
+        parser.add_argument('--radius-km', type=float, default=1.0)
+        parser.add_argument('--min-points', type=int, default=5)
+        parser.add_argument('--reference-max', type=int, default=5000,
+                            help='Largest size to also run the quadratic reference on')
+        parser.add_argument('--seed', type=int, default=3)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        radius_km = options['radius_km']
+
+        for size in [int(n) for n in options['sizes'].split(',')]:
+            points = [
+                {
+                    'id': str(i),
+                    'latitude': rng.uniform(27.6, 27.8),
+                    'longitude': rng.uniform(85.2, 85.45),
+                    'location': f'Ward {i % 32}',
+                    'status': rng.choice(STATUSES),
+                    'waste_type': rng.choice(WASTE_TYPES),
+                } for i in range(size)
+            ]
+
+            started = time.perf_counter()
+            clusters = cluster_points(points, radius_km)
+            grid_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            dense, noise = dbscan_points(points, radius_km, options['min_points'])
+            dbscan_s = time.perf_counter() - started
+
+            line = (
+                f'{size:>7} requests  grid {grid_s:8.3f}s ({len(clusters)} clusters)  '
+                f'dbscan {dbscan_s:8.3f}s ({len(dense)} clusters, {len(noise)} noise)'
+            )
+            if size <= options['reference_max']:
+                started = time.perf_counter()
+                reference = quadratic_clusters(points, radius_km)
+                line += f'  quadratic {time.perf_counter() - started:8.3f}s'
+                if reference != clusters:
+                    raise CommandError(f'{size} requests: grid clusters differ from the quadratic reference')
+            self.stdout.write(line)
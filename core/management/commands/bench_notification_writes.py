@@ -0,0 +1,67 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.fanout import pickup_text
+from core.models import Notification, PickupSchedule, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare writing one fan-out of fully rendered notifications with the '
+        'template-based shape, in scratch collections that are dropped afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=10000)
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500))
+        parser.add_argument('--seed', type=int, default=13)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        schedule = PickupSchedule(
+            id=ObjectId(),
+            admin=User(id=ObjectId()),
+            date_time=datetime.utcnow() + timedelta(days=1),
+            location='Ward 4, Baneshwor, Kathmandu',
+            latitude=27.69, longitude=85.34,
+            garbage_type='recyclable',
+            description='Weekly recyclable pickup',
+        )
+        title, message = pickup_text(schedule)
+        template_id = ObjectId()
+        distances = [rng.uniform(0, 5) for _ in range(options['recipients'])]
+
+        def base(distance):
+            return Notification(
+                user=User(id=ObjectId()), pickup_schedule=schedule, notification_type='pickup_schedule'
+            ).to_mongo().to_dict()
+
+        inline = [
+            dict(base(distance), title=title, message=message.format(distance=distance))
+            for distance in distances
+        ]
+        templated = [
+            dict(base(distance), template=template_id, params={'distance': round(distance, 2)})
+            for distance in distances
+        ]
+
+        db = Notification._get_db()
+        for label, documents in (('rendered', inline), ('template', templated)):
+            collection = db[f'bench_notifications_{label}']
+            collection.drop()
+            started = time.perf_counter()
+            for start in range(0, len(documents), options['chunk_size']):
+                collection.insert_many(documents[start:start + options['chunk_size']], ordered=False)
+            elapsed = time.perf_counter() - started
+            size = sum(len(bson.encode(document)) for document in documents)
+            collection.drop()
+            self.stdout.write(
+                f'{label:>8}: {size / len(documents):.0f} bytes/notification  '
+                f'{size / 1e6:.2f}MB total  {len(documents) / elapsed:.0f} inserts/s'
+            )
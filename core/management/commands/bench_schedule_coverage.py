@@ -0,0 +1,58 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.geo import haversine
+from core.spatial import ScheduleCoverageIndex
+
+# Rough bounding box of Nepal
+LAT_RANGE = (26.3, 30.4)
+LON_RANGE = (80.0, 88.2)
+
+
+class Command(BaseCommand):
+    help = 'Compare point-in-coverage lookups on the schedule coverage index against a scan of every schedule.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedules', type=int, default=100000)
+        parser.add_argument('--lookups', type=int, default=1000)
+        parser.add_argument('--max-radius-km', type=float, default=5.0)
+        parser.add_argument('--cell-km', type=float, default=5.0)
+        parser.add_argument('--seed', type=int, default=11)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        schedules = [
+            (i, rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE), rng.uniform(0.5, options['max_radius_km']))
+            for i in range(options['schedules'])
+        ]
+        users = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(options['lookups'])]
+
+        started = time.perf_counter()
+        index = ScheduleCoverageIndex(options['cell_km'])
+        for schedule_id, lat, lon, radius_km in schedules:
+            index.add(schedule_id, lat, lon, radius_km)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        indexed = [sorted(i for i, _ in index.covering(lat, lon)) for lat, lon in users]
+        index_s = (time.perf_counter() - started) / len(users)
+
+        scan_users = users[:max(1, len(users) // 20)]
+        started = time.perf_counter()
+        scanned = [
+            sorted(i for i, s_lat, s_lon, radius_km in schedules if haversine(lat, lon, s_lat, s_lon) <= radius_km)
+            for lat, lon in scan_users
+        ]
+        scan_s = (time.perf_counter() - started) / len(scan_users)
+
+        if indexed[:len(scan_users)] != scanned:
+            raise CommandError('Coverage index and full scan disagree')
+
+        self.stdout.write(
+            f'{len(schedules)} active schedules  build {build_s:.2f}s  '
+            f'index {index_s * 1e6:.1f}us/lookup  scan {scan_s * 1000:.1f}ms/lookup  '
+            f'speedup {scan_s / max(index_s, 1e-9):.0f}x  '
+            f'avg matches {sum(map(len, indexed)) / len(indexed):.2f}'
+        )
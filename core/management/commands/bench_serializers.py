@@ -0,0 +1,120 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+
+from core import serializers
+from core.models import CollectionRequest, MarketplacePost, Notification, PickupSchedule, User
+
+
+def _when(rng):
+    return datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(365 * 86400))
+
+
+def _user(rng):
+    return User(
+        id=ObjectId(), full_name='Sita Sharma', email=f'user{rng.randrange(10**6)}@example.com',
+        phone=f'98{rng.randrange(10**8):08d}', password='x', location='Baneshwor',
+        latitude=rng.uniform(27.6, 27.8), longitude=rng.uniform(85.2, 85.4),
+        is_verified=rng.random() < 0.8, registered_on=_when(rng),
+    )
+
+
+def _marketplace_post(rng):
+    return MarketplacePost(
+        id=ObjectId(), user=ObjectId(), title='PET bottles', description='Clean, crushed bottles',
+        hashtags=['plastic', 'recycle'], price=rng.uniform(10, 500), quantity='5kg',
+        waste_type='plastic', location='Baneshwor', latitude=rng.uniform(27.6, 27.8),
+        longitude=rng.uniform(85.2, 85.4), image_url='https://example.com/a.jpg', created_at=_when(rng),
+    )
+
+
+def _collection_request(rng):
+    return CollectionRequest(
+        id=ObjectId(), user=ObjectId(), waste_type='organic', quantity='2kg', pickup_date=_when(rng),
+        location='Baneshwor', latitude=rng.uniform(27.6, 27.8), longitude=rng.uniform(85.2, 85.4),
+        special_notes='Near the gate', created_at=_when(rng),
+    )
+
+
+def _notification(rng):
+    return Notification(
+        id=ObjectId(), user=ObjectId(), pickup_schedule=ObjectId(), template=ObjectId(),
+        params={'distance': round(rng.uniform(0, 5), 2)}, notification_type='pickup_schedule',
+        is_read=rng.random() < 0.5, sent_at=_when(rng),
+    )
+
+
+def _pickup_schedule(rng):
+    return PickupSchedule(
+        id=ObjectId(), admin=ObjectId(), date_time=_when(rng), location='Baneshwor',
+        latitude=rng.uniform(27.6, 27.8), longitude=rng.uniform(85.2, 85.4), coverage_radius_km=2.0,
+        garbage_type='recyclable', description='Weekly pickup',
+        notified_count=rng.randrange(20), created_at=_when(rng),
+    )
+
+
+ENDPOINTS = (
+    ('marketplace posts', MarketplacePost, serializers.MARKETPLACE_POST, _marketplace_post),
+    ('collection requests', CollectionRequest, serializers.COLLECTION_REQUEST, _collection_request),
+    ('admin users', User, serializers.ADMIN_USER, _user),
+    ('notifications', Notification, serializers.NOTIFICATION, _notification),
+    ('pickup schedules', PickupSchedule, serializers.PICKUP_SCHEDULE, _pickup_schedule),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time reading list endpoint rows as MongoEngine documents against the raw '
+        'as_pymongo() readers, on synthetic rows shaped like each projection.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=11)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        for label, model, reader, make in ENDPOINTS:
+            # What as_pymongo() returns for the endpoint's projection
+            db_fields = {model._fields[name].db_field for name in reader.fields}
+            rows = []
+            for _ in range(options['rows']):
+                son = make(rng).to_mongo().to_dict()
+                rows.append({key: value for key, value in son.items() if key in db_fields})
+
+            def from_documents():
+                values = []
+                for row in rows:
+                    document = model._from_son(row, _auto_dereference=False)
+                    values.append({
+                        name: getattr(document, name) for name in reader.fields
+                    })
+                return values
+
+            def from_rows():
+                return [reader(row) for row in rows]
+
+            timings = {}
+            results = {}
+            for name, read in (('documents', from_documents), ('raw rows', from_rows)):
+                started = time.perf_counter()
+                results[name] = read()
+                timings[name] = time.perf_counter() - started
+
+            # References read as DBRefs off a document and as ObjectIds off a raw row
+            documents = [
+                {name: getattr(value, 'id', value) if not isinstance(value, list)
+                 else [getattr(item, 'id', item) for item in value] for name, value in row.items()}
+                for row in results['documents']
+            ]
+            if documents != results['raw rows']:
+                raise CommandError(f'{label}: raw rows read differently from documents')
+
+            self.stdout.write(
+                f'{label:>20}: documents {timings["documents"] * 1000:.0f}ms  '
+                f'raw rows {timings["raw rows"] * 1000:.0f}ms  '
+                f'({timings["documents"] / timings["raw rows"]:.1f}x faster)'
+            )
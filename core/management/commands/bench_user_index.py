@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.geo import haversine
+from core.spatial import UserGridIndex
+
+# Rough bounding box of Nepal
+LAT_RANGE = (26.3, 30.4)
+LON_RANGE = (80.0, 88.2)
+
+
+class Command(BaseCommand):
+    help = 'Compare grid-index radius lookups against the linear haversine scan on synthetic users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000')
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--radius-km', type=float, default=2.0)
+        parser.add_argument('--cell-km', type=float, default=1.0)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        radius_km = options['radius_km']
+        centers = [
+            (rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE))
+            for _ in range(options['queries'])
+        ]
+
+        for size in [int(n) for n in options['sizes'].split(',')]:
+            users = [
+                (i, rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE))
+                for i in range(size)
+            ]
+
+            started = time.perf_counter()
+            index = UserGridIndex(options['cell_km'])
+            for user_id, lat, lon in users:
+                index.add(user_id, lat, lon)
+            build_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            linear_hits = []
+            for lat, lon in centers:
+                linear_hits.append(sorted(
+                    user_id for user_id, user_lat, user_lon in users
+                    if haversine(lat, lon, user_lat, user_lon) <= radius_km
+                ))
+            linear_s = (time.perf_counter() - started) / len(centers)
+
+            started = time.perf_counter()
+            grid_hits = []
+            for lat, lon in centers:
+                grid_hits.append(sorted(
+                    user_id for user_id, _ in index.query_radius(lat, lon, radius_km)
+                ))
+            grid_s = (time.perf_counter() - started) / len(centers)
+
+            if grid_hits != linear_hits:
+                self.stderr.write(f'{size} users: grid and linear results differ')
+
+            self.stdout.write(
+                f'{size:>9} users  build {build_s:8.3f}s  '
+                f'linear {linear_s * 1000:10.3f}ms/query  '
+                f'grid {grid_s * 1000:8.3f}ms/query  '
+                f'speedup {linear_s / max(grid_s, 1e-9):8.1f}x'
+            )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import cumulative
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare date-range counts read from the cumulative_counts prefix sums with a '
+        'scan of collection requests and marketplace posts, on sampled ranges.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=50)
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        checked, mismatches = cumulative.check(options['samples'], options['seed'])
+        for first_day, last_day, expected, got in mismatches:
+            label = f"{first_day.date() if first_day else '...'} to {last_day.date() if last_day else '...'}"
+            self.stdout.write(f'{label}: expected {expected}, got {got}')
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} of {checked} ranges differ; run rebuild_cumulative_counts'
+            )
+        self.stdout.write(f'All {checked} ranges match')
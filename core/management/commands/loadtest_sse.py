@@ -0,0 +1,95 @@
+import asyncio
+import resource
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Open many idle connections to the notification stream of a running ASGI server '
+            'and report how many stay connected and keep receiving heartbeats.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/user/notifications/stream/')
+        parser.add_argument('--email', required=True, help='Existing user to authenticate as')
+        parser.add_argument('--connections', type=int, default=5000)
+        parser.add_argument('--duration', type=float, default=60.0, help='Seconds to hold the connections')
+        parser.add_argument('--ramp', type=float, default=60.0, help='Seconds over which to open them')
+        parser.add_argument('--connect-timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        # Each connection is a file descriptor on both ends
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = options['connections'] + 256
+        if soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+        token = jwt.encode(
+            {'email': options['email'], 'exp': datetime.utcnow() + timedelta(hours=1)},
+            settings.SECRET_KEY, algorithm='HS256'
+        )
+        stats = asyncio.run(self.run(options, token))
+        connect_times = sorted(stats['connect_times']) or [0.0]
+        self.stdout.write(
+            f"connected {stats['connected']}/{options['connections']}  "
+            f"failed {stats['failed']}  still open at end {stats['open']}  "
+            f"heartbeats {stats['heartbeats']}  events {stats['events']}  "
+            f"connect p50 {connect_times[len(connect_times) // 2] * 1000:.0f}ms "
+            f"max {connect_times[-1] * 1000:.0f}ms"
+        )
+
+    async def run(self, options, token):
+        url = urlsplit(options['url'])
+        host, port = url.hostname, url.port or 80
+        request = (
+            f'GET {url.path} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+            f'Authorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n'
+        ).encode()
+        stats = {'connected': 0, 'failed': 0, 'open': 0, 'heartbeats': 0, 'events': 0, 'connect_times': []}
+        deadline = time.monotonic() + options['ramp'] + options['duration']
+
+        async def client(delay):
+            await asyncio.sleep(delay)
+            started = time.monotonic()
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), timeout=options['connect_timeout']
+                )
+                writer.write(request)
+                await writer.drain()
+                status = await asyncio.wait_for(reader.readline(), timeout=options['connect_timeout'])
+                if b' 200 ' not in status:
+                    raise ConnectionError(status)
+            except Exception:
+                stats['failed'] += 1
+                return
+            stats['connect_times'].append(time.monotonic() - started)
+            stats['connected'] += 1
+            stats['open'] += 1
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    line = await asyncio.wait_for(reader.readline(), timeout=remaining)
+                    if not line:
+                        stats['open'] -= 1
+                        return
+                    if line.startswith(b': heartbeat'):
+                        stats['heartbeats'] += 1
+                    elif line.startswith(b'event: notification'):
+                        stats['events'] += 1
+            except asyncio.TimeoutError:
+                pass
+            except Exception:
+                stats['open'] -= 1
+                return
+            writer.close()
+
+        count = options['connections']
+        await asyncio.gather(*(client(options['ramp'] * i / count) for i in range(count)))
+        return stats
@@ -0,0 +1,113 @@
+import hashlib
+import re
+from collections import defaultdict
+from itertools import groupby
+
+import bson
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from core.fanout import pickup_text
+from core.models import Notification, NotificationTemplate, PickupSchedule
+from core.notifications import literal, shared_template
+
+DISTANCE = re.compile(r'Distance: (\d+(?:\.\d+)?)km$')
+
+
+class Command(BaseCommand):
+    help = 'Move the text of existing notifications into shared templates and report the storage saved.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.templates = {}
+        self.operations = []
+        self.migrated = 0
+        self.bytes_before = self.bytes_after = 0
+
+        # Sorted like the (pickup_schedule, notification_type, user) index so
+        # each group arrives in one run and only one group is held at a time
+        rows = Notification.objects(template=None, title__ne=None).order_by(
+            'pickup_schedule', 'notification_type'
+        ).batch_size(self.batch_size).as_pymongo()
+        groups = groupby(rows, key=lambda row: (row.get('pickup_schedule'), row.get('notification_type')))
+
+        skipped = 0
+        for (schedule_id, notification_type), group in groups:
+            schedule = PickupSchedule.objects(id=schedule_id).first() if schedule_id else None
+            by_text = defaultdict(list)
+            for row in group:
+                params = self.pickup_params(row, schedule) if notification_type == 'pickup_schedule' else None
+                if params is None:
+                    by_text[(row['title'], row.get('message') or '')].append(row)
+                    continue
+                template = self.template(f'pickup_schedule:{schedule.id}', *pickup_text(schedule))
+                self.migrate(row, template, params)
+
+            # Other text is only worth sharing when several notifications carry it
+            for (title, message), same in by_text.items():
+                if len(same) < 2:
+                    skipped += len(same)
+                    continue
+                digest = hashlib.sha1(f'{title}\0{message}'.encode()).hexdigest()
+                template = self.template(f'migrated:{digest}', literal(title), literal(message))
+                for row in same:
+                    self.migrate(row, template, {})
+        self.flush()
+
+        self.stdout.write(
+            f"{'Would migrate' if self.dry_run else 'Migrated'} {self.migrated} notifications "
+            f"onto {len(self.templates)} templates; {skipped} with unique text stay inline"
+        )
+        if self.migrated:
+            template_bytes = sum(
+                len(bson.encode(template.to_mongo().to_dict())) for template in self.templates.values()
+            )
+            saved = self.bytes_before - self.bytes_after - template_bytes
+            self.stdout.write(
+                f'notifications {self.bytes_before} -> {self.bytes_after} bytes '
+                f'({self.bytes_before / self.migrated:.0f} -> {self.bytes_after / self.migrated:.0f} per document), '
+                f'plus {template_bytes} bytes of templates: saved {saved} bytes ({saved / self.bytes_before:.0%})'
+            )
+
+    def migrate(self, row, template, params):
+        """Queue the update pointing ``row`` at ``template``, flushing full batches."""
+        migrated = {key: value for key, value in row.items() if key not in ('title', 'message')}
+        migrated.update(template=template.id, params=params)
+        self.bytes_before += len(bson.encode(row))
+        self.bytes_after += len(bson.encode(migrated))
+        self.migrated += 1
+        self.operations.append(UpdateOne(
+            {'_id': row['_id']},
+            {'$set': {'template': template.id, 'params': params}, '$unset': {'title': '', 'message': ''}},
+        ))
+        if len(self.operations) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.operations and not self.dry_run:
+            Notification._get_collection().bulk_write(self.operations, ordered=False)
+        self.operations = []
+
+    def pickup_params(self, row, schedule):
+        """Template params when the stored text is exactly the schedule's pickup text."""
+        match = DISTANCE.search(row.get('message') or '')
+        if schedule is None or match is None:
+            return None
+        params = {'distance': float(match.group(1))}
+        title, message = pickup_text(schedule)
+        if row['title'] != title or row['message'] != message.format_map(params):
+            return None
+        return params
+
+    def template(self, key, title, message):
+        if key not in self.templates:
+            if self.dry_run:
+                self.templates[key] = NotificationTemplate(key=key, title=title, message=message)
+            else:
+                self.templates[key] = shared_template(key, title, message)
+        return self.templates[key]
@@ -0,0 +1,64 @@
+import math
+
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from core.distance import distances_km
+from core.fanout import reconcile_notified_counts
+from core.models import PickupSchedule, ScheduleRecipient, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the notified_users arrays of existing pickup schedules into schedule_recipients, '
+        'then correct every schedule\'s notified_count. Safe to run again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ScheduleRecipient.ensure_indexes()
+        schedules = PickupSchedule._get_collection()
+        recipients = ScheduleRecipient._get_collection()
+        batch_size = options['batch_size']
+
+        moved = migrated = 0
+        legacy = schedules.find(
+            {'notified_users': {'$exists': True}},
+            {'latitude': 1, 'longitude': 1, 'created_at': 1, 'notified_users': 1},
+        )
+        for schedule in legacy:
+            user_ids = list(dict.fromkeys(schedule.get('notified_users') or []))
+            for start in range(0, len(user_ids), batch_size):
+                batch = user_ids[start:start + batch_size]
+                users = {
+                    row['_id']: row for row in User.objects(id__in=batch).only(
+                        'id', 'latitude', 'longitude'
+                    ).as_pymongo()
+                }
+                # Distance from where the user lives now; the array never recorded it
+                rows = [users.get(user_id, {}) for user_id in batch]
+                distances = distances_km(
+                    schedule['latitude'], schedule['longitude'],
+                    [row.get('latitude') for row in rows], [row.get('longitude') for row in rows],
+                )
+                operations = [
+                    UpdateOne(
+                        {'pickup_schedule': schedule['_id'], 'user': user_id},
+                        {'$setOnInsert': {
+                            'distance_km': None if math.isnan(distance) else round(float(distance), 2),
+                            'notified_at': schedule.get('created_at'),
+                        }},
+                        upsert=True,
+                    ) for user_id, distance in zip(batch, distances)
+                ]
+                moved += recipients.bulk_write(operations, ordered=False).upserted_count
+            # Only drop the array once all its users are recorded
+            schedules.update_one({'_id': schedule['_id']}, {'$unset': {'notified_users': ''}})
+            migrated += 1
+
+        corrected = reconcile_notified_counts()
+        self.stdout.write(
+            f'Moved {moved} recipients out of {migrated} schedules; corrected {corrected} notified counts'
+        )
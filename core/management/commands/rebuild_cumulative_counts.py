@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import cumulative
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cumulative_counts prefix sums from collection requests and marketplace posts.'
+
+    def handle(self, *args, **options):
+        totals = cumulative.rebuild()
+        self.stdout.write(
+            f"Rebuilt {totals['days']} days of cumulative counts from {totals['collection_requests']} "
+            f"collection requests and {totals['marketplace_posts']} marketplace posts"
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily_rollups aggregate from collection requests, users and marketplace posts.'
+
+    def handle(self, *args, **options):
+        totals = rollups.rebuild()
+        self.stdout.write(
+            f"Rebuilt daily rollups from {totals['collection_requests']} collection requests, "
+            f"{totals['users']} users and {totals['marketplace_posts']} marketplace posts"
+        )
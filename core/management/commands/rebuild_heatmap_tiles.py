@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import heatmap
+
+
+class Command(BaseCommand):
+    help = 'Recompute the heatmap_tiles aggregate from collection_requests.'
+
+    def handle(self, *args, **options):
+        total = heatmap.rebuild()
+        self.stdout.write(f'Rebuilt heatmap tiles from {total} collection requests')
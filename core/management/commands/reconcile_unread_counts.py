@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.notifications import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Correct per-user unread notification counters from the notifications collection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep running, reconciling every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            corrected = reconcile_unread_counts()
+            self.stdout.write(f'Corrected {corrected} unread counters')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.fanout import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Notify the users covered by new pickup schedules, resuming interrupted jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int,
+                            default=getattr(settings, 'FANOUT_CHUNK_SIZE', 500),
+                            help='Users notified between progress saves')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when no job is waiting')
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs that are currently waiting and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            status = run_job(job, chunk_size=options['chunk_size'])
+            self.stdout.write(f"job {job['_id']} (schedule {job['pickup_schedule']}): {status}")
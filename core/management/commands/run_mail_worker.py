@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from core.mailqueue import claim_batch, deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails with a bounded pool of SMTP senders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of batches sent in parallel')
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', 50),
+                            help='Messages sent per SMTP connection')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the messages that are currently due and exit')
+        parser.add_argument('--smtp-host', help='Override EMAIL_HOST, e.g. a local debugging server')
+        parser.add_argument('--smtp-port', type=int, help='Override EMAIL_PORT')
+
+    def handle(self, *args, **options):
+        connection_kwargs = {}
+        if options['smtp_host']:
+            connection_kwargs['host'] = options['smtp_host']
+        if options['smtp_port']:
+            connection_kwargs['port'] = options['smtp_port']
+
+        def work():
+            batch = claim_batch(options['batch_size'])
+            return deliver_batch(batch, connection=get_connection(**connection_kwargs)) if batch else None
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            while True:
+                results = list(pool.map(lambda _: work(), range(options['concurrency'])))
+                delivered = [result for result in results if result]
+                for sent, failed in delivered:
+                    self.stdout.write(f'sent {sent}, failed {failed}')
+                if not delivered:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.indexes import MODELS, explain, index_report, query_shapes, sync_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        'Create missing indexes, report unused, redundant or undeclared ones from $indexStats, '
+        'and check that every known query shape is answered from an index.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-explain', action='store_true', help='Skip the query plan check')
+
+    def handle(self, *args, **options):
+        created = sync_indexes()
+        for collection, key in created:
+            self.stdout.write(f'Created {collection} {key}')
+        self.stdout.write(f'{len(created)} indexes created')
+
+        # Usage counters reset when mongod restarts, so "unused" is only
+        # meaningful after the server has been up through normal traffic
+        for model in MODELS:
+            for index in index_report(model):
+                if index['problems']:
+                    self.stdout.write(
+                        f'{model._get_collection_name()}.{index["name"]}: {", ".join(index["problems"])} '
+                        f'({index["ops"]} ops since {index["since"]:%Y-%m-%d %H:%M})'
+                    )
+
+        if options['no_explain']:
+            return
+        scans = []
+        for label, model, filter, sort in query_shapes():
+            stages = explain(model, filter, sort)
+            ok = 'IXSCAN' in stages and 'COLLSCAN' not in stages
+            self.stdout.write(f'{"ok  " if ok else "SCAN"} {label}: {" <- ".join(stages)}')
+            if not ok:
+                scans.append(label)
+        if scans:
+            raise CommandError(f'Not answered from an index: {", ".join(scans)}')
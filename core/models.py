@@ -1,7 +1,22 @@
-from mongoengine import Document, StringField, EmailField, BooleanField, DateTimeField, FloatField, ReferenceField, ListField, ImageField
+from mongoengine import Document, StringField, EmailField, BooleanField, DateTimeField, FloatField, IntField, DictField, ReferenceField, ListField, ImageField, PointField, ObjectIdField
 import datetime
 
-class User(Document):
+from .geo import to_point
+
+class GeoDocument(Document):
+    """Base for documents with a latitude/longitude pair.
+
+    ``location_point`` mirrors the coordinates as GeoJSON so Mongo can answer
+    radius queries from its 2dsphere index; it is refreshed on every save.
+    """
+    location_point = PointField()  # 2dsphere index is created automatically
+
+    meta = {'abstract': True}
+
+    def clean(self):
+        self.location_point = to_point(self.latitude, self.longitude)
+
+class User(GeoDocument):
     full_name = StringField(required=True)  
     email = EmailField(required=True, unique=True)
     phone = StringField(required=True, unique=True)
@@ -11,14 +26,26 @@ class User(Document):
     password = StringField(required=True)
     is_verified = BooleanField(default=False)
     is_admin = BooleanField(default=False)  
+    unread_notifications = IntField(default=0)  # Badge counter, see core.notifications
     registered_on = DateTimeField(default=datetime.datetime.utcnow)
 
+    # Each list view sorts on (sort field, _id) for keyset pagination; see
+    # core.indexes for the query shapes these serve
+    meta = {
+        'indexes': [
+            ('-registered_on', '-id'),  # Admin user list
+            ('is_verified', 'is_admin', '-registered_on'),  # Regular users, newest first
+        ],
+    }
+
 class OTP(Document):
     email = EmailField(required=True)
     otp_code = StringField(required=True)
-    created_at = DateTimeField(default=datetime.datetime.utcnow)
+    created_at = DateTimeField(default=datetime.datetime.utcnow)  # TTL index, see core.retention
+
+    meta = {'indexes': [('email', '-created_at')]}  # Latest code for an email
 
-class PickupSchedule(Document):
+class PickupSchedule(GeoDocument):
     admin = ReferenceField('User', required=True)  # Admin who created the schedule
     date_time = DateTimeField(required=True)
     location = StringField(required=True)
@@ -28,12 +55,42 @@ class PickupSchedule(Document):
     garbage_type = StringField(required=True)  # e.g., 'organic', 'plastic', etc.
     description = StringField()  # Additional details about the pickup
     status = StringField(default="scheduled")  # scheduled, in_progress, completed, cancelled
-    notified_users = ListField(ReferenceField('User'))  # Users who were notified
+    notified_count = IntField(default=0)  # Rows in schedule_recipients, see ScheduleRecipient
     created_at = DateTimeField(default=datetime.datetime.utcnow)
 
-    meta = {'collection': 'pickup_schedules'}
+    # Not strict so schedules still holding a legacy notified_users array load
+    # until migrate_schedule_recipients moves it out
+    meta = {
+        'collection': 'pickup_schedules',
+        'strict': False,
+        'indexes': [
+            ('-created_at', '-id'),  # Schedule lists
+            ('status', '-created_at', '-id'),  # Schedule lists filtered by status
+            ('status', 'date_time'),  # Active and upcoming schedules
+        ],
+    }
+
+class ScheduleRecipient(Document):
+    """A user notified of a pickup schedule.
+
+    Kept out of the schedule document so schedules stay small however many
+    users they cover; the schedule caches the total in ``notified_count``.
+    """
+    pickup_schedule = ReferenceField('PickupSchedule', required=True)
+    user = ReferenceField('User', required=True)
+    distance_km = FloatField()  # From the user to the pickup point when notified
+    notified_at = DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'schedule_recipients',
+        'indexes': [
+            {'fields': ['pickup_schedule', 'user'], 'unique': True},
+            ('pickup_schedule', '-notified_at', '-id'),  # Recipient pages
+            ('user', 'pickup_schedule'),  # Schedules that notified a user
+        ],
+    }
 
-class MarketplacePost(Document):
+class MarketplacePost(GeoDocument):
     user = ReferenceField('User', required=True)  # Reference to the posting user
     title = StringField(required=True)            # Short title or product name
     description = StringField(required=True)      # Detailed description
@@ -47,9 +104,14 @@ class MarketplacePost(Document):
     image_url = StringField()                  
     created_at = DateTimeField(default=datetime.datetime.utcnow)
 
-    meta = {'collection': 'marketplace_posts'}
+    meta = {
+        'collection': 'marketplace_posts',
+        'indexes': [
+            ('-created_at', '-id'),  # Marketplace feed
+        ],
+    }
 
-class CollectionRequest(Document):
+class CollectionRequest(GeoDocument):
     user = ReferenceField('User', required=True)
     waste_type = StringField(required=True)
     quantity = StringField(required=True)
@@ -60,18 +122,178 @@ class CollectionRequest(Document):
     image_url = StringField()
     special_notes = StringField()
     status = StringField(default="pending")  # Add this line with a default value
+    pickup_schedule = ReferenceField('PickupSchedule')  # Set when a bulk pickup is scheduled
+    created_at = DateTimeField(default=datetime.datetime.utcnow)
+    completed_at = DateTimeField()  # Set while status is "completed", for completion latency
+
+    meta = {
+        'collection': 'collection_requests',
+        'indexes': [
+            ('-created_at', '-id'),  # Request list and recent activity
+            ('status', '-created_at', '-id'),  # Request list filtered by status, status counts
+            ('user', '-created_at'),  # A user's own requests
+        ],
+    }
+
+class NotificationEvent(Document):
+    """A chunk of freshly written notifications, announced to open SSE streams.
+
+    Capped so only recent events are kept; every process serving streams
+    follows it with a tailable cursor and renders the notifications of its
+    own subscribers, see ``core.pubsub``.
+    """
+    notifications = ListField(ObjectIdField())
+    users = ListField(ObjectIdField())  # Recipient of each notification, in the same order
+
+    meta = {'collection': 'notification_events', 'max_size': 16 * 1024 * 1024}
+
+class NotificationTemplate(Document):
+    """Title and message shared by every notification of one event.
+
+    Placeholders such as ``{distance:.2f}`` are filled from each
+    notification's ``params`` with ``str.format`` when it is read.
+    """
+    key = StringField(required=True, unique=True)  # e.g. "pickup_schedule:<schedule id>"
+    title = StringField(required=True)
+    message = StringField(required=True)
     created_at = DateTimeField(default=datetime.datetime.utcnow)
 
-    meta = {'collection': 'collection_requests'}
+    meta = {'collection': 'notification_templates'}
 
 class Notification(Document):
     user = ReferenceField('User', required=True)
     pickup_schedule = ReferenceField('PickupSchedule', required=True)
-    title = StringField(required=True)
-    message = StringField(required=True)
+    template = ReferenceField('NotificationTemplate')
+    params = DictField()  # Per-recipient template values, e.g. {"distance": 1.25}
+    title = StringField()  # Inline text, only on notifications written without a template
+    message = StringField()
     notification_type = StringField(default="pickup_schedule")  # pickup_schedule, status_update, etc.
     is_read = BooleanField(default=False)
+    read_at = DateTimeField()  # Read notifications expire from here, see core.retention
     sent_at = DateTimeField(default=datetime.datetime.utcnow)
 
-    meta = {'collection': 'notifications'}
+    # The read_at TTL index is managed by core.retention
+    meta = {
+        'collection': 'notifications',
+        'indexes': [
+            ('user', '-sent_at', '-id'),  # A user's notifications
+            ('user', 'is_read', '-sent_at', '-id'),  # Filtered by is_read, and marking read
+            ('pickup_schedule', 'notification_type', 'user'),  # Fan-out replay check
+            ('sent_at',),  # Archiving
+        ],
+    }
+
+class HeatmapTile(Document):
+    """Collection request counts for one web-mercator tile at one zoom level.
+
+    Maintained incrementally by ``core.heatmap`` whenever requests are created
+    or change status, so the heatmap never has to scan ``collection_requests``.
+    """
+    zoom = IntField(required=True)
+    tile_x = IntField(required=True)
+    tile_y = IntField(required=True)
+    count = IntField(default=0)
+    latitude_sum = FloatField(default=0.0)  # For the tile's centroid
+    longitude_sum = FloatField(default=0.0)
+    statuses = DictField()
+    waste_types = DictField()
+
+    meta = {
+        'collection': 'heatmap_tiles',
+        'indexes': [
+            {'fields': ['zoom', 'tile_x', 'tile_y'], 'unique': True},
+        ],
+    }
+
+class DailyRollup(Document):
+    """Activity counters for one UTC day, area and waste type.
+
+    Maintained incrementally by ``core.rollups`` as requests, users and
+    marketplace posts are written, so the analytics endpoints sum a few
+    rollups per day instead of scanning the raw collections. Request counters
+    belong to the day the request was created; new users have no waste type.
+    """
+    day = DateTimeField(required=True)  # Midnight UTC
+    area = StringField(required=True)  # Part of the location before the first comma
+    waste_type = StringField(required=True)
+    created = IntField(default=0)
+    completed = IntField(default=0)
+    cancelled = IntField(default=0)
+    new_users = IntField(default=0)
+    marketplace_posts = IntField(default=0)
+    completion_seconds = FloatField(default=0.0)  # From created_at to completed_at
+    timed_completions = IntField(default=0)  # Completed requests with a completed_at
+
+    meta = {
+        'collection': 'daily_rollups',
+        'indexes': [
+            {'fields': ['day', 'area', 'waste_type'], 'unique': True},
+        ],
+    }
+
+class CumulativeCounts(Document):
+    """Running totals of everything created up to the end of one UTC day.
+
+    Maintained by ``core.cumulative``; a day without a document has the
+    totals of the closest earlier one, so the counts of any whole-day range
+    are the difference of two lookups.
+    """
+    day = DateTimeField(required=True, unique=True)  # Midnight UTC
+    requests = DictField()  # {waste_type: {status: count}}
+    marketplace_posts = DictField()  # {waste_type: count}
+
+    meta = {'collection': 'cumulative_counts'}
+
+class OutboundEmail(Document):
+    """Email waiting to be delivered by the ``run_mail_worker`` command."""
+    subject = StringField(required=True)
+    body = StringField(required=True)
+    from_email = StringField(required=True)
+    recipients = ListField(StringField(), required=True)
+    status = StringField(default="queued")  # queued, sending, sent, failed
+    attempts = IntField(default=0)
+    next_attempt_at = DateTimeField(default=datetime.datetime.utcnow)
+    locked_until = DateTimeField()  # Lease held by the worker currently sending it
+    last_error = StringField()
+    created_at = DateTimeField(default=datetime.datetime.utcnow)
+    sent_at = DateTimeField()
+    key = StringField()  # Set when queueing must be idempotent, e.g. "pickup_schedule:<schedule id>:<user id>"
+
+    meta = {
+        'collection': 'outbound_emails',
+        'indexes': [
+            ('status', 'next_attempt_at'),
+            ('status', 'locked_until'),
+            {'fields': ['key'], 'unique': True, 'sparse': True},
+        ],
+    }
+
+class FanoutJob(Document):
+    """Notifies the users covered by a pickup schedule, one chunk at a time.
+
+    Users are processed in ``_id`` order; ``cursor`` is the last user id
+    handled, so a job picked up again after a crash resumes from there. See
+    ``core.fanout`` and the ``run_fanout_worker`` command.
+    """
+    pickup_schedule = ReferenceField('PickupSchedule', required=True, unique=True)
+    status = StringField(default="queued")  # queued, running, completed, failed, cancelled
+    cursor = ObjectIdField()
+    total = IntField()  # Users in coverage when the job started
+    processed = IntField(default=0)
+    notified = IntField(default=0)
+    attempts = IntField(default=0)
+    lease = ObjectIdField()  # Changes on every claim so a stale worker's writes are ignored
+    locked_until = DateTimeField()
+    last_error = StringField()
+    created_at = DateTimeField(default=datetime.datetime.utcnow)
+    started_at = DateTimeField()
+    updated_at = DateTimeField()
+    completed_at = DateTimeField()
 
+    meta = {
+        'collection': 'fanout_jobs',
+        'indexes': [
+            ('status', 'created_at'),
+            ('status', 'locked_until'),
+        ],
+    }
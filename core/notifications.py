@@ -0,0 +1,129 @@
+"""Batched writes for notification fan-out, shared notification templates and
+the per-user unread counters."""
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from pymongo import WriteConcern
+
+from .counters import reconcile
+from .models import Notification, NotificationEvent, NotificationTemplate, User
+
+
+def _chunk_hook():
+    hook = getattr(settings, 'NOTIFICATION_CHUNK_HOOK', None)
+    return import_string(hook) if isinstance(hook, str) else hook
+
+
+def write_notifications(notifications, chunk_size=None, write_concern=None, on_chunk=None):
+    """Insert unsaved ``Notification`` documents with unordered ``insert_many`` calls.
+
+    Documents are written ``chunk_size`` at a time (``NOTIFICATION_BATCH_SIZE``)
+    with ``write_concern`` (``NOTIFICATION_WRITE_CONCERN``, e.g. ``{'w': 1}``).
+    After each chunk ``on_chunk(chunk_number, size, seconds)`` is called,
+    defaulting to the ``NOTIFICATION_CHUNK_HOOK`` setting. Ids are assigned
+    back onto the documents. Returns the number of documents written.
+    """
+    chunk_size = chunk_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+    if write_concern is None:
+        write_concern = getattr(settings, 'NOTIFICATION_WRITE_CONCERN', {'w': 1})
+    on_chunk = on_chunk or _chunk_hook()
+
+    collection = Notification._get_collection().with_options(
+        write_concern=WriteConcern(**write_concern)
+    )
+    written = 0
+    for number, start in enumerate(range(0, len(notifications), chunk_size)):
+        chunk = notifications[start:start + chunk_size]
+        documents = [notification.to_mongo().to_dict() for notification in chunk]
+
+        started = time.perf_counter()
+        result = collection.insert_many(documents, ordered=False)
+        elapsed = time.perf_counter() - started
+
+        for notification, inserted_id in zip(chunk, result.inserted_ids):
+            notification.id = inserted_id
+        increment_unread(Counter(document['user'] for document in documents))
+        publish(chunk)
+        written += len(documents)
+        if on_chunk:
+            on_chunk(number, len(documents), elapsed)
+    return written
+
+
+def literal(text):
+    """Escape ``text`` so ``str.format`` reproduces it unchanged inside a template."""
+    return str(text).replace('{', '{{').replace('}', '}}')
+
+
+def shared_template(key, title, message):
+    """The template stored under ``key``, created with this text on first use.
+
+    A single upsert, so concurrent fan-outs for the same event share one document.
+    """
+    return NotificationTemplate.objects(key=key).modify(
+        upsert=True, new=True,
+        set_on_insert__title=title,
+        set_on_insert__message=message,
+        set_on_insert__created_at=datetime.utcnow(),
+    )
+
+
+def render_text(template, params, title, message):
+    """``(title, message)`` from ``template`` filled with ``params``.
+
+    Without a template the inline ``title`` and ``message`` are used; older
+    notifications, and those whose template is gone, carry their text inline.
+    """
+    if template is None:
+        return title, message
+    params = params or {}
+    return template['title'].format_map(params), template['message'].format_map(params)
+
+
+def publish(notifications):
+    """Announce freshly written notifications to open streams.
+
+    One ``notification_events`` entry lists the notifications and their
+    users; each process serving streams reads back only those of its own
+    subscribers, so nothing is rendered for users without a stream.
+    """
+    if notifications:
+        NotificationEvent._get_collection().insert_one(NotificationEvent(
+            notifications=[notification.id for notification in notifications],
+            users=[notification.user.id for notification in notifications],
+        ).to_mongo().to_dict())
+
+
+def increment_unread(counts):
+    """Add ``{user_id: n}`` new unread notifications to the users' badge counters.
+
+    Users receiving the same number share one ``update_many``; a fan-out where
+    everybody gets one notification costs a single round trip.
+    """
+    by_amount = defaultdict(list)
+    for user_id, amount in counts.items():
+        by_amount[amount].append(user_id)
+    for amount, user_ids in by_amount.items():
+        User.objects(id__in=user_ids).update(inc__unread_notifications=amount)
+
+
+def decrement_unread_counts(counts):
+    """Take ``{user_id: n}`` unread notifications off the users' badge counters."""
+    increment_unread({user_id: -amount for user_id, amount in counts.items()})
+
+
+def decrement_unread(user, amount):
+    """Record ``amount`` notifications of ``user`` becoming read."""
+    if amount:
+        User.objects(id=user.id).update_one(dec__unread_notifications=amount)
+
+
+def reconcile_unread_counts():
+    """Reset every counter to the true number of unread notifications.
+
+    Returns the number of users whose counter was corrected.
+    """
+    return reconcile(User, 'unread_notifications', Notification, 'user', {'is_read': False})
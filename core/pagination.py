@@ -0,0 +1,79 @@
+"""Keyset pagination for list endpoints.
+
+Pages are read newest first in ``(sort_field, _id)`` order. The cursor
+handed to the client is the key of the last row it received, so the next
+page starts with an index range instead of skipping the rows before it and
+costs the same however deep it is.
+
+Query parameters: ``limit`` (capped at ``PAGE_SIZE_MAX``), ``cursor`` (the
+``next_cursor`` of the previous page) and ``include_count=true`` to also get
+``total_count``, which costs a count over every matching document.
+"""
+import base64
+import binascii
+
+from bson import ObjectId, json_util
+from django.conf import settings
+from mongoengine.queryset.visitor import Q
+
+
+class PaginationError(ValueError):
+    """Invalid ``limit`` or ``cursor`` parameter."""
+
+
+def encode_cursor(value, row_id):
+    return base64.urlsafe_b64encode(json_util.dumps([value, row_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, row_id = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        raise PaginationError('Invalid cursor.')
+    if not isinstance(row_id, ObjectId):
+        raise PaginationError('Invalid cursor.')
+    return value, row_id
+
+
+def page_limit(request, default=None):
+    default = default or getattr(settings, 'PAGE_SIZE_DEFAULT', 50)
+    maximum = getattr(settings, 'PAGE_SIZE_MAX', 200)
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except (TypeError, ValueError):
+        raise PaginationError('limit must be an integer.')
+    if limit < 1:
+        raise PaginationError('limit must be at least 1.')
+    return min(limit, maximum)
+
+
+def _key(row, sort_field):
+    if isinstance(row, dict):  # as_pymongo() rows
+        return row.get(sort_field), row['_id']
+    return row[sort_field], row.id
+
+
+def paginate(queryset, request, sort_field):
+    """One page of ``queryset``, newest ``sort_field`` first.
+
+    Returns ``(rows, page)``; ``page`` holds ``limit``, ``next_cursor`` (None
+    on the last page) and, when asked for, ``total_count``. Raises
+    ``PaginationError`` for bad parameters.
+    """
+    limit = page_limit(request)
+    page = {'limit': limit}
+    if request.query_params.get('include_count', '').lower() == 'true':
+        page['total_count'] = queryset.count()
+
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{sort_field}__lt': value}) | Q(**{sort_field: value, 'id__lt': row_id})
+        )
+
+    # One extra row tells whether another page follows
+    rows = list(queryset.order_by(f'-{sort_field}', '-id').limit(limit + 1))
+    page['next_cursor'] = encode_cursor(*_key(rows[limit - 1], sort_field)) if len(rows) > limit else None
+    return rows[:limit], page
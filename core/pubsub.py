@@ -0,0 +1,135 @@
+"""In-process fan-out of new notifications to open SSE connections.
+
+Each connection owns a bounded queue on its event loop. Publishers may run
+on any thread (sync views run in a thread pool under ASGI) and hand events
+over with ``call_soon_threadsafe``. A slow consumer never blocks publishers:
+when its queue is full the oldest event is dropped and the stream tells the
+client to resync over REST.
+
+Events reach the hub from the capped ``notification_events`` collection,
+which ``core.notifications.publish`` writes from any process, one entry per
+chunk of notifications. Each process serving streams follows it with one
+tailable cursor on a background thread and renders the notifications of
+its own subscribers.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _offer(self, event):
+        # Runs on the subscription's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class NotificationHub:
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self._follower = None
+
+    def follow(self, retry_seconds=1.0):
+        """Start delivering ``notification_events`` to this hub; once per process."""
+        with self._lock:
+            if self._follower is None:
+                self._follower = threading.Thread(
+                    target=_follow_events, args=(self, retry_seconds), name='notification-events', daemon=True
+                )
+                self._follower.start()
+
+    def subscribe(self, user_id, maxsize=100):
+        """Register a connection for ``user_id``; call from the connection's event loop."""
+        subscription = Subscription(user_id, maxsize)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscriptions
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                # The connection's loop has shut down
+                self.unsubscribe(subscription)
+
+
+def _deliver(hub, event):
+    """Render the notifications of ``event`` whose users stream from this process."""
+    from . import serializers
+    from .models import Notification
+
+    users = {
+        notification_id: user_id
+        for notification_id, user_id in zip(event.get('notifications', ()), event.get('users', ()))
+        if hub.has_subscribers(user_id)
+    }
+    if not users:
+        return
+    rows = Notification.objects(id__in=list(users)).only(*serializers.NOTIFICATION.fields).as_pymongo()
+    for payload in serializers.notifications(rows):
+        hub.publish(users[ObjectId(payload['id'])], payload)
+
+
+def _follow_events(hub, retry_seconds):
+    from .models import NotificationEvent
+
+    collection = NotificationEvent._get_collection()
+    # Start after the newest event; older ones were for earlier connections
+    newest = collection.find_one({}, {'_id': 1}, sort=[('$natural', -1)])
+    last_id = newest['_id'] if newest else None
+    while True:
+        try:
+            # Ids from different processes are not ordered, so a cursor that
+            # died is reopened in insertion order, skipping to the last event
+            # seen. When that one was already overwritten every stored event
+            # is newer.
+            skipping = last_id is not None and collection.find_one({'_id': last_id}, {'_id': 1}) is not None
+            cursor = collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+            while cursor.alive:
+                for event in cursor:
+                    if skipping:
+                        skipping = event['_id'] != last_id
+                        continue
+                    last_id = event['_id']
+                    _deliver(hub, event)
+        except PyMongoError:
+            logger.exception('Following notification_events failed')
+        time.sleep(retry_seconds)
+
+
+hub = NotificationHub()
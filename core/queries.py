@@ -0,0 +1,44 @@
+"""Batched reference lookups for list views.
+
+Reading ``row.user.full_name`` on every row of a list dereferences the user
+with one query per row. Load the rows with ``.no_dereference()`` and resolve
+all their users at once instead::
+
+    posts = MarketplacePost.objects().no_dereference()
+    users = resolve_users(post.user for post in posts)
+    users.get(post.user.id)
+"""
+from .models import User
+
+USER_FIELDS = ('id', 'full_name', 'email', 'phone')
+
+
+def ref_id(ref):
+    """The id behind a DBRef, a document or a bare ObjectId."""
+    return getattr(ref, 'id', ref)
+
+
+def resolve_users(refs, fields=USER_FIELDS, raw=False):
+    """``{user_id: User}`` for the referenced users, loaded with one ``$in``
+    query projected to ``fields``. Missing users are simply absent.
+
+    With ``raw`` the values are the ``as_pymongo()`` rows instead of documents.
+    """
+    ids = list({ref_id(ref) for ref in refs if ref is not None})
+    if not ids:
+        return {}
+    if raw:
+        return {row['_id']: row for row in User.objects(id__in=ids).only(*fields).as_pymongo()}
+    return User.objects.only(*fields).in_bulk(ids)
+
+
+def user_summary(user):
+    """The ``id``/``full_name``/``email``/``phone`` block list views embed."""
+    if user is None:
+        return None
+    return {
+        'id': str(user.id),
+        'full_name': user.full_name,
+        'email': user.email,
+        'phone': user.phone,
+    }
@@ -0,0 +1,90 @@
+"""Retention for OTP codes and notifications.
+
+OTPs and read notifications expire through TTL indexes whose lifetimes come
+from settings. Older notifications, read or not, are moved into a compressed
+archive collection by ``archive_notifications``.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+from .models import OTP, Notification
+from .notifications import decrement_unread_counts
+
+ARCHIVE_COLLECTION = 'notifications_archive'
+
+
+def ttl_indexes():
+    """``(model, field, seconds)`` for every TTL index the settings ask for."""
+    return [
+        (OTP, 'created_at', getattr(settings, 'OTP_TTL_SECONDS', 3600)),
+        (Notification, 'read_at', getattr(settings, 'NOTIFICATION_READ_TTL_DAYS', 90) * 86400),
+    ]
+
+
+def ensure_ttl_indexes():
+    """Create the TTL indexes, or change their lifetime in place with ``collMod``.
+
+    Returns ``[(collection, field, action)]`` for indexes that were created or updated.
+    """
+    changes = []
+    for model, field, seconds in ttl_indexes():
+        collection = model._get_collection()
+        existing = next(
+            (index for index in collection.index_information().values() if index['key'] == [(field, 1)]),
+            None,
+        )
+        if existing is None:
+            collection.create_index(field, expireAfterSeconds=seconds)
+            changes.append((collection.name, field, 'created'))
+        elif existing.get('expireAfterSeconds') != seconds:
+            collection.database.command('collMod', collection.name, index={
+                'keyPattern': {field: 1}, 'expireAfterSeconds': seconds,
+            })
+            changes.append((collection.name, field, 'updated'))
+    return changes
+
+
+def archive_collection():
+    """The cold notification collection, created with zstd block compression."""
+    db = Notification._get_db()
+    compressor = getattr(settings, 'NOTIFICATION_ARCHIVE_COMPRESSOR', 'zstd')
+    try:
+        db.create_collection(ARCHIVE_COLLECTION, storageEngine={
+            'wiredTiger': {'configString': f'block_compressor={compressor}'},
+        })
+    except CollectionInvalid:
+        pass  # Already exists
+    return db[ARCHIVE_COLLECTION]
+
+
+def archive_notifications(older_than_days=None, batch_size=1000):
+    """Move notifications sent more than ``older_than_days`` ago into the archive.
+
+    Each batch is copied before it is deleted, so an interrupted run only
+    leaves copies that the next run skips. Unread notifications that move
+    are taken off their users' badge counters. Returns the number moved.
+    """
+    if older_than_days is None:
+        older_than_days = getattr(settings, 'NOTIFICATION_ARCHIVE_AFTER_DAYS', 180)
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archive = archive_collection()
+    collection = Notification._get_collection()
+
+    moved = 0
+    while True:
+        batch = list(collection.find({'sent_at': {'$lt': cutoff}}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return moved
+        archived_at = datetime.utcnow()
+        try:
+            archive.insert_many([dict(row, archived_at=archived_at) for row in batch], ordered=False)
+        except BulkWriteError as error:
+            # Copies left by an interrupted run are already archived
+            if any(e['code'] != 11000 for e in error.details['writeErrors']):
+                raise
+        collection.delete_many({'_id': {'$in': [row['_id'] for row in batch]}})
+        decrement_unread_counts(Counter(row['user'] for row in batch if not row.get('is_read')))
+        moved += len(batch)
@@ -0,0 +1,333 @@
+"""Daily activity rollups behind the admin analytics endpoints.
+
+Each ``DailyRollup`` holds the counters of one UTC day, area and waste type.
+Writes update the affected rollups with ``$inc`` upserts, and the endpoints
+answer any date range by summing the rollups of its days.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from .analytics import AnalyticsError
+from .models import CollectionRequest, DailyRollup, MarketplacePost, User
+
+COUNTERS = (
+    'created', 'completed', 'cancelled', 'new_users', 'marketplace_posts',
+    'completion_seconds', 'timed_completions',
+)
+DEFAULT_DAYS = 30
+
+
+def day_of(moment):
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def area_of(location):
+    # Same grouping as the location breakdown of AdminAnalyticsView
+    return (location or '').split(',')[0]
+
+
+def _key(moment, location, waste_type=None):
+    return day_of(moment), area_of(location), waste_type or ''
+
+
+def _write(increments, collection=None):
+    increments = {key: {name: value for name, value in inc.items() if value} for key, inc in increments.items()}
+    increments = {key: inc for key, inc in increments.items() if inc}
+    if not increments:
+        return
+    if collection is None:
+        collection = DailyRollup._get_collection()
+    collection.bulk_write([
+        UpdateOne(
+            {'day': day, 'area': area, 'waste_type': waste_type},
+            {'$inc': inc},
+            upsert=True,
+        )
+        for (day, area, waste_type), inc in increments.items()
+    ], ordered=False)
+
+
+def fields_of(row, *names):
+    # Accepts documents as well as raw rows read with as_pymongo()
+    if isinstance(row, dict):
+        return [row.get(name) for name in names]
+    return [getattr(row, name) for name in names]
+
+
+def _outcome(status, created_at, completed_at):
+    """Counters a request with ``status`` adds to the rollup of its day."""
+    if status == 'cancelled':
+        return {'cancelled': 1}
+    if status != 'completed':
+        return {}
+    if not completed_at:
+        # Completed before completed_at was recorded
+        return {'completed': 1}
+    return {
+        'completed': 1,
+        'completion_seconds': (completed_at - created_at).total_seconds(),
+        'timed_completions': 1,
+    }
+
+
+def _count_requests(requests, increments):
+    for req in requests:
+        created_at, location, waste_type, status, completed_at = fields_of(
+            req, 'created_at', 'location', 'waste_type', 'status', 'completed_at'
+        )
+        inc = increments[_key(created_at, location, waste_type)]
+        inc['created'] += 1
+        for name, value in _outcome(status or 'pending', created_at, completed_at).items():
+            inc[name] += value
+
+
+def record_requests_created(requests):
+    """Count newly created collection requests."""
+    increments = defaultdict(lambda: defaultdict(int))
+    _count_requests(requests, increments)
+    _write(increments)
+
+
+def record_status_change(requests, old_status, new_status, old_completed_at=None, completed_at=None):
+    """Move requests between outcome counters after a status update.
+
+    ``old_completed_at`` and ``completed_at`` are the requests'
+    ``completed_at`` before and after the update.
+    """
+    if old_status == new_status:
+        return
+    increments = defaultdict(lambda: defaultdict(int))
+    for req in requests:
+        created_at, location, waste_type = fields_of(req, 'created_at', 'location', 'waste_type')
+        inc = increments[_key(created_at, location, waste_type)]
+        for name, value in _outcome(old_status, created_at, old_completed_at).items():
+            inc[name] -= value
+        for name, value in _outcome(new_status, created_at, completed_at).items():
+            inc[name] += value
+    _write(increments)
+
+
+def _count_users(users, increments):
+    for user in users:
+        registered_on, location = fields_of(user, 'registered_on', 'location')
+        increments[_key(registered_on, location)]['new_users'] += 1
+
+
+def record_users_registered(users):
+    """Count newly registered users."""
+    increments = defaultdict(lambda: defaultdict(int))
+    _count_users(users, increments)
+    _write(increments)
+
+
+def _count_posts(posts, increments):
+    for post in posts:
+        created_at, location, waste_type = fields_of(post, 'created_at', 'location', 'waste_type')
+        increments[_key(created_at, location, waste_type)]['marketplace_posts'] += 1
+
+
+def record_posts_created(posts):
+    """Count newly created marketplace posts."""
+    increments = defaultdict(lambda: defaultdict(int))
+    _count_posts(posts, increments)
+    _write(increments)
+
+
+def date_range(start_date=None, end_date=None, max_days=None, today=None):
+    """First and last day (both inclusive) of a ``start_date``/``end_date``
+    query, given as ISO dates or datetimes.
+
+    Without ``end_date`` the range ends today, without ``start_date`` it
+    covers ``DEFAULT_DAYS`` days.
+    """
+    try:
+        end = day_of(datetime.fromisoformat(end_date)) if end_date else day_of(today or datetime.utcnow())
+        start = day_of(datetime.fromisoformat(start_date)) if start_date else end - timedelta(days=DEFAULT_DAYS - 1)
+    except ValueError:
+        raise AnalyticsError('start_date and end_date must be ISO dates.')
+    if start > end:
+        raise AnalyticsError('start_date must not be after end_date.')
+    if max_days and (end - start).days + 1 > max_days:
+        raise AnalyticsError(f'The date range can cover at most {max_days} days.')
+    return start, end
+
+
+def _sum(start, end, group, waste_type=None):
+    """Rollup counters from day ``start`` to ``end`` summed per ``group``,
+    for one ``waste_type`` when given. A ``None`` bound leaves that end open."""
+    match = {}
+    if start or end:
+        match['day'] = {}
+        if start:
+            match['day']['$gte'] = start
+        if end:
+            match['day']['$lte'] = end
+    if waste_type:
+        match['waste_type'] = waste_type
+    return list(DailyRollup._get_collection().aggregate([
+        {'$match': match},
+        {'$group': {'_id': group, **{name: {'$sum': f'${name}'} for name in COUNTERS}}},
+    ]))
+
+
+def _percent(part, whole):
+    return round(part / whole * 100, 1) if whole else 0.0
+
+
+def _days(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def performance(start, end):
+    """Completion metrics of the requests created in the range.
+
+    ``average_completion_time`` is in hours, over the completed requests that
+    recorded when they were completed; ``pickup_efficiency`` is the share of
+    completed requests among those completed or cancelled. No ratings are
+    collected and quantities are free text, so ``user_satisfaction`` is
+    ``None`` and ``total_waste_diverted`` counts completed requests.
+    """
+    rows = _sum(start, end, None)
+    totals = rows[0] if rows else dict.fromkeys(COUNTERS, 0)
+    timed = totals['timed_completions']
+    return {
+        'average_completion_time': round(totals['completion_seconds'] / timed / 3600, 1) if timed else None,
+        'pickup_efficiency': _percent(totals['completed'], totals['completed'] + totals['cancelled']),
+        'user_satisfaction': None,
+        'total_waste_diverted': totals['completed'],
+    }
+
+
+def waste_trends(start, end):
+    """Requests created and completed per day, oldest first, with the count
+    of each waste type. Days without requests are included with zero counts."""
+    days = {day: {'total_requests': 0, 'completed_requests': 0, 'waste_types': {}} for day in _days(start, end)}
+    for row in _sum(start, end, {'day': '$day', 'waste_type': '$waste_type'}):
+        if not row['created']:
+            continue
+        day = days[row['_id']['day']]
+        day['total_requests'] += row['created']
+        day['completed_requests'] += row['completed']
+        day['waste_types'][row['_id']['waste_type']] = row['created']
+    return [{'date': day.strftime('%Y-%m-%d'), **counts} for day, counts in days.items()]
+
+
+def waste_distribution(start, end):
+    """Requests created in the range per waste type, largest first."""
+    rows = [row for row in _sum(start, end, '$waste_type') if row['created']]
+    total = sum(row['created'] for row in rows)
+    rows.sort(key=lambda row: (-row['created'], row['_id']))
+    return [{
+        'waste_type': row['_id'],
+        'count': row['created'],
+        'percentage': _percent(row['created'], total),
+    } for row in rows]
+
+
+def location_stats(start, end, popular=3):
+    """Requests created in the range per area, busiest first, with their
+    completion rate and the ``popular`` most requested waste types."""
+    areas = {}
+    for row in _sum(start, end, {'area': '$area', 'waste_type': '$waste_type'}):
+        if not row['created']:
+            continue
+        area = areas.setdefault(row['_id']['area'], {'created': 0, 'completed': 0, 'waste_types': {}})
+        area['created'] += row['created']
+        area['completed'] += row['completed']
+        area['waste_types'][row['_id']['waste_type']] = row['created']
+    result = [{
+        'location': name,
+        'request_count': area['created'],
+        'completion_rate': _percent(area['completed'], area['created']),
+        'popular_waste_types': sorted(area['waste_types'], key=lambda t: (-area['waste_types'][t], t))[:popular],
+    } for name, area in areas.items()]
+    result.sort(key=lambda item: (-item['request_count'], item['location']))
+    return result
+
+
+def area_counts(start=None, end=None, waste_type=None):
+    """``{area: requests created}`` in the range, largest first, like the
+    ``location_breakdown`` of AdminAnalyticsView."""
+    rows = [row for row in _sum(start, end, '$area', waste_type) if row['created']]
+    rows.sort(key=lambda row: (-row['created'], row['_id']))
+    return {row['_id']: row['created'] for row in rows}
+
+
+def user_engagement(start, end):
+    """New users, collection requests and marketplace posts per day, oldest
+    first. Rollups count events, not distinct users, so ``active_users`` is
+    ``None``."""
+    days = {row['_id']: row for row in _sum(start, end, '$day')}
+    result = []
+    for day in _days(start, end):
+        row = days.get(day, {})
+        result.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'new_users': row.get('new_users', 0),
+            'active_users': None,
+            'collection_requests': row.get('created', 0),
+            'marketplace_posts': row.get('marketplace_posts', 0),
+        })
+    return result
+
+
+def batched(rows, size=5000):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def replace_collection(model, fill):
+    """Refill the collection of ``model`` without readers seeing it half done.
+
+    ``fill(collection)`` writes the new contents into a scratch collection
+    carrying the model's indexes, which then replaces the live one in a
+    single rename. Writes to the live collection made meanwhile are lost
+    with it. Returns what ``fill`` returns.
+    """
+    live = model._get_collection()
+    scratch = live.database[f'{live.name}_rebuild']
+    scratch.drop()
+    for spec in model._meta['index_specs']:
+        spec = spec.copy()
+        scratch.create_index(spec.pop('fields'), **spec)
+    result = fill(scratch)
+    scratch.rename(live.name, dropTarget=True)
+    return result
+
+
+def rebuild():
+    """Recompute every rollup from the raw collections.
+
+    Returns the number of requests, users and posts counted.
+    """
+    def fill(collection):
+        totals = {}
+        for name, rows, count in (
+            ('collection_requests', CollectionRequest.objects().only(
+                'created_at', 'location', 'waste_type', 'status', 'completed_at'
+            ).as_pymongo(), _count_requests),
+            ('users', User.objects(is_admin=False).only('registered_on', 'location').as_pymongo(), _count_users),
+            ('marketplace_posts', MarketplacePost.objects().only(
+                'created_at', 'location', 'waste_type'
+            ).as_pymongo(), _count_posts),
+        ):
+            totals[name] = 0
+            for batch in batched(rows):
+                increments = defaultdict(lambda: defaultdict(int))
+                count(batch, increments)
+                _write(increments, collection)
+                totals[name] += len(batch)
+        return totals
+
+    return replace_collection(DailyRollup, fill)
@@ -0,0 +1,272 @@
+"""Response rows built straight from ``as_pymongo()`` results.
+
+List endpoints read raw BSON with a projection of the fields they return
+and convert it here, skipping ``Document`` construction, validation and
+reference proxies. ``RowReader`` applies each field's own ``to_python`` and
+default, so the output is the same as reading the attributes of a loaded
+document.
+"""
+from mongoengine.fields import ListField, ReferenceField
+
+from .models import (
+    CollectionRequest, MarketplacePost, Notification, NotificationTemplate, PickupSchedule, ScheduleRecipient, User
+)
+from .notifications import render_text
+from .queries import resolve_users
+
+
+class RowReader:
+    """Python values of ``fields`` from a raw ``model`` row.
+
+    References, and lists of them, are left as ObjectIds.
+    """
+
+    def __init__(self, model, *fields):
+        self.fields = fields
+        self._fields = []
+        for name in fields:
+            field = model._fields[name]
+            is_reference = isinstance(field, ReferenceField) or (
+                isinstance(field, ListField) and isinstance(field.field, ReferenceField)
+            )
+            self._fields.append((name, field.db_field, field, is_reference))
+
+    def __call__(self, row):
+        values = {}
+        for name, db_field, field, is_reference in self._fields:
+            value = row.get(db_field)
+            if value is None:
+                # Missing and null values read as the field default, like on a document
+                value = field.default() if callable(field.default) else field.default
+            elif not is_reference:
+                value = field.to_python(value)
+            values[name] = value
+        return values
+
+
+USER_SUMMARY = RowReader(User, 'id', 'full_name', 'email', 'phone')
+ADMIN_USER = RowReader(
+    User, 'id', 'full_name', 'email', 'phone', 'location', 'latitude', 'longitude',
+    'is_verified', 'is_admin', 'registered_on',
+)
+MARKETPLACE_POST = RowReader(
+    MarketplacePost, 'id', 'user', 'title', 'description', 'hashtags', 'price', 'quantity',
+    'waste_type', 'location', 'latitude', 'longitude', 'image_url', 'created_at',
+)
+COLLECTION_REQUEST = RowReader(
+    CollectionRequest, 'id', 'user', 'waste_type', 'quantity', 'pickup_date', 'location',
+    'latitude', 'longitude', 'image_url', 'special_notes', 'status', 'created_at',
+)
+NOTIFICATION = RowReader(
+    Notification, 'id', 'pickup_schedule', 'template', 'params', 'title', 'message',
+    'notification_type', 'is_read', 'sent_at',
+)
+PICKUP_SCHEDULE = RowReader(
+    PickupSchedule, 'id', 'admin', 'date_time', 'location', 'latitude', 'longitude',
+    'coverage_radius_km', 'garbage_type', 'description', 'status', 'notified_count', 'created_at',
+)
+SCHEDULE_RECIPIENT = RowReader(ScheduleRecipient, 'id', 'user', 'distance_km', 'notified_at')
+
+
+def _rows_by_id(model, ids, *fields):
+    ids = list(ids)
+    if not ids:
+        return {}
+    return {row['_id']: row for row in model.objects(id__in=ids).only(*fields).as_pymongo()}
+
+
+def _users(refs, reader):
+    rows = resolve_users(refs, fields=reader.fields, raw=True)
+    return {user_id: reader(row) for user_id, row in rows.items()}
+
+
+def _user_summary(user):
+    if user is None:
+        return None
+    return {
+        'id': str(user['id']),
+        'full_name': user['full_name'],
+        'email': user['email'],
+        'phone': user['phone'],
+    }
+
+
+def marketplace_posts(rows):
+    """MarketplacePostListView items."""
+    posts = [MARKETPLACE_POST(row) for row in rows]
+    users = _users((post['user'] for post in posts), USER_SUMMARY)
+    return [{
+        'id': str(post['id']),
+        'user': _user_summary(users.get(post['user'])),
+        'title': post['title'],
+        'description': post['description'],
+        'hashtags': post['hashtags'],
+        'price': post['price'],
+        'quantity': post['quantity'],
+        'waste_type': post['waste_type'],
+        'location': post['location'],
+        'latitude': post['latitude'],
+        'longitude': post['longitude'],
+        'image_url': post['image_url'],
+        'created_at': post['created_at'].isoformat(),
+    } for post in posts]
+
+
+def _collection_request(req, user):
+    return {
+        "id": str(req['id']),
+        "user": user,
+        "waste_type": req['waste_type'],
+        "quantity": req['quantity'],
+        "pickup_date": req['pickup_date'].isoformat(),
+        "location": req['location'],
+        "latitude": req['latitude'],
+        "longitude": req['longitude'],
+        "image_url": req['image_url'],
+        "special_notes": req['special_notes'],
+        "status": req['status'],
+        "created_at": req['created_at'].isoformat()
+    }
+
+
+def collection_requests(rows, distances=None):
+    """CollectionRequestListView items; ``distances`` (km, per row) adds ``distance_km``."""
+    requests = [COLLECTION_REQUEST(row) for row in rows]
+    users = _users((req['user'] for req in requests), RowReader(User, 'id', 'full_name'))
+    result = []
+    for i, req in enumerate(requests):
+        user = users.get(req['user'])
+        item = _collection_request(req, str(user['full_name']) if user else "")
+        if distances is not None:
+            item["distance_km"] = round(float(distances[i]), 2)
+            item["created_at"] = item.pop("created_at")  # Keep created_at last
+        result.append(item)
+    return result
+
+
+def user_collection_requests(rows):
+    """UserCollectionRequestsView items, with the owner's contact details."""
+    requests = [COLLECTION_REQUEST(row) for row in rows]
+    users = _users((req['user'] for req in requests), USER_SUMMARY)
+    return [_collection_request(req, _user_summary(users.get(req['user']))) for req in requests]
+
+
+def admin_users(rows):
+    """AdminUsersListView items."""
+    return [{
+        'id': str(user['id']),
+        'full_name': user['full_name'],
+        'email': user['email'],
+        'phone': user['phone'],
+        'location': user['location'],
+        'latitude': user['latitude'],
+        'longitude': user['longitude'],
+        'is_verified': user['is_verified'],
+        'is_admin': user['is_admin'],
+        'registered_on': user['registered_on'].isoformat()
+    } for user in map(ADMIN_USER, rows)]
+
+
+def notifications(rows):
+    """UserNotificationsView items, rendered from their shared templates."""
+    notifications = [NOTIFICATION(row) for row in rows]
+    templates = _rows_by_id(
+        NotificationTemplate, {n['template'] for n in notifications if n['template']}, 'title', 'message'
+    )
+    schedules = _rows_by_id(
+        PickupSchedule, {n['pickup_schedule'] for n in notifications if n['pickup_schedule']},
+        'date_time', 'location',
+    )
+    result = []
+    for notification in notifications:
+        title, message = render_text(
+            templates.get(notification['template']), notification['params'],
+            notification['title'], notification['message'],
+        )
+        schedule = schedules.get(notification['pickup_schedule'])
+        result.append({
+            'id': str(notification['id']),
+            'title': title,
+            'message': message,
+            'notification_type': notification['notification_type'],
+            'is_read': notification['is_read'],
+            'sent_at': notification['sent_at'].isoformat(),
+            'pickup_schedule': {
+                'id': str(schedule['_id']),
+                'date_time': schedule['date_time'].isoformat(),
+                'location': schedule['location']
+            } if schedule else None
+        })
+    return result
+
+
+def pickup_schedules(rows):
+    """PickupScheduleListView items."""
+    schedules = [PICKUP_SCHEDULE(row) for row in rows]
+    admins = _users((schedule['admin'] for schedule in schedules), RowReader(User, 'id', 'full_name'))
+    result = []
+    for schedule in schedules:
+        admin = admins.get(schedule['admin'])
+        result.append({
+            'id': str(schedule['id']),
+            'admin': admin['full_name'] if admin else 'Unknown',
+            'date_time': schedule['date_time'].isoformat(),
+            'location': schedule['location'],
+            'latitude': schedule['latitude'],
+            'longitude': schedule['longitude'],
+            'coverage_radius_km': schedule['coverage_radius_km'],
+            'garbage_type': schedule['garbage_type'],
+            'description': schedule['description'],
+            'status': schedule['status'],
+            'users_notified': schedule['notified_count'],
+            'created_at': schedule['created_at'].isoformat()
+        })
+    return result
+
+
+def admin_pickup_schedules(rows):
+    """AdminPickupSchedulesListView items; recipients are listed by ``schedule_recipients``."""
+    schedules = [PICKUP_SCHEDULE(row) for row in rows]
+    admins = _users((schedule['admin'] for schedule in schedules), RowReader(User, 'id', 'full_name', 'email'))
+    result = []
+    for schedule in schedules:
+        admin = admins.get(schedule['admin'])
+        result.append({
+            'id': str(schedule['id']),
+            'admin': {
+                'id': str(admin['id']),
+                'name': admin['full_name'],
+                'email': admin['email']
+            } if admin else None,
+            'date_time': schedule['date_time'].isoformat(),
+            'location': schedule['location'],
+            'latitude': schedule['latitude'],
+            'longitude': schedule['longitude'],
+            'coverage_radius_km': schedule['coverage_radius_km'],
+            'garbage_type': schedule['garbage_type'],
+            'description': schedule['description'],
+            'status': schedule['status'],
+            'notified_users_count': schedule['notified_count'],
+            'created_at': schedule['created_at'].isoformat()
+        })
+    return result
+
+
+def schedule_recipients(rows):
+    """AdminScheduleRecipientsView items."""
+    recipients = [SCHEDULE_RECIPIENT(row) for row in rows]
+    users = _users(
+        (recipient['user'] for recipient in recipients), RowReader(User, 'id', 'full_name', 'email', 'location')
+    )
+    result = []
+    for recipient in recipients:
+        user = users.get(recipient['user'])
+        result.append({
+            'id': str(recipient['user']),
+            'name': user['full_name'] if user else None,
+            'email': user['email'] if user else None,
+            'location': user['location'] if user else None,
+            'distance_km': recipient['distance_km'],
+            'notified_at': recipient['notified_at'].isoformat()
+        })
+    return result
@@ -0,0 +1,219 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from math import floor
+
+from django.conf import settings
+
+from .geo import KM_PER_DEGREE, bounding_deltas, haversine
+
+
+class UserGridIndex:
+    """Uniform lat/lng grid over user coordinates.
+
+    A radius query only visits the cells overlapping the circle's bounding box
+    and runs haversine on the users found there, instead of every user.
+    """
+
+    def __init__(self, cell_km=1.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self._cells = defaultdict(dict)  # cell -> {user_id: (lat, lon)}
+        self._user_cells = {}  # user_id -> cell
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._user_cells)
+
+    def _cell(self, lat, lon):
+        return (floor(lat / self.cell_deg), floor(lon / self.cell_deg))
+
+    def add(self, user_id, lat, lon):
+        """Insert a user, or move them if they are already indexed."""
+        with self._lock:
+            self._discard(user_id)
+            cell = self._cell(lat, lon)
+            self._cells[cell][user_id] = (lat, lon)
+            self._user_cells[user_id] = cell
+
+    def remove(self, user_id):
+        with self._lock:
+            self._discard(user_id)
+
+    def _discard(self, user_id):
+        cell = self._user_cells.pop(user_id, None)
+        if cell is not None:
+            members = self._cells[cell]
+            members.pop(user_id, None)
+            if not members:
+                del self._cells[cell]
+
+    def query_radius(self, lat, lon, radius_km):
+        """Return ``[(user_id, distance_km), ...]`` within the radius, nearest first."""
+        dlat, dlon = bounding_deltas(lat, radius_km)
+        min_row, min_col = self._cell(lat - dlat, lon - dlon)
+        max_row, max_col = self._cell(lat + dlat, lon + dlon)
+
+        matches = []
+        with self._lock:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    members = self._cells.get((row, col))
+                    if not members:
+                        continue
+                    for user_id, (user_lat, user_lon) in members.items():
+                        distance = haversine(lat, lon, user_lat, user_lon)
+                        if distance <= radius_km:
+                            matches.append((user_id, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+
+class ScheduleCoverageIndex:
+    """Grid of active pickup schedules keyed by the cells their coverage circle touches.
+
+    Finding the schedules that cover a point reads the point's own cell and
+    checks only the circles registered there.
+    """
+
+    def __init__(self, cell_km=5.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self._cells = defaultdict(dict)  # cell -> {schedule_id: (lat, lon, radius_km, date_time)}
+        self._schedule_cells = {}  # schedule_id -> [cells]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._schedule_cells)
+
+    def _cell(self, lat, lon):
+        return (floor(lat / self.cell_deg), floor(lon / self.cell_deg))
+
+    def add(self, schedule_id, lat, lon, radius_km, date_time=None):
+        """Insert a schedule, replacing any previous coverage it had."""
+        dlat, dlon = bounding_deltas(lat, radius_km)
+        min_row, min_col = self._cell(lat - dlat, lon - dlon)
+        max_row, max_col = self._cell(lat + dlat, lon + dlon)
+        if date_time is not None and date_time.tzinfo is not None:
+            date_time = date_time.astimezone(timezone.utc).replace(tzinfo=None)
+        entry = (lat, lon, radius_km, date_time)
+        with self._lock:
+            self._discard(schedule_id)
+            cells = []
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    self._cells[(row, col)][schedule_id] = entry
+                    cells.append((row, col))
+            self._schedule_cells[schedule_id] = cells
+
+    def remove(self, schedule_id):
+        with self._lock:
+            self._discard(schedule_id)
+
+    def _discard(self, schedule_id):
+        for cell in self._schedule_cells.pop(schedule_id, []):
+            members = self._cells[cell]
+            members.pop(schedule_id, None)
+            if not members:
+                del self._cells[cell]
+
+    def covering(self, lat, lon, now=None):
+        """Return ``[(schedule_id, distance_km), ...]`` whose coverage includes the point.
+
+        Schedules whose ``date_time`` is before ``now`` are skipped.
+        """
+        matches = []
+        with self._lock:
+            members = self._cells.get(self._cell(lat, lon), {})
+            for schedule_id, (s_lat, s_lon, radius_km, date_time) in members.items():
+                if now is not None and date_time is not None and date_time < now:
+                    continue
+                distance = haversine(lat, lon, s_lat, s_lon)
+                if distance <= radius_km:
+                    matches.append((schedule_id, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+
+ACTIVE_SCHEDULE_STATUSES = ['scheduled', 'in_progress']
+
+
+_user_index = None
+_user_index_built_at = 0.0
+_user_index_lock = threading.Lock()
+
+
+def indexable_user(user):
+    """Only verified, non-admin users with coordinates receive pickup notices."""
+    return (
+        user.is_verified and not user.is_admin
+        and user.latitude is not None and user.longitude is not None
+    )
+
+
+def user_index():
+    """Per-worker user grid, rebuilt from Mongo when it gets older than
+    ``USER_GRID_INDEX_TTL_SECONDS`` so writes handled by other workers show up."""
+    global _user_index, _user_index_built_at
+    ttl = getattr(settings, 'USER_GRID_INDEX_TTL_SECONDS', 300)
+    with _user_index_lock:
+        if _user_index is None or time.monotonic() - _user_index_built_at > ttl:
+            from .models import User
+
+            index = UserGridIndex(getattr(settings, 'USER_GRID_CELL_KM', 1.0))
+            users = User.objects(
+                is_verified=True, is_admin=False, latitude__ne=None, longitude__ne=None
+            ).only('id', 'latitude', 'longitude').as_pymongo()
+            for user in users:
+                index.add(user['_id'], user['latitude'], user['longitude'])
+            _user_index = index
+            _user_index_built_at = time.monotonic()
+        return _user_index
+
+
+def sync_user(user):
+    """Reflect a registration or location change in this worker's index."""
+    index = user_index()
+    if indexable_user(user):
+        index.add(user.id, user.latitude, user.longitude)
+    else:
+        index.remove(user.id)
+
+
+_schedule_index = None
+_schedule_index_built_at = 0.0
+_schedule_index_lock = threading.Lock()
+
+
+def schedule_index():
+    """Per-worker coverage index of upcoming active schedules, rebuilt after
+    ``SCHEDULE_COVERAGE_INDEX_TTL_SECONDS``."""
+    global _schedule_index, _schedule_index_built_at
+    ttl = getattr(settings, 'SCHEDULE_COVERAGE_INDEX_TTL_SECONDS', 300)
+    with _schedule_index_lock:
+        if _schedule_index is None or time.monotonic() - _schedule_index_built_at > ttl:
+            from .models import PickupSchedule
+
+            index = ScheduleCoverageIndex(getattr(settings, 'SCHEDULE_COVERAGE_CELL_KM', 5.0))
+            schedules = PickupSchedule.objects(
+                status__in=ACTIVE_SCHEDULE_STATUSES, date_time__gte=datetime.utcnow()
+            ).only('id', 'latitude', 'longitude', 'coverage_radius_km', 'date_time').as_pymongo()
+            for schedule in schedules:
+                index.add(
+                    schedule['_id'], schedule['latitude'], schedule['longitude'],
+                    schedule.get('coverage_radius_km', 2.0), schedule['date_time']
+                )
+            _schedule_index = index
+            _schedule_index_built_at = time.monotonic()
+        return _schedule_index
+
+
+def sync_schedule(schedule):
+    """Reflect a created schedule or a status change in this worker's coverage index."""
+    index = schedule_index()
+    if schedule.status in ACTIVE_SCHEDULE_STATUSES:
+        index.add(
+            schedule.id, schedule.latitude, schedule.longitude,
+            schedule.coverage_radius_km, schedule.date_time
+        )
+    else:
+        index.remove(schedule.id)
@@ -0,0 +1,74 @@
+"""Server-Sent Events endpoints (require the ASGI server)."""
+import asyncio
+import json
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import User
+from .pubsub import hub
+
+
+def _find_user(email):
+    return User.objects(email=email).only('id').first()
+
+
+async def notification_stream(request):
+    """Stream the authenticated user's new notifications as they are created.
+
+    Browsers' EventSource cannot set headers, so the token may also be passed
+    as ``?token=``.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would read this endless stream synchronously and tie
+        # up a worker thread for as long as the client stays connected
+        return JsonResponse({'error': 'The notification stream needs the ASGI server.'}, status=501)
+
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        token = auth_header.split(' ')[1]
+    else:
+        token = request.GET.get('token')
+    if not token:
+        return JsonResponse({'error': 'Authorization header missing or invalid.'}, status=401)
+
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        user_email = payload.get('email')
+    except Exception:
+        return JsonResponse({'error': 'Invalid or expired token.'}, status=401)
+
+    user = await sync_to_async(_find_user)(user_email)
+    if not user:
+        return JsonResponse({'error': 'User not found.'}, status=404)
+
+    hub.follow()
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+
+    async def events():
+        # Subscribed only once the response is being streamed, so a client
+        # gone before then leaves nothing behind
+        subscription = hub.subscribe(user.id, getattr(settings, 'SSE_QUEUE_SIZE', 100))
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                    continue
+                if subscription.dropped:
+                    # This client fell behind; tell it to refetch over REST
+                    yield f'event: overflow\ndata: {json.dumps({"dropped": subscription.dropped})}\n\n'
+                    subscription.dropped = 0
+                yield f'id: {event["id"]}\nevent: notification\ndata: {json.dumps(event)}\n\n'
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Keep reverse proxies from buffering the stream
+    return response
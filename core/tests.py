@@ -1,3 +1,394 @@
-from django.test import TestCase
+import random
+import socketserver
+import threading
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
 
-# Create your tests here.
+import jwt
+import numpy as np
+from django.conf import settings
+from django.core.mail import get_connection
+from django.test import SimpleTestCase
+from mongoengine import connect, disconnect
+from mongoengine.connection import get_db
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+from rest_framework.test import APIRequestFactory
+
+from .analytics import overview
+from .distance import distances_km, within_radius
+from .geo import haversine
+from .mailqueue import claim_batch, deliver_batch, enqueue_mail
+from .models import CollectionRequest, MarketplacePost, OutboundEmail, PickupSchedule, User
+from .views import (
+    AdminDashboardStatsView, AdminDashboardView, MarketplacePostListView, PickupScheduleListView, UserCollectionRequestsView
+)
+
+
+def mongo_available(host='localhost', port=27017):
+    """Whether a mongod answers at ``host``:``port``."""
+    client = MongoClient(host, port, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+class ReadCounter(monitoring.CommandListener):
+    """Counts the read commands sent to Mongo."""
+    READS = {'find', 'aggregate', 'getMore', 'count'}
+
+    def __init__(self):
+        self.reads = 0
+
+    def started(self, event):
+        if event.command_name in self.READS:
+            self.reads += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@unittest.skipUnless(mongo_available(), 'Needs a mongod on localhost:27017')
+class ListViewQueryCountTests(SimpleTestCase):
+    """List views resolve referenced users in bulk, so their query count
+    does not grow with the number of rows. Needs a local mongod; the data
+    lives in a throwaway ``fohormalai_test`` database."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.counter = ReadCounter()
+        disconnect()
+        connect(db='fohormalai_test', host='localhost', port=27017, event_listeners=[cls.counter])
+        get_db().client.drop_database('fohormalai_test')
+        cls.factory = APIRequestFactory()
+        cls.admin = User(
+            full_name='Admin', email='admin@example.com', phone='9800000000', password='x', is_admin=True
+        ).save()
+        cls.token = jwt.encode(
+            {'email': cls.admin.email, 'is_admin': True}, settings.SECRET_KEY, algorithm='HS256'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        get_db().client.drop_database('fohormalai_test')
+        disconnect()
+        super().tearDownClass()
+
+    def add_rows(self, count):
+        """Give ``count`` new users a marketplace post, a collection request and a schedule."""
+        for number in range(User.objects.count(), User.objects.count() + count):
+            user = User(
+                full_name=f'User {number}', email=f'user{number}@example.com',
+                phone=f'98{number:08d}', password='x',
+            ).save()
+            MarketplacePost(
+                user=user, title='Bottles', description='PET bottles', price=10.0, quantity='5kg',
+                waste_type='plastic', location='Kathmandu', latitude=27.7, longitude=85.3,
+                image_url='https://example.com/a.jpg',
+            ).save()
+            CollectionRequest(
+                user=self.admin, waste_type='organic', quantity='2kg', pickup_date=datetime.utcnow(),
+                location='Kathmandu', latitude=27.7, longitude=85.3,
+            ).save()
+            PickupSchedule(
+                admin=user, date_time=datetime.utcnow() + timedelta(days=1), location='Kathmandu',
+                latitude=27.7, longitude=85.3, garbage_type='organic',
+            ).save()
+
+    def reads(self, view, **kwargs):
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.counter.reads = 0
+        response = view.as_view()(request, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return self.counter.reads
+
+    def assertConstantReads(self, view):
+        self.add_rows(2)
+        self.reads(view)  # Warm up index creation
+        few = self.reads(view)
+        self.add_rows(10)
+        self.assertEqual(self.reads(view), few)
+
+    def test_marketplace_posts(self):
+        self.assertConstantReads(MarketplacePostListView)
+
+    def test_pickup_schedules(self):
+        self.assertConstantReads(PickupScheduleListView)
+
+    def test_user_collection_requests(self):
+        self.assertConstantReads(UserCollectionRequestsView)
+
+    def test_admin_dashboard(self):
+        self.assertConstantReads(AdminDashboardView)
+
+
+class DistanceKernelTests(SimpleTestCase):
+    """``core.distance`` agrees with the scalar ``haversine``."""
+
+    def assertMatchesHaversine(self, lat, lon, lats, lons):
+        expected = [haversine(lat, lon, other_lat, other_lon) for other_lat, other_lon in zip(lats, lons)]
+        np.testing.assert_allclose(distances_km(lat, lon, lats, lons), expected, rtol=1e-9, atol=1e-6)
+
+    def test_random_points(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            lats = [rng.uniform(-90, 90) for _ in range(200)]
+            lons = [rng.uniform(-180, 180) for _ in range(200)]
+            self.assertMatchesHaversine(lat, lon, lats, lons)
+
+    def test_near_the_poles(self):
+        rng = random.Random(11)
+        for pole in (90, -90):
+            lats = [pole - rng.uniform(0, 0.5) * (1 if pole > 0 else -1) for _ in range(100)]
+            lons = [rng.uniform(-180, 180) for _ in range(100)]
+            self.assertMatchesHaversine(pole, 0.0, lats, lons)
+            self.assertMatchesHaversine(lats[0], lons[0], lats, lons)
+
+    def test_across_the_antimeridian(self):
+        lats = [0.0, 10.0, -45.0, 60.0]
+        lons = [-179.9, -179.5, 179.8, -180.0]
+        self.assertMatchesHaversine(0.0, 179.9, lats, lons)
+        # 0.2 degrees of longitude on the equator, not 359.8
+        self.assertAlmostEqual(distances_km(0.0, 179.9, [0.0], [-179.9])[0], 22.24, places=2)
+
+    def test_within_radius(self):
+        rng = random.Random(3)
+        lat, lon = 27.7, 85.3
+        lats = [lat + rng.uniform(-0.2, 0.2) for _ in range(500)]
+        lons = [lon + rng.uniform(-0.2, 0.2) for _ in range(500)]
+        lats.append(None)  # Missing coordinates never match
+        lons.append(None)
+        distances, mask, order = within_radius(lat, lon, lats, lons, 10.0, sort=True)
+        expected = [
+            i for i in range(500) if haversine(lat, lon, lats[i], lons[i]) <= 10.0
+        ]
+        self.assertEqual(sorted(order.tolist()), expected)
+        self.assertEqual(np.flatnonzero(mask).tolist(), expected)
+        self.assertTrue(np.all(np.diff(distances[order]) >= 0))
+        self.assertFalse(mask[-1])
+
+    def test_within_radius_across_the_antimeridian(self):
+        lats = [0.0, 0.0, 0.0]
+        lons = [-179.95, 179.95, 170.0]
+        _, mask, order = within_radius(0.0, 180.0, lats, lons, 10.0)
+        self.assertEqual(mask.tolist(), [True, True, False])
+        self.assertEqual(order.tolist(), [0, 1])
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for ``smtplib``: one session per connection."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 stub ready')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 stub')
+            elif verb in ('MAIL', 'RSET'):
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                if address in self.server.rejected:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                    body.append(data)
+                self.server.delivered.append((recipients, b''.join(body)))
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """SMTP server on a free local port, served from a background thread.
+
+    Records each delivered message as ``(recipients, data)`` and refuses
+    the addresses in ``rejected``.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPStubHandler)
+        self.delivered = []
+        self.rejected = set()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def connection(self):
+        return get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host='127.0.0.1', port=self.server_address[1], use_tls=False, timeout=5,
+        )
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+@unittest.skipUnless(mongo_available(), 'Needs a mongod on localhost:27017')
+class MailQueueTests(SimpleTestCase):
+    """``run_mail_worker``'s claim and delivery steps against a local SMTP
+    server. Needs a local mongod; the data lives in a throwaway
+    ``fohormalai_test`` database."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        disconnect()
+        connect(db='fohormalai_test', host='localhost', port=27017)
+
+    @classmethod
+    def tearDownClass(cls):
+        get_db().client.drop_database('fohormalai_test')
+        disconnect()
+        super().tearDownClass()
+
+    def setUp(self):
+        OutboundEmail.drop_collection()
+        self.smtp = SMTPStub()
+        self.addCleanup(self.smtp.stop)
+
+    def queue(self, *recipients):
+        for recipient in recipients:
+            enqueue_mail('Pickup scheduled', 'See you tomorrow.', 'noreply@example.com', [recipient])
+
+    def stored(self, recipient):
+        return OutboundEmail._get_collection().find_one({'recipients': recipient})
+
+    def assertAbout(self, moment, expected):
+        self.assertAlmostEqual(moment, expected, delta=timedelta(seconds=5))
+
+    def test_delivers_a_batch_over_one_connection(self):
+        self.queue('a@example.com', 'b@example.com', 'c@example.com')
+        batch = claim_batch(10)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(claim_batch(10), [])  # Leased to this worker
+
+        self.assertEqual(deliver_batch(batch, connection=self.smtp.connection()), (3, 0))
+        self.assertEqual(
+            sorted(recipients for recipients, _ in self.smtp.delivered),
+            [['a@example.com'], ['b@example.com'], ['c@example.com']],
+        )
+        for recipient in ('a@example.com', 'b@example.com', 'c@example.com'):
+            message = self.stored(recipient)
+            self.assertEqual(message['status'], 'sent')
+            self.assertEqual(message['attempts'], 1)
+            self.assertNotIn('locked_until', message)
+            self.assertAbout(message['sent_at'], datetime.utcnow())
+
+    def test_failures_back_off_until_max_attempts(self):
+        self.smtp.rejected.add('gone@example.com')
+        self.queue('gone@example.com', 'ok@example.com')
+
+        for attempt, backoff in ((1, 30), (2, 60)):
+            batch = claim_batch(10)
+            sent, failed = deliver_batch(
+                batch, connection=self.smtp.connection(), max_attempts=3, backoff_seconds=30
+            )
+            self.assertEqual((sent, failed), (1 if attempt == 1 else 0, 1))
+            message = self.stored('gone@example.com')
+            self.assertEqual(message['status'], 'queued')
+            self.assertEqual(message['attempts'], attempt)
+            self.assertIn('No such user', message['last_error'])
+            self.assertAbout(message['next_attempt_at'], datetime.utcnow() + timedelta(seconds=backoff))
+            self.assertEqual(claim_batch(10), [])  # Not due yet
+            OutboundEmail._get_collection().update_one(
+                {'_id': message['_id']}, {'$set': {'next_attempt_at': datetime.utcnow()}}
+            )
+
+        self.assertEqual(deliver_batch(claim_batch(10), connection=self.smtp.connection(), max_attempts=3), (0, 1))
+        self.assertEqual(self.stored('gone@example.com')['status'], 'failed')
+        self.assertEqual(self.stored('ok@example.com')['status'], 'sent')
+        self.assertEqual(claim_batch(10), [])
+
+    def test_unreachable_server_requeues_the_batch(self):
+        self.queue('a@example.com', 'b@example.com')
+        connection = self.smtp.connection()
+        self.smtp.stop()
+        self.assertEqual(deliver_batch(claim_batch(10), connection=connection, backoff_seconds=30), (0, 2))
+        for recipient in ('a@example.com', 'b@example.com'):
+            message = self.stored(recipient)
+            self.assertEqual(message['status'], 'queued')
+            self.assertAbout(message['next_attempt_at'], datetime.utcnow() + timedelta(seconds=30))
+
+    def test_expired_lease_is_claimed_again(self):
+        self.queue('a@example.com')
+        self.assertEqual(len(claim_batch(10, lease_seconds=60)), 1)
+        self.assertEqual(claim_batch(10), [])
+
+        # The worker holding the lease died mid-send
+        OutboundEmail._get_collection().update_one(
+            {}, {'$set': {'locked_until': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        batch = claim_batch(10)
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(batch[0]['attempts'], 2)
+        self.assertEqual(deliver_batch(batch, connection=self.smtp.connection()), (1, 0))
+        self.assertEqual(self.stored('a@example.com')['status'], 'sent')
+
+
+class EmptyCollection:
+    """Answers aggregations the way Mongo does for an empty collection."""
+
+    def aggregate(self, pipeline):
+        if '$facet' in pipeline[0]:
+            return iter([{name: [] for name in pipeline[0]['$facet']}])
+        return iter([])
+
+
+class EmptyDatabaseTests(SimpleTestCase):
+    """The dashboard counters of a new deployment are all 0."""
+
+    def setUp(self):
+        for model in (User, CollectionRequest, MarketplacePost, PickupSchedule):
+            patcher = mock.patch.object(model, '_get_collection', return_value=EmptyCollection())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_overview(self):
+        data = overview(recent_requests=5, recent_posts=3, recent_schedules=3, trend_days=7)
+        self.assertEqual(data['users'], 0)
+        self.assertEqual(
+            {key: data['collection_requests'][key] for key in ('total', 'pending', 'completed', 'recent')},
+            {'total': 0, 'pending': 0, 'completed': 0, 'recent': []},
+        )
+        self.assertEqual(data['marketplace_posts'], {'total': 0, 'recent': []})
+        self.assertEqual(data['pickup_schedules'], {'total': 0, 'active': 0, 'recent': []})
+        self.assertEqual(sum(trend['count'] for trend in data['collection_requests']['trends']), 0)
+
+    def test_counters_without_recent_rows(self):
+        data = overview()
+        self.assertEqual(data['collection_requests'], {'total': 0, 'pending': 0, 'completed': 0})
+        self.assertEqual(data['pickup_schedules'], {'total': 0, 'active': 0})
+
+    def test_dashboard_views(self):
+        token = jwt.encode({'email': 'admin@example.com', 'is_admin': True}, settings.SECRET_KEY, algorithm='HS256')
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        for view in (AdminDashboardStatsView, AdminDashboardView):
+            response = view.as_view()(request)
+            self.assertEqual(response.status_code, 200, view.__name__)
@@ -1,16 +1,28 @@
 import random
 import traceback  # Added for exception handling
-from django.core.mail import send_mail
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import OTP, CollectionRequest, MarketplacePost, PickupSchedule, User, Notification
+from . import cumulative, heatmap, rollups
+from .mailqueue import enqueue_mail, enqueue_many
+from .fanout import enqueue_fanout, job_progress, notify_user_of_active_schedules
+from .models import OTP, CollectionRequest, FanoutJob, MarketplacePost, PickupSchedule, ScheduleRecipient, User, Notification
+from . import serializers
+from .analytics import AnalyticsError, analytics_filter, overview, request_breakdown
+from .pagination import PaginationError, page_limit, paginate
+from .notifications import (
+    decrement_unread, shared_template, write_notifications
+)
 from django.contrib.auth.hashers import check_password, make_password
+from bson import ObjectId
 from mongoengine.errors import NotUniqueError
 from datetime import datetime, timedelta
 import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
-from math import radians, cos, sin, asin, sqrt
+from .clustering import cluster_points, dbscan_points
+from .distance import distances_km, within_radius
+from .geo import km_to_radians, to_point
+from .spatial import sync_schedule, sync_user
 import cloudinary.uploader
 
 
@@ -23,12 +35,11 @@ class SendOTPView(APIView):
         otp = str(random.randint(100000, 999999))
         OTP(email=email, otp_code=otp).save()
 
-        send_mail(
+        enqueue_mail(
             'Your FohorMalai OTP Code',
             f'Your OTP is {otp}',
             'your_email@gmail.com',
             [email],
-            fail_silently=False,
         )
 
         return Response({'message': 'OTP sent successfully'})
@@ -79,6 +90,9 @@ class RegisterView(APIView):
             )
             user.save()
             otp_entry.delete()
+            sync_user(user)
+            rollups.record_users_registered([user])
+            notify_user_of_active_schedules(user)
             return Response({'message': 'User registered successfully'}, status=201)
 
         except NotUniqueError:
@@ -159,91 +173,16 @@ class PickupScheduleCreateView(APIView):
             status='scheduled'
         )
         schedule.save()
+        sync_schedule(schedule)
 
-        # Find users within the radius and notify them
-        notified_users = self.notify_users_in_radius(schedule)
-        
-        # Update the schedule with notified users
-        schedule.notified_users = notified_users
-        schedule.save()
+        # Users in the radius are notified by the fan-out worker
+        job = enqueue_fanout(schedule)
 
         return Response({
             'message': 'Pickup schedule created successfully.',
             'schedule_id': str(schedule.id),
-            'users_notified': len(notified_users)
+            'fanout_job': job_progress(job)
         }, status=201)
-    
-    def notify_users_in_radius(self, schedule):
-        """Find users within radius and send them notifications"""
-        notified_users = []
-        
-        # Get all verified users with location data
-        users = User.objects(is_verified=True, latitude__ne=None, longitude__ne=None)
-        
-        for user in users:
-            # Skip admin users
-            if user.is_admin:
-                continue
-                
-            # Calculate distance
-            distance = haversine(
-                schedule.latitude, schedule.longitude,
-                user.latitude, user.longitude
-            )
-            
-            # If user is within radius, notify them
-            if distance <= schedule.coverage_radius_km:
-                # Create notification
-                notification = Notification(
-                    user=user,
-                    pickup_schedule=schedule,
-                    title=f"Pickup Scheduled in Your Area",
-                    message=f"A waste pickup for {schedule.garbage_type} is scheduled on {schedule.date_time.strftime('%Y-%m-%d at %H:%M')} near {schedule.location}. Distance: {distance:.2f}km",
-                    notification_type="pickup_schedule"
-                )
-                notification.save()
-                
-                # Send email notification
-                try:
-                    send_mail(
-                        'Waste Pickup Scheduled in Your Area - FohorMalai',
-                        f"""
-Dear {user.full_name},
-
-A waste pickup has been scheduled in your area:
-
-📅 Date & Time: {schedule.date_time.strftime('%Y-%m-%d at %H:%M')}
-📍 Location: {schedule.location}
-🗂️ Waste Type: {schedule.garbage_type}
-📏 Distance from you: {distance:.2f}km
-
-{schedule.description if schedule.description else ''}
-
-Please prepare your {schedule.garbage_type} waste for collection.
-
-Best regards,
-FohorMalai Team
-                        """,
-                        'fohormalaideu@gmail.com',
-                        [user.email],
-                        fail_silently=True,
-                    )
-                except Exception as e:
-                    print(f"Failed to send email to {user.email}: {str(e)}")
-                
-                notified_users.append(user)
-        
-        return notified_users
-    
-
-def haversine(lat1, lon1, lat2, lon2):
-    # Calculate the great circle distance between two points on the earth (in km)
-    R = 6371  # Earth radius in kilometers
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    return R * c
 
 class NearbyPickupSchedulesView(APIView):
     def get(self, request):
@@ -267,19 +206,30 @@ class NearbyPickupSchedulesView(APIView):
         user_lat = user.latitude
         user_lon = user.longitude
 
-        schedules = PickupSchedule.objects()
+        # Let the 2dsphere index return only schedules within 2km, nearest first
+        schedules = PickupSchedule.objects.aggregate([
+            {'$geoNear': {
+                'near': to_point(user_lat, user_lon),
+                'key': 'location_point',
+                'distanceField': 'distance_m',
+                'maxDistance': 2000,  # 2km radius
+                'spherical': True,
+            }},
+            {'$project': {
+                'date_time': 1, 'location': 1, 'latitude': 1, 'longitude': 1,
+                'garbage_type': 1, 'distance_m': 1,
+            }},
+        ])
         nearby = []
         for sched in schedules:
-            dist = haversine(user_lat, user_lon, sched.latitude, sched.longitude)
-            if dist <= 2:  # 2km radius
-                nearby.append({
-                    "date_time": sched.date_time,
-                    "location": sched.location,
-                    "latitude": sched.latitude,
-                    "longitude": sched.longitude,
-                    "garbage_type": sched.garbage_type,
-                    "distance_km": round(dist, 2)
-                })
+            nearby.append({
+                "date_time": sched['date_time'],
+                "location": sched['location'],
+                "latitude": sched['latitude'],
+                "longitude": sched['longitude'],
+                "garbage_type": sched['garbage_type'],
+                "distance_km": round(sched['distance_m'] / 1000, 2)
+            })
         return Response({"schedules": nearby})
     
 import cloudinary
@@ -347,54 +297,23 @@ class MarketplacePostCreateView(APIView):
             image_url=image_url
         )
         post.save()
+        rollups.record_posts_created([post])
+        cumulative.record_posts_created([post])
         return Response({'message': 'Marketplace post created successfully.'}, status=201)    
 
 class MarketplacePostListView(APIView):
     def get(self, request):
-        # Optional: Authenticate user if you want to personalize results
-        auth_header = request.headers.get('Authorization')
-        user = None
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-                user_email = payload.get('email')
-                user = User.objects(email=user_email).first()
-            except Exception:
-                pass  # Not strictly required for public wall
-
-        posts = MarketplacePost.objects().order_by('-created_at')
-        result = []
-        for post in posts:
-            # Fetch user details
-            user = User.objects(id=post.user.id).first()
-            if user:
-                user_details = {
-                    'id': str(user.id),
-                    'full_name': user.full_name,
-                    'email': user.email,
-                    'phone': user.phone,
-                }
-            else:
-                user_details = None
-
-            # Include user details in the post response
-            result.append({
-                'id': str(post.id),
-                'user': user_details,
-                'title': post.title,
-                'description': post.description,
-                'hashtags': post.hashtags,
-                'price': post.price,
-                'quantity': post.quantity,
-                'waste_type': post.waste_type,
-                'location': post.location,
-                'latitude': post.latitude,
-                'longitude': post.longitude,
-                'image_url': post.image_url,
-                'created_at': post.created_at.isoformat(),
-            })
-        return Response({"posts": result})
+        # The wall is public and not personalized, so no token is read
+        try:
+            posts, page = paginate(
+                MarketplacePost.objects().only(*serializers.MARKETPLACE_POST.fields).as_pymongo(),
+                request, 'created_at'
+            )
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+        # Author details come from one query inside the serializer
+        result = serializers.marketplace_posts(posts)
+        return Response({"posts": result, **page})
     
 class CollectionRequestCreateView(APIView):
     def post(self, request):
@@ -446,6 +365,9 @@ class CollectionRequestCreateView(APIView):
             special_notes=data.get('special_notes', '')
         )
         collection_request.save()
+        heatmap.record_created([collection_request])
+        rollups.record_requests_created([collection_request])
+        cumulative.record_requests_created([collection_request])
         return Response({'message': 'Collection request created successfully.'}, status=201)
     
 class CollectionRequestListView(APIView):
@@ -480,59 +402,33 @@ class CollectionRequestListView(APIView):
         if status:
             query['status'] = status
             
-        # Get all requests that match query
-        requests = CollectionRequest.objects(**query).order_by('-created_at')
-        result = []
-        
-        # Apply radius filter if provided
+        # Radius filter, answered by the 2dsphere index so it pages like any other filter
+        center = None
         if lat and lng and radius_km:
             try:
-                lat = float(lat)
-                lng = float(lng)
-                radius = float(radius_km)
-                
-                # Filter requests by distance
-                for req in requests:
-                    dist = haversine(lat, lng, req.latitude, req.longitude)
-                    if dist <= radius:
-                        # Add to result with distance
-                        result.append({
-                            "id": str(req.id),
-                            "user": str(req.user.full_name) if req.user else "",
-                            "waste_type": req.waste_type,
-                            "quantity": req.quantity,
-                            "pickup_date": req.pickup_date.isoformat(),
-                            "location": req.location,
-                            "latitude": req.latitude,
-                            "longitude": req.longitude,
-                            "image_url": req.image_url,
-                            "special_notes": req.special_notes,
-                            "status": req.status,
-                            "distance_km": round(dist, 2),
-                            "created_at": req.created_at.isoformat()
-                        })
+                center = (float(lat), float(lng))
+                query['location_point__geo_within_sphere'] = [
+                    [center[1], center[0]], km_to_radians(float(radius_km))
+                ]
             except (ValueError, TypeError):
                 # If parameters are invalid, return all results without distance filtering
-                pass
-        else:
-            # No location filtering, return all results
-            for req in requests:
-                result.append({
-                    "id": str(req.id),
-                    "user": str(req.user.full_name) if req.user else "",
-                    "waste_type": req.waste_type,
-                    "quantity": req.quantity,
-                    "pickup_date": req.pickup_date.isoformat(),
-                    "location": req.location,
-                    "latitude": req.latitude,
-                    "longitude": req.longitude,
-                    "image_url": req.image_url,
-                    "special_notes": req.special_notes,
-                    "status": req.status,
-                    "created_at": req.created_at.isoformat()
-                })
+                center = None
+
+        try:
+            requests, page = paginate(
+                CollectionRequest.objects(**query).only(*serializers.COLLECTION_REQUEST.fields).as_pymongo(),
+                request, 'created_at'
+            )
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+
+        distances = None
+        if center:
+            # Add distance for location-filtered results
+            distances = distances_km(*center, [req['latitude'] for req in requests], [req['longitude'] for req in requests])
+        result = serializers.collection_requests(requests, distances)
                 
-        return Response({"collection_requests": result})
+        return Response({"collection_requests": result, **page})
     
 
 class CollectionRequestStatusUpdateView(APIView):
@@ -569,9 +465,26 @@ class CollectionRequestStatusUpdateView(APIView):
                 'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
             }, status=400)
             
-        # Update the status
-        collection_request.status = new_status
-        collection_request.save()
+        # Update the status, only if nobody changed it since it was read, so
+        # the change is counted once however many admins send it
+        old_status = collection_request.status
+        old_completed_at = collection_request.completed_at
+        if new_status != old_status:
+            completed_at = datetime.utcnow() if new_status == 'completed' else None
+            updated = CollectionRequest.objects(id=collection_request.id, status=old_status).update_one(
+                set__status=new_status, set__completed_at=completed_at
+            )
+            if not updated:
+                return Response({
+                    'error': 'The collection request status was changed meanwhile; reload it and try again.'
+                }, status=409)
+            collection_request.status = new_status
+            collection_request.completed_at = completed_at
+            heatmap.record_status_change([collection_request], old_status, new_status)
+            rollups.record_status_change(
+                [collection_request], old_status, new_status, old_completed_at, completed_at
+            )
+            cumulative.record_status_change([collection_request], old_status, new_status)
         
         return Response({
             'message': 'Collection request status updated successfully.',
@@ -580,7 +493,6 @@ class CollectionRequestStatusUpdateView(APIView):
         })
     
 from collections import defaultdict
-from math import radians, cos, sin, asin, sqrt
 
 class AdminCollectionHeatmapView(APIView):
     def get(self, request):
@@ -598,79 +510,68 @@ class AdminCollectionHeatmapView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
         
-        # Get all collection requests
-        collection_requests = CollectionRequest.objects()
+        # With a bounding box and zoom, answer from the pre-aggregated tiles
+        bbox_params = ['min_lat', 'min_lng', 'max_lat', 'max_lng', 'zoom']
+        if any(request.query_params.get(p) for p in bbox_params):
+            try:
+                min_lat, min_lng, max_lat, max_lng = (
+                    float(request.query_params[p]) for p in bbox_params[:4]
+                )
+                zoom = int(request.query_params['zoom'])
+            except (KeyError, ValueError):
+                return Response({
+                    'error': f'Tile mode requires numeric {", ".join(bbox_params)}.'
+                }, status=400)
+            zoom, tiles = heatmap.tiles_in_bbox(min_lat, min_lng, max_lat, max_lng, zoom)
+            return Response({
+                'clusters': tiles,
+                'total_requests': sum(tile['count'] for tile in tiles),
+                'zoom': zoom
+            })
+        
+        # Get all collection requests, reading only the fields clustering needs
+        collection_requests = CollectionRequest.objects().only(
+            'id', 'latitude', 'longitude', 'location', 'status', 'waste_type'
+        ).as_pymongo()
+        points = [
+            {
+                'id': str(req['_id']),
+                'latitude': req.get('latitude'),
+                'longitude': req.get('longitude'),
+                'location': req.get('location'),
+                'status': req.get('status', 'pending'),
+                'waste_type': req.get('waste_type'),
+            } for req in collection_requests
+        ]
         
         # Get clustering radius parameter (in kilometers)
         radius_km = float(request.query_params.get('radius_km', 1.0))
         
+        # Optional density clustering: only groups with at least min_points requests
+        min_points = request.query_params.get('min_points')
+        if min_points:
+            try:
+                min_points = int(min_points)
+            except ValueError:
+                return Response({'error': 'min_points must be an integer.'}, status=400)
+            clusters, noise_ids = dbscan_points(points, radius_km, min_points)
+            return Response({
+                'clusters': clusters,
+                'noise_count': len(noise_ids),
+                'total_requests': len(points)
+            })
+        
         # Create clusters
-        clusters = self.cluster_locations(collection_requests, radius_km)
+        clusters = self.cluster_locations(points, radius_km)
         
         return Response({
             'clusters': clusters,
-            'total_requests': len(collection_requests)
+            'total_requests': len(points)
         })
     
-    def cluster_locations(self, collection_requests, radius_km):
+    def cluster_locations(self, points, radius_km):
         """Group collection requests into clusters based on proximity."""
-        if not collection_requests:
-            return []
-        
-        # Map of cluster center to list of requests
-        clusters = []
-        processed = set()
-        
-        for i, req in enumerate(collection_requests):
-            if str(req.id) in processed:
-                continue
-                
-            # Start a new cluster
-            cluster = {
-                'center': {
-                    'latitude': req.latitude,
-                    'longitude': req.longitude,
-                    'location': req.location
-                },
-                'count': 1,
-                'request_ids': [str(req.id)],
-                'statuses': {req.status: 1},
-                'waste_types': {req.waste_type: 1}
-            }
-            processed.add(str(req.id))
-            
-            # Find all other requests within radius
-            for j, other_req in enumerate(collection_requests):
-                if i == j or str(other_req.id) in processed:
-                    continue
-                    
-                # Calculate distance
-                dist = haversine(req.latitude, req.longitude, 
-                                other_req.latitude, other_req.longitude)
-                
-                if dist <= radius_km:
-                    # Add to cluster
-                    cluster['count'] += 1
-                    cluster['request_ids'].append(str(other_req.id))
-                    
-                    # Update status counts
-                    if other_req.status in cluster['statuses']:
-                        cluster['statuses'][other_req.status] += 1
-                    else:
-                        cluster['statuses'][other_req.status] = 1
-                        
-                    # Update waste type counts
-                    if other_req.waste_type in cluster['waste_types']:
-                        cluster['waste_types'][other_req.waste_type] += 1
-                    else:
-                        cluster['waste_types'][other_req.waste_type] = 1
-                        
-                    processed.add(str(other_req.id))
-            
-            clusters.append(cluster)
-        
-        # Sort clusters by count (largest first)
-        return sorted(clusters, key=lambda x: x['count'], reverse=True)
+        return cluster_points(points, radius_km)
     
 class BulkCollectionRequestUpdateView(APIView):
     def put(self, request):
@@ -695,6 +596,12 @@ class BulkCollectionRequestUpdateView(APIView):
         if missing:
             return Response({'error': f'Missing fields: {", ".join(missing)}'}, status=400)
 
+        valid_statuses = ['pending', 'out_for_collection', 'completed', 'cancelled']
+        if data['status'] not in valid_statuses:
+            return Response({
+                'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
+            }, status=400)
+
         try:
             latitude = float(data['latitude'])
             longitude = float(data['longitude'])
@@ -703,14 +610,11 @@ class BulkCollectionRequestUpdateView(APIView):
         except (ValueError, TypeError):
             return Response({'error': 'Invalid latitude, longitude, radius_km, or pickup_date format'}, status=400)
 
-        # Find all collection requests within the radius
-        collection_requests = CollectionRequest.objects(status='pending')
-        requests_in_radius = []
-        
-        for req in collection_requests:
-            distance = haversine(latitude, longitude, req.latitude, req.longitude)
-            if distance <= radius_km:
-                requests_in_radius.append(req)
+        # Find all pending collection requests within the radius using the 2dsphere index
+        requests_in_radius = list(CollectionRequest.objects(
+            status='pending',
+            location_point__geo_within_sphere=[[longitude, latitude], km_to_radians(radius_km)]
+        ).only('id', 'user', 'location', 'latitude', 'longitude', 'waste_type', 'status', 'created_at').as_pymongo())
 
         if not requests_in_radius:
             return Response({'error': 'No collection requests found in the specified radius'}, status=404)
@@ -720,7 +624,7 @@ class BulkCollectionRequestUpdateView(APIView):
         schedule = PickupSchedule(
             admin=admin,
             date_time=pickup_date,
-            location=requests_in_radius[0].location,  # Use location of first request
+            location=requests_in_radius[0]['location'],  # Use location of first request
             latitude=latitude,
             longitude=longitude,
             coverage_radius_km=radius_km,
@@ -729,66 +633,90 @@ class BulkCollectionRequestUpdateView(APIView):
             status='scheduled'
         )
         schedule.save()
-
-        # Update all requests in radius and notify users
-        updated_count = 0
-        notified_users = set()
-        
-        for req in requests_in_radius:
-            try:
-                req.status = data['status']
-                req.pickup_schedule = schedule
-                req.save()
-                updated_count += 1
-
-                # Create notification for the user
-                if req.user not in notified_users:
-                    notification = Notification(
-                        user=req.user,
-                        pickup_schedule=schedule,
-                        title="Collection Request Scheduled",
-                        message=f"""Your collection request has been scheduled for pickup on 
-                                  {pickup_date.strftime('%Y-%m-%d at %H:%M')}.""",
-                        notification_type="collection_schedule"
-                    )
-                    notification.save()
-
-                    # Send email notification
-                    try:
-                        send_mail(
-                            'Collection Request Scheduled - FohorMalai',
-                            f"""
-Dear {req.user.full_name},
+        sync_schedule(schedule)
+
+        # Update all requests in radius with a single update_many; the status
+        # guard skips any request that stopped being pending in the meantime
+        completed_at = datetime.utcnow() if data['status'] == 'completed' else None
+        update_result = CollectionRequest.objects(
+            id__in=[req['_id'] for req in requests_in_radius],
+            status='pending'
+        ).update(
+            full_result=True, set__status=data['status'], set__pickup_schedule=schedule,
+            set__completed_at=completed_at,
+        )
+        updated_count = update_result.modified_count
+
+        # Only the requests now pointing at the new schedule were updated;
+        # the rest stopped being pending before the update reached them
+        updated_ids = set(CollectionRequest.objects(
+            id__in=[req['_id'] for req in requests_in_radius],
+            pickup_schedule=schedule
+        ).scalar('id'))
+        updated_requests = [req for req in requests_in_radius if req['_id'] in updated_ids]
+
+        heatmap.record_status_change(updated_requests, 'pending', data['status'])
+        rollups.record_status_change(updated_requests, 'pending', data['status'], completed_at=completed_at)
+        cumulative.record_status_change(updated_requests, 'pending', data['status'])
+
+        # Load every affected user in one query, then notify each of them once
+        users = User.objects.only('id', 'full_name', 'email').in_bulk(
+            list({req['user'] for req in updated_requests})
+        )
+        recipients = {}
+        for req in updated_requests:
+            user = users.get(req['user'])
+            if user is not None and user.id not in recipients:
+                recipients[user.id] = (user, req['location'])
+        notified_users = set(recipients)
+
+        # Create notifications for all users in chunked insert_many calls,
+        # sharing one template for the text
+        template = shared_template(
+            f"collection_schedule:{schedule.id}",
+            "Collection Request Scheduled",
+            f"""Your collection request has been scheduled for pickup on 
+                          {pickup_date.strftime('%Y-%m-%d at %H:%M')}.""",
+        ) if recipients else None
+        write_notifications([
+            Notification(
+                user=user,
+                pickup_schedule=schedule,
+                template=template,
+                notification_type="collection_schedule"
+            ) for user, _ in recipients.values()
+        ])
+
+        # Queue email notifications for the mail worker
+        enqueue_many([
+            (
+                'Collection Request Scheduled - FohorMalai',
+                f"""
+Dear {user.full_name},
 
 Your collection request has been scheduled for pickup:
 
 📅 Date & Time: {pickup_date.strftime('%Y-%m-%d at %H:%M')}
-📍 Location: {req.location}
+📍 Location: {location}
 🗑️ Status: {data['status']}
 
 Please ensure your waste is properly segregated and ready for collection.
 
 Best regards,
 FohorMalai Team
-                            """,
-                            'fohormalaideu@gmail.com',
-                            [req.user.email],
-                            fail_silently=True,
-                        )
-                    except Exception as e:
-                        print(f"Failed to send email to {req.user.email}: {str(e)}")
-
-                    notified_users.add(req.user)
-
-            except Exception as e:
-                print(f"Error updating request {req.id}: {str(e)}")
-                continue
+                """,
+                'fohormalaideu@gmail.com',
+                [user.email],
+            ) for user, location in recipients.values()
+        ])
 
         return Response({
             'message': f'Updated {updated_count} collection requests',
             'schedule_id': str(schedule.id),
             'total_requests': len(requests_in_radius),
             'updated_requests': updated_count,
+            'matched_requests': update_result.matched_count,
+            'modified_requests': update_result.modified_count,
             'users_notified': len(notified_users),
             'pickup_date': pickup_date.isoformat(),
             'coverage_area': {
@@ -824,26 +752,16 @@ class PickupScheduleListView(APIView):
         if garbage_type:
             query['garbage_type'] = garbage_type
         
-        schedules = PickupSchedule.objects(**query).order_by('-created_at')
-        result = []
-        
-        for schedule in schedules:
-            result.append({
-                'id': str(schedule.id),
-                'admin': schedule.admin.full_name if schedule.admin else 'Unknown',
-                'date_time': schedule.date_time.isoformat(),
-                'location': schedule.location,
-                'latitude': schedule.latitude,
-                'longitude': schedule.longitude,
-                'coverage_radius_km': schedule.coverage_radius_km,
-                'garbage_type': schedule.garbage_type,
-                'description': schedule.description,
-                'status': schedule.status,
-                'users_notified': len(schedule.notified_users) if schedule.notified_users else 0,
-                'created_at': schedule.created_at.isoformat()
-            })
+        try:
+            schedules, page = paginate(
+                PickupSchedule.objects(**query).only(*serializers.PICKUP_SCHEDULE.fields).as_pymongo(),
+                request, 'created_at'
+            )
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+        result = serializers.pickup_schedules(schedules)
         
-        return Response({'pickup_schedules': result})
+        return Response({'pickup_schedules': result, **page})
 
 class PickupScheduleUpdateView(APIView):
     def patch(self, request, schedule_id):
@@ -876,6 +794,7 @@ class PickupScheduleUpdateView(APIView):
         
         schedule.status = new_status
         schedule.save()
+        sync_schedule(schedule)
         
         return Response({
             'message': 'Pickup schedule status updated successfully.',
@@ -908,25 +827,18 @@ class UserNotificationsView(APIView):
         if is_read is not None:
             query['is_read'] = is_read.lower() == 'true'
         
-        notifications = Notification.objects(**query).order_by('-sent_at')
-        result = []
-        
-        for notification in notifications:
-            result.append({
-                'id': str(notification.id),
-                'title': notification.title,
-                'message': notification.message,
-                'notification_type': notification.notification_type,
-                'is_read': notification.is_read,
-                'sent_at': notification.sent_at.isoformat(),
-                'pickup_schedule': {
-                    'id': str(notification.pickup_schedule.id),
-                    'date_time': notification.pickup_schedule.date_time.isoformat(),
-                    'location': notification.pickup_schedule.location
-                } if notification.pickup_schedule else None
-            })
+        try:
+            notifications, page = paginate(
+                Notification.objects(**query).only(*serializers.NOTIFICATION.fields).as_pymongo(),
+                request, 'sent_at'
+            )
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+
+        # Shared templates and schedules are fetched once each, then the text is rendered
+        result = serializers.notifications(notifications)
         
-        return Response({'notifications': result})
+        return Response({'notifications': result, **page})
     
     def patch(self, request):
         """Mark notifications as read"""
@@ -946,24 +858,57 @@ class UserNotificationsView(APIView):
             return Response({'error': 'User not found.'}, status=404)
         
         notification_ids = request.data.get('notification_ids', [])
+        up_to = request.data.get('up_to')
         
-        if not notification_ids:
+        if up_to:
+            # Mark everything sent up to a point in time as read
+            try:
+                up_to = datetime.fromisoformat(up_to)
+            except (TypeError, ValueError):
+                return Response({'error': 'Invalid up_to format. Use ISO format.'}, status=400)
+            count = Notification.objects(user=user, is_read=False, sent_at__lte=up_to).update(
+                set__is_read=True, set__read_at=datetime.utcnow()
+            )
+            decrement_unread(user, count)
+            return Response({'message': f'{count} notifications marked as read.'})
+        elif not notification_ids:
             # Mark all as read
-            Notification.objects(user=user, is_read=False).update(is_read=True)
+            count = Notification.objects(user=user, is_read=False).update(
+                set__is_read=True, set__read_at=datetime.utcnow()
+            )
+            decrement_unread(user, count)
             return Response({'message': 'All notifications marked as read.'})
         else:
-            # Mark specific notifications as read
-            count = 0
-            for notification_id in notification_ids:
-                try:
-                    notification = Notification.objects.get(id=notification_id, user=user)
-                    notification.is_read = True
-                    notification.save()
-                    count += 1
-                except:
-                    continue
+            # Mark specific notifications as read in a single update; already read
+            # ones are left alone so their read_at, and the TTL, keep running
+            valid_ids = [i for i in notification_ids if ObjectId.is_valid(i)]
+            result = Notification.objects(id__in=valid_ids, user=user, is_read=False).update(
+                full_result=True, set__is_read=True, set__read_at=datetime.utcnow()
+            )
+            decrement_unread(user, result.modified_count)
             
-            return Response({'message': f'{count} notifications marked as read.'})
+            return Response({'message': f'{result.matched_count} notifications marked as read.'})
+
+class UserUnreadNotificationsCountView(APIView):
+    def get(self, request):
+        """Unread notification badge count for the logged-in user"""
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({'error': 'Authorization header missing or invalid.'}, status=401)
+        
+        token = auth_header.split(' ')[1]
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            user_email = payload.get('email')
+        except Exception:
+            return Response({'error': 'Invalid or expired token.'}, status=401)
+        
+        # Served from the counter on the user document; never reads notifications
+        user = User.objects(email=user_email).only('unread_notifications').as_pymongo().first()
+        if not user:
+            return Response({'error': 'User not found.'}, status=404)
+        
+        return Response({'unread_count': max(user.get('unread_notifications', 0), 0)})
 
 class AdminDashboardStatsView(APIView):
     def get(self, request):
@@ -981,46 +926,38 @@ class AdminDashboardStatsView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
         
-        # Get statistics
-        total_users = User.objects(is_verified=True, is_admin=False).count()
-        total_collection_requests = CollectionRequest.objects().count()
-        pending_requests = CollectionRequest.objects(status='pending').count()
-        completed_requests = CollectionRequest.objects(status='completed').count()
-        total_schedules = PickupSchedule.objects().count()
-        active_schedules = PickupSchedule.objects(status__in=['scheduled', 'in_progress']).count()
-        total_marketplace_posts = MarketplacePost.objects().count()
-        
-        # Recent activity
-        recent_requests = CollectionRequest.objects().order_by('-created_at').limit(5)
-        recent_schedules = PickupSchedule.objects().order_by('-created_at').limit(5)
+        # Counters and recent rows, one aggregation per collection run concurrently
+        data = overview(recent_requests=5, recent_schedules=5)
+        requests = data['collection_requests']
+        schedules = data['pickup_schedules']
         
         stats = {
             'overview': {
-                'total_users': total_users,
-                'total_collection_requests': total_collection_requests,
-                'pending_requests': pending_requests,
-                'completed_requests': completed_requests,
-                'total_schedules': total_schedules,
-                'active_schedules': active_schedules,
-                'total_marketplace_posts': total_marketplace_posts
+                'total_users': data['users'],
+                'total_collection_requests': requests['total'],
+                'pending_requests': requests['pending'],
+                'completed_requests': requests['completed'],
+                'total_schedules': schedules['total'],
+                'active_schedules': schedules['active'],
+                'total_marketplace_posts': data['marketplace_posts']['total']
             },
             'recent_requests': [
                 {
-                    'id': str(req.id),
-                    'user': req.user.full_name,
-                    'waste_type': req.waste_type,
-                    'status': req.status,
-                    'created_at': req.created_at.isoformat()
-                } for req in recent_requests
+                    'id': str(req['_id']),
+                    'user': req.get('user_name'),
+                    'waste_type': req['waste_type'],
+                    'status': req['status'],
+                    'created_at': req['created_at'].isoformat()
+                } for req in requests['recent']
             ],
             'recent_schedules': [
                 {
-                    'id': str(schedule.id),
-                    'location': schedule.location,
-                    'garbage_type': schedule.garbage_type,
-                    'date_time': schedule.date_time.isoformat(),
-                    'status': schedule.status
-                } for schedule in recent_schedules
+                    'id': str(schedule['_id']),
+                    'location': schedule['location'],
+                    'garbage_type': schedule['garbage_type'],
+                    'date_time': schedule['date_time'].isoformat(),
+                    'status': schedule['status']
+                } for schedule in schedules['recent']
             ]
         }
         
@@ -1069,26 +1006,17 @@ class AdminUsersListView(APIView):
         if location:
             query['location__icontains'] = location
         
-        users = User.objects(**query).order_by('-registered_on')
-        result = []
-        
-        for user in users:
-            result.append({
-                'id': str(user.id),
-                'full_name': user.full_name,
-                'email': user.email,
-                'phone': user.phone,
-                'location': user.location,
-                'latitude': user.latitude,
-                'longitude': user.longitude,
-                'is_verified': user.is_verified,
-                'is_admin': user.is_admin,
-                'registered_on': user.registered_on.isoformat()
-            })
+        try:
+            users, page = paginate(
+                User.objects(**query).only(*serializers.ADMIN_USER.fields).as_pymongo(), request, 'registered_on'
+            )
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+        result = serializers.admin_users(users)
         
         return Response({
             'users': result,
-            'total_count': len(result)
+            **page
         })
 
 class AdminDashboardView(APIView):
@@ -1107,12 +1035,28 @@ class AdminDashboardView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
         
-        # Get statistics
-        total_users = User.objects(is_verified=True, is_admin=False).count()
-        total_collection_requests = CollectionRequest.objects().count()
-        pending_collections = CollectionRequest.objects(status='pending').count()
-        completed_collections = CollectionRequest.objects(status='completed').count()
-        marketplace_posts = MarketplacePost.objects().count()
+        # Requests per day (or week/month) split by waste type
+        try:
+            trend_days = int(request.query_params.get('trend_days', 30))
+        except ValueError:
+            return Response({'error': 'trend_days must be an integer.'}, status=400)
+        
+        # Counters, recent rows with their users' names and trends, in one
+        # aggregation per collection run concurrently
+        try:
+            data = overview(
+                recent_requests=5, recent_posts=3, recent_schedules=3,
+                trend_days=min(trend_days, getattr(settings, 'TREND_MAX_DAYS', 366)),
+                trend_bucket=request.query_params.get('trend_bucket', 'day'),
+            )
+        except AnalyticsError as e:
+            return Response({'error': str(e)}, status=400)
+        requests = data['collection_requests']
+        total_users = data['users']
+        total_collection_requests = requests['total']
+        pending_collections = requests['pending']
+        completed_collections = requests['completed']
+        marketplace_posts = data['marketplace_posts']['total']
         
         # Calculate changes (mock data for now - you can implement actual comparison)
         pending_change = 5.2  # You can calculate this based on previous period
@@ -1120,81 +1064,57 @@ class AdminDashboardView(APIView):
         marketplace_change = 8.1
         users_change = 15.3
         
-        # Get recent activities
-        recent_requests = CollectionRequest.objects().order_by('-created_at').limit(5)
-        recent_marketplace = MarketplacePost.objects().order_by('-created_at').limit(3)
-        recent_schedules = PickupSchedule.objects().order_by('-created_at').limit(3)
-        
         recent_activities = []
         
         # Add collection requests to activities
-        for req in recent_requests:
+        for req in requests['recent']:
             recent_activities.append({
-                'id': str(req.id),
+                'id': str(req['_id']),
                 'type': 'collection',
-                'message': f'New collection request for {req.waste_type} by {req.user.full_name}',
-                'timestamp': req.created_at.isoformat(),
-                'user': req.user.full_name,
+                'message': f'New collection request for {req["waste_type"]} by {req.get("user_name", "Unknown")}',
+                'timestamp': req['created_at'].isoformat(),
+                'user': req.get('user_name', 'Unknown'),
                 'metadata': {
-                    'waste_type': req.waste_type,
-                    'status': req.status,
-                    'location': req.location
+                    'waste_type': req['waste_type'],
+                    'status': req['status'],
+                    'location': req['location']
                 }
             })
         
         # Add marketplace posts to activities
-        for post in recent_marketplace:
+        for post in data['marketplace_posts']['recent']:
             recent_activities.append({
-                'id': str(post.id),
+                'id': str(post['_id']),
                 'type': 'marketplace',
-                'message': f'New marketplace post: {post.title} by {post.user.full_name}',
-                'timestamp': post.created_at.isoformat(),
-                'user': post.user.full_name,
+                'message': f'New marketplace post: {post["title"]} by {post.get("user_name", "Unknown")}',
+                'timestamp': post['created_at'].isoformat(),
+                'user': post.get('user_name', 'Unknown'),
                 'metadata': {
-                    'title': post.title,
-                    'price': post.price,
-                    'waste_type': post.waste_type
+                    'title': post['title'],
+                    'price': post['price'],
+                    'waste_type': post['waste_type']
                 }
             })
         
         # Add pickup schedules to activities
-        for schedule in recent_schedules:
+        for schedule in data['pickup_schedules']['recent']:
             recent_activities.append({
-                'id': str(schedule.id),
+                'id': str(schedule['_id']),
                 'type': 'system',
-                'message': f'Pickup scheduled for {schedule.garbage_type} at {schedule.location}',
-                'timestamp': schedule.created_at.isoformat(),
-                'user': schedule.admin.full_name if schedule.admin else 'System',
+                'message': f'Pickup scheduled for {schedule["garbage_type"]} at {schedule["location"]}',
+                'timestamp': schedule['created_at'].isoformat(),
+                'user': schedule.get('user_name', 'System'),
                 'metadata': {
-                    'garbage_type': schedule.garbage_type,
-                    'location': schedule.location,
-                    'status': schedule.status
+                    'garbage_type': schedule['garbage_type'],
+                    'location': schedule['location'],
+                    'status': schedule['status']
                 }
             })
         
         # Sort activities by timestamp
         recent_activities.sort(key=lambda x: x['timestamp'], reverse=True)
         recent_activities = recent_activities[:10]  # Limit to 10 most recent
-        
-        # Get waste collection trends (mock data - you can implement actual trends)
-        from datetime import datetime, timedelta
-        import calendar
-        
-        trends = []
-        current_date = datetime.now()
-        for i in range(30):  # Last 30 days
-            date = current_date - timedelta(days=i)
-            # You can calculate actual counts here
-            count = CollectionRequest.objects(
-                created_at__gte=date.replace(hour=0, minute=0, second=0),
-                created_at__lt=date.replace(hour=23, minute=59, second=59)
-            ).count()
-            
-            trends.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'count': count,
-                'waste_type': 'Mixed'  # You can break this down by actual waste types
-            })
+        trends = requests['trends']
         
         dashboard_data = {
             'stats': {
@@ -1231,37 +1151,42 @@ class AdminDashboardActivitiesView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
         
-        limit = int(request.query_params.get('limit', 10))
+        try:
+            limit = page_limit(request, default=10)
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
         
-        # Get recent activities from various sources
-        recent_requests = CollectionRequest.objects().order_by('-created_at').limit(limit//2)
-        recent_marketplace = MarketplacePost.objects().order_by('-created_at').limit(limit//2)
+        # Get recent activities from various sources, with their users' names joined in
+        half = (limit + 1) // 2
+        data = overview(counts=False, recent_requests=half, recent_posts=half)
+        recent_requests = data.get('collection_requests', {}).get('recent', [])
+        recent_marketplace = data.get('marketplace_posts', {}).get('recent', [])
         
         activities = []
         
         for req in recent_requests:
             activities.append({
-                'id': str(req.id),
+                'id': str(req['_id']),
                 'type': 'collection',
-                'message': f'New collection request for {req.waste_type}',
-                'timestamp': req.created_at.isoformat(),
-                'user': req.user.full_name,
+                'message': f'New collection request for {req["waste_type"]}',
+                'timestamp': req['created_at'].isoformat(),
+                'user': req.get('user_name'),
                 'metadata': {
-                    'waste_type': req.waste_type,
-                    'status': req.status
+                    'waste_type': req['waste_type'],
+                    'status': req['status']
                 }
             })
         
         for post in recent_marketplace:
             activities.append({
-                'id': str(post.id),
+                'id': str(post['_id']),
                 'type': 'marketplace',
-                'message': f'New marketplace post: {post.title}',
-                'timestamp': post.created_at.isoformat(),
-                'user': post.user.full_name,
+                'message': f'New marketplace post: {post["title"]}',
+                'timestamp': post['created_at'].isoformat(),
+                'user': post.get('user_name'),
                 'metadata': {
-                    'title': post.title,
-                    'price': post.price
+                    'title': post['title'],
+                    'price': post['price']
                 }
             })
         
@@ -1292,58 +1217,40 @@ class AdminAnalyticsView(APIView):
         waste_type = request.query_params.get('waste_type')
         location = request.query_params.get('location')
         
-        # Build query filters
-        query = {}
+        # Build query filters; unparseable dates are ignored
+        start = end = None
+        end_is_date = False
         if start_date:
             try:
                 start = datetime.fromisoformat(start_date)
-                query['created_at__gte'] = start
-            except:
+            except ValueError:
                 pass
         
         if end_date:
             try:
                 end = datetime.fromisoformat(end_date)
-                query['created_at__lte'] = end
-            except:
+                end_is_date = len(end_date) == 10  # A plain YYYY-MM-DD covers the whole day
+            except ValueError:
                 pass
         
-        if waste_type and waste_type != 'All Types':
-            query['waste_type'] = waste_type
-        
-        if location:
-            query['location__icontains'] = location
-        
-        # Get analytics data
-        collection_requests = CollectionRequest.objects(**query)
-        marketplace_posts = MarketplacePost.objects(**query)
-        
-        # Aggregate data by waste type
-        waste_type_stats = {}
-        for req in collection_requests:
-            if req.waste_type not in waste_type_stats:
-                waste_type_stats[req.waste_type] = {'count': 0, 'completed': 0}
-            waste_type_stats[req.waste_type]['count'] += 1
-            if req.status == 'completed':
-                waste_type_stats[req.waste_type]['completed'] += 1
-        
-        # Location-wise statistics
-        location_stats = {}
-        for req in collection_requests:
-            loc = req.location.split(',')[0]  # Get first part of location
-            if loc not in location_stats:
-                location_stats[loc] = 0
-            location_stats[loc] += 1
+        if waste_type == 'All Types':
+            waste_type = None
+        days = cumulative.whole_days(start, end, end_is_date)
+        if days and not location:
+            # Whole days: the difference of two prefix sums, however long the range
+            breakdown = cumulative.request_breakdown(*days, waste_type=waste_type)
+        else:
+            # Breakdowns, totals and the marketplace count computed by Mongo
+            if end_is_date:
+                end += timedelta(days=1, milliseconds=-1)
+            breakdown = request_breakdown(analytics_filter(start, end, waste_type, location))
         
         analytics_data = {
-            'total_requests': collection_requests.count(),
-            'total_marketplace_posts': marketplace_posts.count(),
-            'waste_type_breakdown': waste_type_stats,
-            'location_breakdown': location_stats,
-            'completion_rate': (
-                collection_requests.filter(status='completed').count() / 
-                max(collection_requests.count(), 1) * 100
-            ),
+            'total_requests': breakdown['total_requests'],
+            'total_marketplace_posts': breakdown['total_marketplace_posts'],
+            'waste_type_breakdown': breakdown['waste_type_breakdown'],
+            'location_breakdown': breakdown['location_breakdown'],
+            'completion_rate': breakdown['completed_requests'] / max(breakdown['total_requests'], 1) * 100,
             'period': {
                 'start_date': start_date,
                 'end_date': end_date
@@ -1377,28 +1284,27 @@ class AdminPickupSchedulesUsersInRadiusView(APIView):
             return Response({'error': 'Invalid latitude, longitude, or radius_km parameters.'}, status=400)
         
         # Get all verified users with location data
-        users = User.objects(is_verified=True, latitude__ne=None, longitude__ne=None, is_admin=False)
+        users = list(User.objects(is_verified=True, latitude__ne=None, longitude__ne=None, is_admin=False))
         
-        users_in_radius = []
-        for user in users:
-            # Calculate distance using haversine formula
-            distance = haversine(latitude, longitude, user.latitude, user.longitude)
-            
-            if distance <= radius_km:
-                users_in_radius.append({
-                    'id': str(user.id),
-                    'full_name': user.full_name,
-                    'email': user.email,
-                    'phone': user.phone,
-                    'location': user.location,
-                    'latitude': user.latitude,
-                    'longitude': user.longitude,
-                    'distance_km': round(distance, 2),
-                    'registered_on': user.registered_on.isoformat()
-                })
+        # Calculate every distance in one vectorized pass, nearest first
+        lats = [user.latitude for user in users]
+        lngs = [user.longitude for user in users]
+        distances, _, order = within_radius(latitude, longitude, lats, lngs, radius_km, sort=True)
         
-        # Sort by distance
-        users_in_radius.sort(key=lambda x: x['distance_km'])
+        users_in_radius = []
+        for i in order:
+            user = users[i]
+            users_in_radius.append({
+                'id': str(user.id),
+                'full_name': user.full_name,
+                'email': user.email,
+                'phone': user.phone,
+                'location': user.location,
+                'latitude': user.latitude,
+                'longitude': user.longitude,
+                'distance_km': round(float(distances[i]), 2),
+                'registered_on': user.registered_on.isoformat()
+            })
         
         return Response({
             'users': users_in_radius,
@@ -1454,40 +1360,20 @@ class AdminPickupSchedulesListView(APIView):
             except:
                 pass
         
-        schedules = PickupSchedule.objects(**query).order_by('-created_at')
-        result = []
-        
-        for schedule in schedules:
-            result.append({
-                'id': str(schedule.id),
-                'admin': {
-                    'id': str(schedule.admin.id),
-                    'name': schedule.admin.full_name,
-                    'email': schedule.admin.email
-                } if schedule.admin else None,
-                'date_time': schedule.date_time.isoformat(),
-                'location': schedule.location,
-                'latitude': schedule.latitude,
-                'longitude': schedule.longitude,
-                'coverage_radius_km': schedule.coverage_radius_km,
-                'garbage_type': schedule.garbage_type,
-                'description': schedule.description,
-                'status': schedule.status,
-                'notified_users_count': len(schedule.notified_users) if schedule.notified_users else 0,
-                'notified_users': [
-                    {
-                        'id': str(user.id),
-                        'name': user.full_name,
-                        'email': user.email,
-                        'location': user.location
-                    } for user in schedule.notified_users
-                ] if schedule.notified_users else [],
-                'created_at': schedule.created_at.isoformat()
-            })
+        try:
+            schedules, page = paginate(
+                PickupSchedule.objects(**query).only(*serializers.PICKUP_SCHEDULE.fields).as_pymongo(),
+                request, 'created_at'
+            )
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+        # The admins of the page are loaded in one query; recipients are only
+        # counted here, see AdminScheduleRecipientsView for the list
+        result = serializers.admin_pickup_schedules(schedules)
         
         return Response({
             'pickup_schedules': result,
-            'total_count': len(result),
+            **page,
             'filters_applied': {
                 'status': status,
                 'garbage_type': garbage_type,
@@ -1546,13 +1432,10 @@ class AdminPickupSchedulesListView(APIView):
             status='scheduled'
         )
         schedule.save()
+        sync_schedule(schedule)
 
-        # Find users within the radius and notify them
-        notified_users = self.notify_users_in_radius(schedule)
-        
-        # Update the schedule with notified users
-        schedule.notified_users = notified_users
-        schedule.save()
+        # Users in the radius are notified by the fan-out worker
+        job = enqueue_fanout(schedule)
 
         return Response({
             'message': 'Pickup schedule created successfully.',
@@ -1562,71 +1445,85 @@ class AdminPickupSchedulesListView(APIView):
                 'location': schedule.location,
                 'garbage_type': schedule.garbage_type,
                 'coverage_radius_km': schedule.coverage_radius_km,
-                'users_notified': len(notified_users)
-            }
+            },
+            'fanout_job': job_progress(job)
         }, status=201)
-    
-    def notify_users_in_radius(self, schedule):
-        """Find users within radius and send them notifications"""
-        notified_users = []
+
+
+class AdminScheduleRecipientsView(APIView):
+    def get(self, request, schedule_id):
+        """Users notified of a pickup schedule, most recently notified first"""
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({'error': 'Authorization header missing or invalid.'}, status=401)
         
-        # Get all verified users with location data
-        users = User.objects(is_verified=True, latitude__ne=None, longitude__ne=None)
+        token = auth_header.split(' ')[1]
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            is_admin = payload.get('is_admin', False)
+            if not is_admin:
+                return Response({'error': 'Admin access required.'}, status=403)
+        except Exception:
+            return Response({'error': 'Invalid or expired token.'}, status=401)
         
-        for user in users:
-            # Skip admin users
-            if user.is_admin:
-                continue
-                
-            # Calculate distance
-            distance = haversine(
-                schedule.latitude, schedule.longitude,
-                user.latitude, user.longitude
+        schedule = PickupSchedule.objects(id=schedule_id).only('id', 'notified_count').first() if ObjectId.is_valid(schedule_id) else None
+        if not schedule:
+            return Response({'error': 'Pickup schedule not found.'}, status=404)
+        
+        try:
+            recipients, page = paginate(
+                ScheduleRecipient.objects(pickup_schedule=schedule.id).only(
+                    *serializers.SCHEDULE_RECIPIENT.fields
+                ).as_pymongo(),
+                request, 'notified_at'
             )
-            
-            # If user is within radius, notify them
-            if distance <= schedule.coverage_radius_km:
-                # Create notification
-                notification = Notification(
-                    user=user,
-                    pickup_schedule=schedule,
-                    title=f"Pickup Scheduled in Your Area",
-                    message=f"A waste pickup for {schedule.garbage_type} is scheduled on {schedule.date_time.strftime('%Y-%m-%d at %H:%M')} near {schedule.location}. Distance: {distance:.2f}km",
-                    notification_type="pickup_schedule"
-                )
-                notification.save()
-                
-                # Send email notification
-                try:
-                    send_mail(
-                        'Waste Pickup Scheduled in Your Area - FohorMalai',
-                        f"""
-Dear {user.full_name},
-
-A waste pickup has been scheduled in your area:
-
-📅 Date & Time: {schedule.date_time.strftime('%Y-%m-%d at %H:%M')}
-📍 Location: {schedule.location}
-🗂️ Waste Type: {schedule.garbage_type}
-📏 Distance from you: {distance:.2f}km
-
-{schedule.description if schedule.description else ''}
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        return Response({
+            'schedule_id': str(schedule.id),
+            'notified_users_count': schedule.notified_count,
+            'recipients': serializers.schedule_recipients(recipients),
+            **page
+        })
 
-Please prepare your {schedule.garbage_type} waste for collection.
 
-Best regards,
-FohorMalai Team
-                        """,
-                        'fohormalaideu@gmail.com',
-                        [user.email],
-                        fail_silently=True,
-                    )
-                except Exception as e:
-                    print(f"Failed to send email to {user.email}: {str(e)}")
-                
-                notified_users.append(user)
+class AdminFanoutJobsView(APIView):
+    def get(self, request, job_id=None):
+        """Progress of pickup notification fan-out jobs"""
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({'error': 'Authorization header missing or invalid.'}, status=401)
+        
+        token = auth_header.split(' ')[1]
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            is_admin = payload.get('is_admin', False)
+            if not is_admin:
+                return Response({'error': 'Admin access required.'}, status=403)
+        except Exception:
+            return Response({'error': 'Invalid or expired token.'}, status=401)
+        
+        if job_id:
+            job = FanoutJob.objects(id=job_id).no_dereference().first() if ObjectId.is_valid(job_id) else None
+            if not job:
+                return Response({'error': 'Fan-out job not found.'}, status=404)
+            return Response({'job': job_progress(job)})
+        
+        # Filter by schedule or status, newest first
+        query = {}
+        schedule_id = request.query_params.get('schedule_id')
+        status = request.query_params.get('status')
+        if schedule_id:
+            if not ObjectId.is_valid(schedule_id):
+                return Response({'error': 'Invalid schedule_id.'}, status=400)
+            query['pickup_schedule'] = ObjectId(schedule_id)
+        if status:
+            query['status'] = status
         
-        return notified_users
+        jobs = FanoutJob.objects(**query).no_dereference().order_by('-created_at')[:100]
+        return Response({'jobs': [job_progress(job) for job in jobs]})
+
 
 class UserCollectionRequestsView(APIView):
     def get(self, request, user_email=None):
@@ -1687,30 +1584,12 @@ class UserCollectionRequestsView(APIView):
                 pass
         
         # Get the collection requests
-        collection_requests = CollectionRequest.objects(**query).order_by('-created_at')
+        collection_requests = CollectionRequest.objects(**query).order_by('-created_at').only(
+            *serializers.COLLECTION_REQUEST.fields
+        ).as_pymongo()
         
         # Format the response
-        result = []
-        for req in collection_requests:
-            result.append({
-                "id": str(req.id),
-                "user": {
-                    "id": str(req.user.id),
-                    "full_name": req.user.full_name,
-                    "email": req.user.email,
-                    "phone": req.user.phone  # Added phone number
-                },
-                "waste_type": req.waste_type,
-                "quantity": req.quantity,
-                "pickup_date": req.pickup_date.isoformat(),
-                "location": req.location,
-                "latitude": req.latitude,
-                "longitude": req.longitude,
-                "image_url": req.image_url,
-                "special_notes": req.special_notes,
-                "status": req.status,
-                "created_at": req.created_at.isoformat()
-            })
+        result = serializers.user_collection_requests(collection_requests)
             
         return Response({
             "collection_requests": result,
@@ -1747,8 +1626,8 @@ class UserPickupSchedulesView(APIView):
         garbage_type = request.query_params.get('garbage_type')
         upcoming_only = request.query_params.get('upcoming_only', 'false').lower() == 'true'
         
-        # Find schedules where this user is in notified_users
-        query = {'notified_users': current_user}
+        # Find schedules that recorded this user as a recipient
+        query = {'id__in': ScheduleRecipient._get_collection().distinct('pickup_schedule', {'user': current_user.id})}
         
         # Apply filters
         if status:
@@ -1759,17 +1638,21 @@ class UserPickupSchedulesView(APIView):
             query['date_time__gte'] = datetime.utcnow()
         
         # Get the pickup schedules
-        schedules = PickupSchedule.objects(**query).order_by('date_time')
+        schedules = list(PickupSchedule.objects(**query).order_by('date_time'))
+        
+        # Calculate distance from user to every pickup location at once
+        if current_user.latitude and current_user.longitude:
+            distances = distances_km(
+                current_user.latitude, current_user.longitude,
+                [schedule.latitude for schedule in schedules],
+                [schedule.longitude for schedule in schedules]
+            ).tolist()
+        else:
+            distances = [None] * len(schedules)
         
         # Format the response
         result = []
-        for schedule in schedules:
-            # Calculate distance from user to pickup location
-            distance = haversine(
-                current_user.latitude, current_user.longitude,
-                schedule.latitude, schedule.longitude
-            ) if current_user.latitude and current_user.longitude else None
-            
+        for schedule, distance in zip(schedules, distances):
             result.append({
                 "id": str(schedule.id),
                 "admin": {
@@ -1832,6 +1715,50 @@ class UserProfileView(APIView):
             'is_admin': user.is_admin,
             'phone': user.phone,
         })
+
+    def patch(self, request):
+        """Update the authenticated user's location"""
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return Response({'error': 'Authorization header missing or invalid.'}, status=401)
+
+        token = auth_header.split(' ')[1]
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            user_email = payload.get('email')
+        except Exception:
+            return Response({'error': 'Invalid or expired token.'}, status=401)
+
+        user = User.objects(email=user_email).first()
+        if not user:
+            return Response({'error': 'User not found.'}, status=404)
+
+        data = request.data
+        # A coordinate of 0 is valid, so only absent or empty ones are missing
+        missing = [f for f in ['location'] if not data.get(f)]
+        missing += [f for f in ['latitude', 'longitude'] if data.get(f) in (None, '')]
+        if missing:
+            return Response({'error': f'Missing fields: {", ".join(missing)}'}, status=400)
+
+        try:
+            latitude = float(data['latitude'])
+            longitude = float(data['longitude'])
+        except (TypeError, ValueError):
+            return Response({'error': 'Latitude and longitude must be valid numbers.'}, status=400)
+
+        user.location = data['location']
+        user.latitude = latitude
+        user.longitude = longitude
+        user.save()
+        sync_user(user)
+        notify_user_of_active_schedules(user)
+
+        return Response({
+            'message': 'Location updated successfully.',
+            'location': user.location,
+            'latitude': user.latitude,
+            'longitude': user.longitude,
+        })
     
 
 # class ActivePickupsView(APIView):
@@ -1974,15 +1901,18 @@ class AdminAnalyticsPerformanceView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
 
-        # Mock data for performance metrics
-        metrics = {
-            'average_completion_time': 24.5,
-            'pickup_efficiency': 85.3,
-            'user_satisfaction': 92.7,
-            'total_waste_diverted': 1250.0
-        }
+        # Summed from the daily rollups; the range defaults to the last 30 days
+        try:
+            start, end = rollups.date_range(
+                request.query_params.get('start_date'), request.query_params.get('end_date')
+            )
+        except AnalyticsError as e:
+            return Response({'error': str(e)}, status=400)
 
-        return Response({'metrics': metrics})
+        return Response({
+            'metrics': rollups.performance(start, end),
+            'period': {'start_date': start.date().isoformat(), 'end_date': end.date().isoformat()}
+        })
 
 
 class AdminAnalyticsWasteTrendsView(APIView):
@@ -2001,13 +1931,19 @@ class AdminAnalyticsWasteTrendsView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
 
-        # Mock data for waste trends
-        trends = [
-            {'date': '2025-07-01', 'total_requests': 50, 'completed_requests': 40, 'waste_types': {'Plastic': 20, 'Organic': 15, 'Metal': 5}},
-            {'date': '2025-07-02', 'total_requests': 60, 'completed_requests': 50, 'waste_types': {'Plastic': 25, 'Organic': 20, 'Metal': 15}},
-        ]
+        # Summed from the daily rollups; the range defaults to the last 30 days
+        try:
+            start, end = rollups.date_range(
+                request.query_params.get('start_date'), request.query_params.get('end_date'),
+                max_days=getattr(settings, 'TREND_MAX_DAYS', 366),
+            )
+        except AnalyticsError as e:
+            return Response({'error': str(e)}, status=400)
 
-        return Response({'trends': trends})
+        return Response({
+            'trends': rollups.waste_trends(start, end),
+            'period': {'start_date': start.date().isoformat(), 'end_date': end.date().isoformat()}
+        })
 
 
 class AdminAnalyticsWasteDistributionView(APIView):
@@ -2026,14 +1962,18 @@ class AdminAnalyticsWasteDistributionView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
 
-        # Mock data for waste distribution
-        distribution = [
-            {'waste_type': 'Plastic', 'count': 100, 'percentage': 40.0},
-            {'waste_type': 'Organic', 'count': 80, 'percentage': 32.0},
-            {'waste_type': 'Metal', 'count': 70, 'percentage': 28.0},
-        ]
+        # Summed from the daily rollups; the range defaults to the last 30 days
+        try:
+            start, end = rollups.date_range(
+                request.query_params.get('start_date'), request.query_params.get('end_date')
+            )
+        except AnalyticsError as e:
+            return Response({'error': str(e)}, status=400)
 
-        return Response({'distribution': distribution})
+        return Response({
+            'distribution': rollups.waste_distribution(start, end),
+            'period': {'start_date': start.date().isoformat(), 'end_date': end.date().isoformat()}
+        })
 
 
 class AdminAnalyticsLocationStatsView(APIView):
@@ -2053,13 +1993,18 @@ class AdminAnalyticsLocationStatsView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
 
-        # Mock data for location stats
-        locations = [
-            {'location': 'New York', 'request_count': 50, 'completion_rate': 80.0, 'popular_waste_types': ['Plastic', 'Organic']},
-            {'location': 'Los Angeles', 'request_count': 40, 'completion_rate': 75.0, 'popular_waste_types': ['Metal', 'Plastic']},
-        ]
+        # Summed from the daily rollups; the range defaults to the last 30 days
+        try:
+            start, end = rollups.date_range(
+                request.query_params.get('start_date'), request.query_params.get('end_date')
+            )
+        except AnalyticsError as e:
+            return Response({'error': str(e)}, status=400)
 
-        return Response({'locations': locations})
+        return Response({
+            'locations': rollups.location_stats(start, end),
+            'period': {'start_date': start.date().isoformat(), 'end_date': end.date().isoformat()}
+        })
 
 
 class AdminAnalyticsUserEngagementView(APIView):
@@ -2078,13 +2023,19 @@ class AdminAnalyticsUserEngagementView(APIView):
         except Exception:
             return Response({'error': 'Invalid or expired token.'}, status=401)
 
-        # Mock data for user engagement
-        engagement = [
-            {'date': '2025-07-01', 'new_users': 10, 'active_users': 50, 'collection_requests': 30, 'marketplace_posts': 20},
-            {'date': '2025-07-02', 'new_users': 15, 'active_users': 60, 'collection_requests': 40, 'marketplace_posts': 25},
-        ]
+        # Summed from the daily rollups; the range defaults to the last 30 days
+        try:
+            start, end = rollups.date_range(
+                request.query_params.get('start_date'), request.query_params.get('end_date'),
+                max_days=getattr(settings, 'TREND_MAX_DAYS', 366),
+            )
+        except AnalyticsError as e:
+            return Response({'error': str(e)}, status=400)
 
-        return Response({'engagement': engagement})
+        return Response({
+            'engagement': rollups.user_engagement(start, end),
+            'period': {'start_date': start.date().isoformat(), 'end_date': end.date().isoformat()}
+        })
 
 class UserDetailsView(APIView):
     def get(self, request, user_id):
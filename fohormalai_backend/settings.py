@@ -200,3 +200,52 @@ CSRF_TRUSTED_ORIGINS = [
 
 # Set APPEND_SLASH to False for API endpoints
 APPEND_SLASH = False
+
+# Keyset pagination of list endpoints (?limit=&cursor=&include_count=true)
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+# Longest window the dashboard's waste collection trends accept (?trend_days=&trend_bucket=day|week|month)
+TREND_MAX_DAYS = 366
+
+# In-process spatial index of user coordinates used for pickup notifications.
+# Each worker rebuilds it after the TTL so registrations handled elsewhere show up.
+USER_GRID_CELL_KM = 1.0
+USER_GRID_INDEX_TTL_SECONDS = 300
+
+# Zoom levels kept in the pre-aggregated collection heatmap (heatmap_tiles)
+HEATMAP_ZOOM_LEVELS = [6, 9, 12, 15]
+
+# In-process coverage index of active pickup schedules, used to notify users
+# who register or move into an area after a schedule was created.
+SCHEDULE_COVERAGE_CELL_KM = 5.0
+SCHEDULE_COVERAGE_INDEX_TTL_SECONDS = 300
+
+# Notification fan-out: documents per insert_many, write concern for those
+# inserts, and an optional callable (or dotted path) receiving
+# (chunk_number, size, seconds) after every chunk.
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_WRITE_CONCERN = {'w': 1}
+NOTIFICATION_CHUNK_HOOK = None
+
+# Pickup schedule fan-out jobs (processed by `python manage.py run_fanout_worker`)
+FANOUT_CHUNK_SIZE = 500  # Users notified between cursor saves
+FANOUT_LEASE_SECONDS = 120  # A job whose worker stops renewing this is picked up again
+FANOUT_MAX_ATTEMPTS = 5
+
+# Outbound mail queue (delivered by `python manage.py run_mail_worker`)
+MAIL_QUEUE_BATCH_SIZE = 50
+MAIL_QUEUE_MAX_ATTEMPTS = 5
+MAIL_QUEUE_BACKOFF_SECONDS = 30  # Doubles after every failed attempt
+MAIL_QUEUE_LEASE_SECONDS = 300
+
+# Retention (TTL indexes are applied by `python manage.py archive_notifications`).
+# OTPs must outlive their 5 minute validity window.
+OTP_TTL_SECONDS = 3600
+NOTIFICATION_READ_TTL_DAYS = 90  # Read notifications are deleted this long after being read
+NOTIFICATION_ARCHIVE_AFTER_DAYS = 180  # Older notifications move to notifications_archive
+NOTIFICATION_ARCHIVE_COMPRESSOR = 'zstd'
+
+# Server-Sent Events notification stream (served by the ASGI application)
+SSE_HEARTBEAT_SECONDS = 15
+SSE_QUEUE_SIZE = 100  # Events buffered per connection before the oldest is dropped
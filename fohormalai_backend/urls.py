@@ -1,12 +1,15 @@
 from django.urls import path
+from core.streams import notification_stream
 from core.views import (
     AdminCollectionHeatmapView, AdminDashboardStatsView, AdminDashboardView, 
     AdminDashboardActivitiesView, AdminAnalyticsView, AdminUsersListView,
-    AdminPickupSchedulesUsersInRadiusView, AdminPickupSchedulesListView,
+    AdminPickupSchedulesUsersInRadiusView, AdminPickupSchedulesListView, AdminFanoutJobsView,
+    AdminScheduleRecipientsView,
     BulkCollectionRequestUpdateView, CollectionRequestCreateView, CollectionRequestListView, 
     CollectionRequestStatusUpdateView, MarketplacePostCreateView, MarketplacePostListView, 
     NearbyPickupSchedulesView, PickupScheduleCreateView, PickupScheduleListView, 
     PickupScheduleUpdateView, SendOTPView, RegisterView, LoginView, UserNotificationsView,
+    UserUnreadNotificationsCountView,
     UserCollectionRequestsView, UserPickupSchedulesView, UserProfileView, ActivePickupsView,
     AdminAnalyticsPerformanceView, AdminAnalyticsWasteTrendsView, AdminAnalyticsWasteDistributionView,
     AdminAnalyticsLocationStatsView, AdminAnalyticsUserEngagementView, UserDetailsView
@@ -26,7 +29,10 @@ urlpatterns = [
     # Admin Pickup Schedule Management
     path('api/admin/pickup-schedules/', AdminPickupSchedulesListView.as_view()),
     path('api/admin/pickup-schedules/users-in-radius/', AdminPickupSchedulesUsersInRadiusView.as_view()),
+    path('api/admin/pickup-schedules/<str:schedule_id>/recipients/', AdminScheduleRecipientsView.as_view()),
     path('api/admin/get-all-pickup-schedules/', AdminPickupSchedulesListView.as_view()),  # Alias for clearer API naming
+    path('api/admin/fanout-jobs/', AdminFanoutJobsView.as_view()),
+    path('api/admin/fanout-jobs/<str:job_id>/', AdminFanoutJobsView.as_view()),
     
     # Marketplace Management
     path('api/marketplace-post/', MarketplacePostCreateView.as_view()),
@@ -53,6 +59,8 @@ urlpatterns = [
     
     # User Notifications & Personal Data
     path('api/user/notifications/', UserNotificationsView.as_view()),
+    path('api/user/notifications/unread-count/', UserUnreadNotificationsCountView.as_view()),
+    path('api/user/notifications/stream/', notification_stream),
     path('api/user/pickup-schedules/', UserPickupSchedulesView.as_view()),
     path('api/user/me/', UserProfileView.as_view()),
     path('api/user/info/',UserDetailsView.as_view()),